@@ -2,17 +2,22 @@
 import streamlit as st
 from catalogo import render_catalogo
 from punto_venta import render_punto_venta
+from reportes import render_registros
+from inventario import render_inventario
+from analitica import render_analitica
+from esquema import asegurar_esquema, advertencias_esquema, migraciones_pendientes
+from config import opcion as opcion_config
+from metricas import seccion, escribir_prometheus
 
 
 # Datos compartidos (temporalmente en memoria)
 if "productos" not in st.session_state:
     st.session_state.productos = []
 
-if "ventas" not in st.session_state:
-    st.session_state.ventas = []
-
 productos = st.session_state.productos
-ventas = st.session_state.ventas
+
+# Crea / actualiza las tablas y revisa los índices (una vez por proceso)
+asegurar_esquema()
 
 
 # Configuración base
@@ -23,6 +28,21 @@ st.set_page_config(
 )
 
 # ------------------ Sidebar ------------------
+# Tablas sin los índices que necesitan las consultas frecuentes
+for advertencia in advertencias_esquema():
+    st.sidebar.warning(advertencia, icon="⚠️")
+
+# Sin turnos o sin el diario de stock ninguna venta se puede registrar:
+# mejor no abrir el punto de venta
+pendientes = migraciones_pendientes()
+if pendientes:
+    st.error(
+        "La base de datos no está lista para vender. Migraciones pendientes: "
+        + "; ".join(f"{version} ({descripcion})" for version, descripcion in pendientes)
+        + ". Revisa las advertencias de la barra lateral y reinicia la aplicación."
+    )
+    st.stop()
+
 #st.sidebar.title("SGVentas")
 
 opcion = st.sidebar.selectbox(
@@ -30,24 +50,33 @@ opcion = st.sidebar.selectbox(
     [
         "Punto de venta",
         "Catálogo",
-        #"Inventario",
-        "Registros del día"
+        "Inventario",
+        "Registros del día",
+        "Análisis"
     ]
 )
 
 # ------------------ Enrutador de módulos ------------------
-if opcion == "Punto de venta":
-    render_punto_venta(ventas)
+with seccion(f"rerun.{opcion}"):
+    if opcion == "Punto de venta":
+        render_punto_venta()
 
-elif opcion == "Catálogo":
-    render_catalogo()
+    elif opcion == "Catálogo":
+        render_catalogo()
 
-#elif opcion == "Inventario":
-    #render_inventario()
+    elif opcion == "Inventario":
+        render_inventario()
 
-elif opcion == "Registros del día":
-    st.header("Registros del día")
-    st.info("Módulo de registros en construcción")
+    elif opcion == "Registros del día":
+        render_registros()
 
+    elif opcion == "Análisis":
+        render_analitica()
 
+# ------------------ Diagnóstico ------------------
+if opcion_config("diagnostico", False):
+    from diagnostico import render_diagnostico
+    render_diagnostico()
 
+if opcion_config("metricas_archivo"):
+    escribir_prometheus(opcion_config("metricas_archivo"))
@@ -0,0 +1,561 @@
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from carrito import CODIGO_INGRESO
+from config import opcion
+from db import abrir_cursor, motor, obtener_productos
+from metricas import medir
+
+# ------------------ ANÁLISIS DE VENTAS ------------------
+# Los renglones de venta del último año se guardan en memoria en columnas
+# de NumPy (un arreglo por campo, el producto como índice entero) y se
+# completan por id: cada consulta trae solo los renglones nuevos, de
+# cualquier caja. Las métricas son operaciones sobre arreglos completos
+# (bincount, unique, cumsum), sin recorrer ventas una por una.
+
+EPOCA_SEGUNDOS = 62167219200   # TO_SECONDS('1970-01-01')
+DIAS_SEMANA = ["Lun", "Mar", "Mié", "Jue", "Vie", "Sáb", "Dom"]
+
+HUECOS_TTL = 60.0        # s que se vuelve a buscar un id salteado
+HUECOS_MAXIMOS = 1000
+LOTE_CARGA = 50000
+
+
+# ------------------ Columnas ------------------
+class _Renglones:
+    """
+    Renglones de venta en columnas: id, venta, segundos (fecha local como
+    segundos desde 1970), producto (índice en `codigos`), cantidad e
+    importe en centavos. Crecen al doble como `cache_catalogo._Columnas`.
+    """
+
+    __slots__ = ("n", "id", "venta", "segundos", "producto", "cantidad",
+                 "importe", "codigos", "nombres", "_indice")
+
+    _TIPOS = {
+        "id": np.int64, "venta": np.int64, "segundos": np.int64,
+        "producto": np.int32, "cantidad": np.int32, "importe": np.int64,
+    }
+
+    def __init__(self):
+        self.n = 0
+        for campo, tipo in self._TIPOS.items():
+            setattr(self, campo, np.empty(0, dtype=tipo))
+        self.codigos = []
+        self.nombres = []
+        self._indice = {}
+
+    def __len__(self):
+        return self.n
+
+    def indice(self, codigo):
+        """Índice del producto, o -1 si nunca se ha vendido."""
+        return self._indice.get(str(codigo).upper(), -1)
+
+    def _producto(self, codigo, nombre):
+        clave = codigo.upper()
+        i = self._indice.get(clave)
+        if i is None:
+            i = self._indice[clave] = len(self.codigos)
+            self.codigos.append(codigo)
+            self.nombres.append(nombre)
+        else:
+            # El nombre más reciente es el que se muestra
+            self.nombres[i] = nombre
+        return i
+
+    def agregar(self, filas):
+        """Agrega tuplas (id, venta_id, segundos, codigo, nombre, cantidad, centavos)."""
+        if not filas:
+            return
+        k = len(filas)
+        fin = self.n + k
+        if fin > len(self.id):
+            capacidad = max(1024, 2 * len(self.id), fin)
+            for campo in self._TIPOS:
+                setattr(self, campo, np.resize(getattr(self, campo), capacidad))
+
+        ids, ventas, segundos, codigos, nombres, cantidades, importes = zip(*filas)
+        self.id[self.n:fin] = ids
+        self.venta[self.n:fin] = ventas
+        self.segundos[self.n:fin] = segundos
+        self.producto[self.n:fin] = [self._producto(c, n) for c, n in zip(codigos, nombres)]
+        self.cantidad[self.n:fin] = cantidades
+        self.importe[self.n:fin] = importes
+        self.n = fin
+
+    def vista(self):
+        """
+        Foto de las columnas (vistas, sin copiar). Lo que se agregue después
+        queda fuera de la vista, así se puede calcular sin el candado.
+        """
+        n = self.n
+        foto = {campo: getattr(self, campo)[:n] for campo in self._TIPOS}
+        foto["codigos"] = self.codigos[:]
+        foto["nombres"] = self.nombres[:]
+        foto["ingreso"] = self._indice.get(CODIGO_INGRESO, -1)
+        return foto
+
+    def memoria(self):
+        return sum(getattr(self, campo).nbytes for campo in self._TIPOS)
+
+
+def _segundos(dia):
+    return int((datetime.combine(dia, datetime.min.time()) - datetime(1970, 1, 1)).total_seconds())
+
+
+def _fecha(segundos):
+    return datetime(1970, 1, 1) + timedelta(seconds=int(segundos))
+
+
+def _unicos(valores, contar=False):
+    """
+    Valores distintos, ordenados (y cuántas veces aparece cada uno). Ordena
+    y compara vecinos: en arreglos de millones es mucho más rápido que
+    np.unique.
+    """
+    ordenados = np.sort(valores)
+    cambio = np.empty(len(ordenados), dtype=bool)
+    cambio[:1] = True
+    np.not_equal(ordenados[1:], ordenados[:-1], out=cambio[1:])
+    distintos = ordenados[cambio]
+    if not contar:
+        return distintos
+    return distintos, np.diff(np.append(np.flatnonzero(cambio), len(ordenados)))
+
+
+class _Seleccion:
+    """Renglones de un rango de fechas (máscara aplicada a la foto)."""
+
+    __slots__ = ("venta", "segundos", "producto", "cantidad", "importe",
+                 "codigos", "nombres")
+
+    def __init__(self, foto, desde, hasta, productos):
+        filtro = (foto["segundos"] >= _segundos(desde)) & (foto["segundos"] < _segundos(hasta))
+        if productos and foto["ingreso"] >= 0:
+            # Los ingresos manuales no son productos
+            filtro &= foto["producto"] != foto["ingreso"]
+        for campo in ("venta", "segundos", "producto", "cantidad", "importe"):
+            setattr(self, campo, foto[campo][filtro])
+        self.codigos = foto["codigos"]
+        self.nombres = foto["nombres"]
+
+    def por_producto(self, valores):
+        return np.bincount(self.producto, weights=valores, minlength=len(self.codigos))
+
+    def tickets_por_producto(self):
+        """En cuántas ventas distintas aparece cada producto."""
+        m = len(self.codigos)
+        pares = _unicos(self.venta * m + self.producto)
+        return np.bincount(pares % m, minlength=m), pares
+
+
+class AnaliticaVentas:
+    """
+    Copia en columnas de los renglones de venta, compartida por las
+    sesiones del proceso.
+
+    - `cargar(desde, recibir)` lee los renglones con fecha >= desde y se
+      los pasa a `recibir` por lotes de tuplas (id, venta_id, segundos,
+      codigo, nombre, cantidad, centavos). Retorna el id más alto de la
+      tabla en ese momento.
+    - `nuevos(despues_de, huecos)` trae los renglones con id mayor, y los
+      de `huecos`: ids salteados que pueden aparecer tarde porque su
+      transacción terminó después que otra con id mayor.
+
+    Se completa como máximo cada `verificar_cada` segundos y se vuelve a
+    cargar completa cada `recargar_cada` (así la ventana de `dias` avanza).
+    """
+
+    def __init__(self, cargar, nuevos, dias=400, verificar_cada=5.0, recargar_cada=86400.0):
+        self._cargar = cargar
+        self._nuevos = nuevos
+        self._dias = dias
+        self._verificar_cada = verificar_cada
+        self._recargar_cada = recargar_cada
+
+        self._renglones = None
+        self._ultimo_id = 0
+        self._huecos = {}
+        self._cargado = 0.0
+        self._verificado = 0.0
+        self._lock = threading.Lock()
+        self._carga_lock = threading.Lock()
+
+    # -------- Sincronización --------
+    def _cargar_todo(self):
+        renglones = _Renglones()
+        desde = date.today() - timedelta(days=self._dias)
+        ultimo = self._cargar(desde, renglones.agregar)
+        ahora = time.monotonic()
+        with self._lock:
+            self._renglones = renglones
+            self._ultimo_id = ultimo
+            self._huecos = {}
+            self._cargado = self._verificado = ahora
+
+    def _completar(self):
+        ahora = time.monotonic()
+        self._huecos = {i: t for i, t in self._huecos.items() if t > ahora}
+        filas = self._nuevos(self._ultimo_id, sorted(self._huecos))
+        if not filas:
+            return
+
+        ids = np.fromiter((f[0] for f in filas), dtype=np.int64, count=len(filas))
+        for i in ids[ids <= self._ultimo_id].tolist():
+            self._huecos.pop(i, None)
+        nuevos = ids[ids > self._ultimo_id]
+        if len(nuevos):
+            tope = int(nuevos.max())
+            faltan = np.setdiff1d(np.arange(self._ultimo_id + 1, tope + 1), nuevos)
+            for i in faltan[-HUECOS_MAXIMOS:].tolist():
+                self._huecos[i] = ahora + HUECOS_TTL
+            if len(self._huecos) > HUECOS_MAXIMOS:
+                for i in sorted(self._huecos)[:-HUECOS_MAXIMOS]:
+                    del self._huecos[i]
+        else:
+            tope = self._ultimo_id
+
+        with self._lock:
+            self._renglones.agregar(filas)
+            self._ultimo_id = tope
+
+    def _sincronizar(self):
+        ahora = time.monotonic()
+        if self._renglones is not None and ahora - self._verificado < self._verificar_cada:
+            return
+        with self._carga_lock:
+            ahora = time.monotonic()
+            if self._renglones is None or ahora - self._cargado >= self._recargar_cada:
+                self._cargar_todo()
+            elif ahora - self._verificado >= self._verificar_cada:
+                self._completar()
+                self._verificado = ahora
+
+    def _seleccion(self, desde, hasta, productos=True):
+        """Renglones con fecha en [desde, hasta] (días completos)."""
+        self._sincronizar()
+        with self._lock:
+            foto = self._renglones.vista()
+        return _Seleccion(foto, desde, hasta + timedelta(days=1), productos)
+
+    def estadisticas(self):
+        with self._lock:
+            renglones = self._renglones
+            return {
+                "renglones": len(renglones) if renglones is not None else 0,
+                "productos": len(renglones.codigos) if renglones is not None else 0,
+                "memoria_bytes": renglones.memoria() if renglones is not None else 0,
+                "ultimo_id": self._ultimo_id,
+                "huecos": len(self._huecos),
+            }
+
+    # -------- Métricas --------
+    @medir("analitica.mas_vendidos")
+    def mas_vendidos(self, desde, hasta, por="unidades", limite=20):
+        """Productos más vendidos por `unidades` o por `importe`."""
+        s = self._seleccion(desde, hasta)
+        unidades = s.por_producto(s.cantidad)
+        importe = s.por_producto(s.importe)
+        tickets, _ = s.tickets_por_producto()
+
+        clave = unidades if por == "unidades" else importe
+        vendidos = np.flatnonzero(clave > 0)
+        orden = vendidos[np.lexsort((-importe[vendidos], -clave[vendidos]))][:limite]
+        return pd.DataFrame({
+            "codigo": [s.codigos[i] for i in orden],
+            "nombre": [s.nombres[i] for i in orden],
+            "unidades": unidades[orden].astype(np.int64),
+            "importe": importe[orden] / 100,
+            "tickets": tickets[orden],
+        })
+
+    @medir("analitica.clasificacion_abc")
+    def clasificacion_abc(self, desde, hasta, cortes=(0.80, 0.95)):
+        """
+        Clase A/B/C por participación acumulada en el importe: A hasta el
+        primer corte, B hasta el segundo y C el resto.
+        """
+        s = self._seleccion(desde, hasta)
+        importe = s.por_producto(s.importe)
+        vendidos = np.flatnonzero(importe > 0)
+        orden = vendidos[np.argsort(-importe[vendidos], kind="stable")]
+
+        valores = importe[orden]
+        total = valores.sum()
+        participacion = valores / total if total else valores
+        acumulado = np.cumsum(participacion)
+        # Se clasifica por lo acumulado antes del producto: el primero es A
+        previo = acumulado - participacion
+        clase = np.where(previo < cortes[0], "A", np.where(previo < cortes[1], "B", "C"))
+
+        return pd.DataFrame({
+            "codigo": [s.codigos[i] for i in orden],
+            "nombre": [s.nombres[i] for i in orden],
+            "importe": valores / 100,
+            "participacion": participacion,
+            "acumulado": acumulado,
+            "clase": clase,
+        })
+
+    @medir("analitica.sin_movimiento")
+    def sin_movimiento(self, dias=30, hasta=None, limite=200):
+        """
+        Productos con stock que menos se vendieron en los últimos `dias`:
+        unidades del periodo, última venta y días que alcanza el stock al
+        ritmo actual (vacío si no se vendió).
+        """
+        hasta = hasta or date.today()
+        self._sincronizar()
+        with self._lock:
+            foto = self._renglones.vista()
+            indice = self._renglones.indice
+        s = _Seleccion(foto, hasta - timedelta(days=dias - 1), hasta + timedelta(days=1), True)
+        unidades = s.por_producto(s.cantidad)
+
+        # Última venta dentro de toda la copia, no solo del periodo
+        ultima = np.full(len(foto["codigos"]), -1, dtype=np.int64)
+        np.maximum.at(ultima, foto["producto"], foto["segundos"])
+
+        catalogo = [p for p in obtener_productos() if p["stock"] > 0]
+        stock = np.fromiter((p["stock"] for p in catalogo), dtype=np.int64, count=len(catalogo))
+        fila = np.fromiter((indice(p["codigo"]) for p in catalogo), dtype=np.int64, count=len(catalogo))
+
+        # Productos nunca vendidos (o vendidos después de la foto): fila extra en cero
+        fila[(fila < 0) | (fila >= len(ultima))] = len(ultima)
+        periodo = np.append(unidades, 0)[fila]
+        ultimas = np.append(ultima, -1)[fila]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cobertura = np.where(periodo > 0, stock / (periodo / dias), np.nan)
+
+        orden = np.lexsort((ultimas, periodo))[:limite]
+        return pd.DataFrame({
+            "codigo": [catalogo[i]["codigo"] for i in orden],
+            "nombre": [catalogo[i]["nombre"] for i in orden],
+            "stock": stock[orden],
+            "unidades": periodo[orden].astype(np.int64),
+            "ultima_venta": [_fecha(ultimas[i]) if ultimas[i] >= 0 else None for i in orden],
+            "cobertura_dias": np.round(cobertura[orden], 1),
+        })
+
+    @medir("analitica.mapa_calor")
+    def mapa_calor(self, desde, hasta, valor="importe"):
+        """
+        Matriz día de la semana × hora con el `importe`, los `tickets` o las
+        `unidades` vendidas. El importe incluye los ingresos manuales.
+        """
+        s = self._seleccion(desde, hasta, productos=(valor == "unidades"))
+        dia = s.segundos // 86400
+        # 1970-01-01 fue jueves; lunes = 0
+        celda = ((dia + 3) % 7) * 24 + (s.segundos % 86400) // 3600
+
+        if valor == "tickets":
+            # Todos los renglones de una venta tienen la misma fecha
+            unicas = _unicos(s.venta * 168 + celda)
+            matriz = np.bincount(unicas % 168, minlength=168)
+        elif valor == "unidades":
+            matriz = np.bincount(celda, weights=s.cantidad, minlength=168)
+        else:
+            matriz = np.bincount(celda, weights=s.importe, minlength=168) / 100
+
+        return pd.DataFrame(matriz.reshape(7, 24), index=DIAS_SEMANA, columns=range(24))
+
+    @medir("analitica.comprados_juntos")
+    def comprados_juntos(self, desde, hasta, limite=20, minimo=2, max_canasta=50):
+        """
+        Pares de productos que más se compran en la misma venta, con el
+        soporte (fracción de tickets), la confianza a→b y el lift. Las
+        canastas de más de `max_canasta` productos distintos no cuentan.
+        """
+        s = self._seleccion(desde, hasta)
+        m = len(s.codigos)
+        tickets, pares = s.tickets_por_producto()
+        venta, producto = pares // m, pares % m
+
+        # `pares` viene ordenado por venta: tamaño de cada canasta
+        ventas, tamano = _unicos(venta, contar=True)
+        n_tickets = len(ventas)
+        dentro = np.repeat((tamano >= 2) & (tamano <= max_canasta), tamano)
+        canastas = pd.DataFrame({"v": venta[dentro], "p": producto[dentro]})
+
+        juntos = canastas.merge(canastas, on="v")
+        juntos = juntos[juntos["p_x"] < juntos["p_y"]]
+        conteo = (juntos["p_x"].to_numpy(np.int64) * m + juntos["p_y"].to_numpy(np.int64))
+        claves, veces = _unicos(conteo, contar=True)
+        elegidos = np.flatnonzero(veces >= minimo)
+        elegidos = elegidos[np.argsort(-veces[elegidos], kind="stable")][:limite]
+
+        a, b = claves[elegidos] // m, claves[elegidos] % m
+        veces = veces[elegidos]
+        return pd.DataFrame({
+            "producto_a": [s.nombres[i] for i in a],
+            "producto_b": [s.nombres[i] for i in b],
+            "tickets": veces,
+            "soporte": veces / n_tickets if n_tickets else veces,
+            "confianza": veces / tickets[a],
+            "lift": veces * n_tickets / (tickets[a] * tickets[b]),
+        })
+
+
+# ------------------ Lectura de la BD ------------------
+_COLUMNAS = {
+    "mysql": f"""
+        id, venta_id, TO_SECONDS(fecha) - {EPOCA_SEGUNDOS}, codigo, nombre,
+        cantidad, CAST(subtotal * 100 AS SIGNED)
+    """,
+    "sqlite": """
+        id, venta_id, CAST(ROUND((julianday(fecha) - 2440587.5) * 86400) AS INTEGER),
+        codigo, nombre, cantidad, CAST(ROUND(subtotal * 100) AS INTEGER)
+    """,
+}
+
+
+def _cargar_renglones(desde, recibir):
+    """Renglones desde `desde` por lotes, sin tener todas las tuplas a la vez."""
+    columnas = _COLUMNAS[motor()]
+    with abrir_cursor(lectura=True) as cursor:
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM venta_items")
+        ultimo = int(cursor.fetchone()[0])
+        cursor.execute(f"""
+            SELECT {columnas}
+            FROM venta_items
+            WHERE fecha >= %s AND id <= %s
+        """, (desde, ultimo))
+        while True:
+            lote = cursor.fetchmany(LOTE_CARGA)
+            if not lote:
+                break
+            recibir(lote)
+    return ultimo
+
+
+def _renglones_nuevos(despues_de, huecos):
+    columnas = _COLUMNAS[motor()]
+    with abrir_cursor(lectura=True) as cursor:
+        cursor.execute(f"""
+            SELECT {columnas}
+            FROM venta_items
+            WHERE id > %s
+            ORDER BY id
+        """, (despues_de,))
+        filas = cursor.fetchall()
+        if huecos:
+            marcadores = ", ".join(["%s"] * len(huecos))
+            cursor.execute(f"""
+                SELECT {columnas}
+                FROM venta_items
+                WHERE id IN ({marcadores})
+            """, list(huecos))
+            filas += cursor.fetchall()
+    return filas
+
+
+_analitica = None
+_analitica_lock = threading.Lock()
+
+
+def obtener_analitica():
+    """Motor de análisis compartido por el proceso."""
+    global _analitica
+    if _analitica is None:
+        with _analitica_lock:
+            if _analitica is None:
+                _analitica = AnaliticaVentas(
+                    _cargar_renglones,
+                    _renglones_nuevos,
+                    dias=int(opcion("analitica_dias", 400))
+                )
+    return _analitica
+
+
+# ------------------ Render Análisis ------------------
+def _pesos(valor):
+    return f"${valor:,.2f}"
+
+
+def _colores_calor(matriz):
+    """Fondo verde más intenso cuanto mayor el valor (sin matplotlib)."""
+    maximo = matriz.to_numpy().max()
+    intensidad = matriz / maximo if maximo else matriz * 0
+    return intensidad.map(lambda a: f"background-color: rgba(46, 139, 87, {a:.2f})")
+
+
+def render_analitica():
+    st.header("Análisis de ventas")
+
+    hoy = date.today()
+    rango = st.date_input("Periodo", value=(hoy - timedelta(days=29), hoy), max_value=hoy)
+    if not isinstance(rango, tuple) or len(rango) != 2:
+        st.info("Elige la fecha inicial y la final.")
+        return
+    desde, hasta = rango
+    analitica = obtener_analitica()
+
+    tab_top, tab_abc, tab_lentos, tab_horas, tab_juntos = st.tabs(
+        ["Más vendidos", "ABC", "Sin movimiento", "Horarios", "Comprados juntos"]
+    )
+
+    with tab_top:
+        por = st.radio("Ordenar por", ["unidades", "importe"], horizontal=True)
+        df = analitica.mas_vendidos(desde, hasta, por=por, limite=50)
+        if df.empty:
+            st.info("No hay ventas en el periodo.")
+        else:
+            df["importe"] = df["importe"].map(_pesos)
+            df.index = range(1, len(df) + 1)
+            st.dataframe(df, use_container_width=True)
+
+    with tab_abc:
+        df = analitica.clasificacion_abc(desde, hasta)
+        if df.empty:
+            st.info("No hay ventas en el periodo.")
+        else:
+            resumen = df.groupby("clase").agg(productos=("codigo", "size"), importe=("importe", "sum"))
+            c1, c2, c3 = st.columns(3)
+            for columna, clase in zip((c1, c2, c3), "ABC"):
+                if clase in resumen.index:
+                    fila = resumen.loc[clase]
+                    columna.metric(f"Clase {clase}", f"{int(fila['productos']):,} productos",
+                                   _pesos(fila["importe"]), delta_color="off")
+            df["importe"] = df["importe"].map(_pesos)
+            df["participacion"] = df["participacion"].map("{:.1%}".format)
+            df["acumulado"] = df["acumulado"].map("{:.1%}".format)
+            st.dataframe(df, hide_index=True, use_container_width=True)
+
+    with tab_lentos:
+        dias = st.number_input("Días", min_value=1, value=30, step=1)
+        df = analitica.sin_movimiento(dias=int(dias), hasta=hasta)
+        if df.empty:
+            st.info("No hay productos con stock.")
+        else:
+            st.dataframe(df, hide_index=True, use_container_width=True)
+
+    with tab_horas:
+        valor = st.radio("Medir", ["importe", "tickets", "unidades"], horizontal=True)
+        matriz = analitica.mapa_calor(desde, hasta, valor=valor)
+        formato = "${:,.0f}" if valor == "importe" else "{:,.0f}"
+        st.dataframe(
+            matriz.style.apply(_colores_calor, axis=None).format(formato),
+            use_container_width=True
+        )
+
+    with tab_juntos:
+        df = analitica.comprados_juntos(desde, hasta)
+        if df.empty:
+            st.info("No hay pares de productos que se repitan en el periodo.")
+        else:
+            df["soporte"] = df["soporte"].map("{:.2%}".format)
+            df["confianza"] = df["confianza"].map("{:.0%}".format)
+            df["lift"] = df["lift"].round(2)
+            st.dataframe(df, hide_index=True, use_container_width=True)
+
+    st.caption(
+        f"{analitica.estadisticas()['renglones']:,} renglones en memoria "
+        f"(últimos {int(opcion('analitica_dias', 400))} días)."
+    )
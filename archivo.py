@@ -0,0 +1,423 @@
+"""
+Archivo histórico de ventas.
+
+Uso (p. ej. desde cron, una vez al día):
+    python archivo.py [--dias 730] [--directorio archivo]
+"""
+import argparse
+import json
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from carrito import a_pesos
+from config import opcion
+from db import abrir_cursor, marcar_escritura
+from db import obtener_venta as _venta_viva, obtener_ventas as _ventas_vivas
+from metricas import medir
+
+try:
+    import pyarrow  # noqa: F401
+    EXTENSION = "parquet"
+except ImportError:
+    EXTENSION = "csv.gz"
+
+# ------------------ ARCHIVO HISTÓRICO ------------------
+# Los días cerrados más viejos que el horizonte salen de `ventas` y
+# `venta_items` a archivos comprimidos, uno por mes y tabla
+# (archivo/ventas/AAAA-MM.parquet; csv.gz si no está pyarrow). Así las
+# tablas vivas y sus índices no crecen sin límite. Los montos se guardan en
+# centavos enteros. `manifiesto.json` anota hasta qué día está archivado y
+# el rango de ids de cada mes, para leer solo los archivos que tocan una
+# consulta. Los resúmenes (resumen_*), los turnos y el diario de stock se
+# quedan en la BD.
+
+COLUMNAS = {
+    "ventas": ("id", "clave", "fecha", "total", "articulos", "turno_id"),
+    "venta_items": ("id", "venta_id", "fecha", "codigo", "nombre", "precio", "cantidad", "subtotal"),
+}
+MONTOS = ("total", "precio", "subtotal")
+TIPOS_CSV = {
+    "id": "int64", "venta_id": "int64", "clave": "string", "codigo": "string",
+    "nombre": "string", "cantidad": "int64", "articulos": "int64", "turno_id": "Int64",
+    "total": "int64", "precio": "int64", "subtotal": "int64",
+}
+MANIFIESTO = "manifiesto.json"
+PARTICIONES_EN_CACHE = 12
+LOTE_BORRADO = 1000
+
+_lock = threading.Lock()
+_cache = {}                   # ruta -> (mtime, DataFrame)
+
+
+def _directorio():
+    return opcion("archivo_dir", "archivo")
+
+
+def horizonte_dias(dias=None):
+    """
+    Días que se quedan en la BD (`dias` o, si no se indica,
+    `archivo_dias`). Nunca menos que `analitica_dias`: el análisis lee sus
+    renglones de la BD.
+    """
+    if dias is None:
+        dias = int(opcion("archivo_dias", 730))
+    return max(int(dias), int(opcion("analitica_dias", 400)))
+
+
+def _como_fecha_hora(valor):
+    if isinstance(valor, datetime):
+        return valor
+    return datetime(valor.year, valor.month, valor.day)
+
+
+def _mes(fecha):
+    return f"{fecha:%Y-%m}"
+
+
+def _inicio_mes_siguiente(fecha):
+    return datetime(fecha.year + fecha.month // 12, fecha.month % 12 + 1, 1)
+
+
+# -------- Manifiesto --------
+def _leer_manifiesto(directorio):
+    try:
+        with open(os.path.join(directorio, MANIFIESTO), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"hasta": None, "particiones": {}}
+
+
+def _escribir_atomico(ruta, escribir):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = f"{ruta}.tmp"
+    escribir(temporal)
+    os.replace(temporal, ruta)
+
+
+def _guardar_manifiesto(directorio, manifiesto):
+    def escribir(temporal):
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(manifiesto, f, indent=2, sort_keys=True)
+    _escribir_atomico(os.path.join(directorio, MANIFIESTO), escribir)
+
+
+# -------- Particiones --------
+def _ruta(directorio, tabla, mes, extension=None):
+    return os.path.join(directorio, tabla, f"{mes}.{extension or EXTENSION}")
+
+
+def _ruta_existente(directorio, tabla, mes):
+    """Archivo del mes en cualquiera de los formatos (pudo cambiar pyarrow)."""
+    for extension in (EXTENSION, "parquet", "csv.gz"):
+        ruta = _ruta(directorio, tabla, mes, extension)
+        if os.path.exists(ruta):
+            return ruta
+    return None
+
+
+def _leer_particion(ruta, desde=None, hasta=None):
+    """
+    Filas del archivo con fecha en [desde, hasta). En parquet el filtro se
+    aplica al leer (se saltan los grupos de filas fuera del rango).
+    """
+    if ruta.endswith(".parquet"):
+        filtros = []
+        if desde is not None:
+            filtros.append(("fecha", ">=", pd.Timestamp(desde)))
+        if hasta is not None:
+            filtros.append(("fecha", "<", pd.Timestamp(hasta)))
+        return pd.read_parquet(ruta, filters=filtros or None)
+
+    mtime = os.path.getmtime(ruta)
+    guardado = _cache.get(ruta)
+    if guardado is not None and guardado[0] == mtime:
+        df = guardado[1]
+    else:
+        df = pd.read_csv(ruta, parse_dates=["fecha"], dtype=TIPOS_CSV, keep_default_na=False,
+                         na_values={"clave": [""], "turno_id": [""]})
+        if len(_cache) >= PARTICIONES_EN_CACHE:
+            _cache.pop(next(iter(_cache)))
+        _cache[ruta] = (mtime, df)
+
+    if desde is not None:
+        df = df[df["fecha"] >= pd.Timestamp(desde)]
+    if hasta is not None:
+        df = df[df["fecha"] < pd.Timestamp(hasta)]
+    return df
+
+
+def _escribir_particion(directorio, tabla, mes, nuevas):
+    """
+    Agrega `nuevas` al archivo del mes (lo reescribe completo). Un id que ya
+    estaba no se duplica: reintentar un mes a medias es seguro.
+    """
+    anterior = _ruta_existente(directorio, tabla, mes)
+    if anterior is not None:
+        nuevas = pd.concat([_leer_particion(anterior), nuevas], ignore_index=True)
+        nuevas = nuevas.drop_duplicates("id", keep="last")
+    nuevas = nuevas.sort_values(["fecha", "id"], ignore_index=True)
+
+    ruta = _ruta(directorio, tabla, mes)
+    if EXTENSION == "parquet":
+        _escribir_atomico(ruta, lambda t: nuevas.to_parquet(t, index=False, compression="zstd"))
+    else:
+        _escribir_atomico(ruta, lambda t: nuevas.to_csv(t, index=False, compression="gzip"))
+    if anterior is not None and anterior != ruta:
+        os.remove(anterior)
+    _cache.pop(ruta, None)
+    return nuevas
+
+
+def _a_tabla(tabla, filas):
+    """Filas de la BD como DataFrame con montos en centavos."""
+    df = pd.DataFrame.from_records(filas, columns=COLUMNAS[tabla])
+    for columna in MONTOS:
+        if columna in df:
+            df[columna] = [int(valor * 100) for valor in df[columna]]
+    df["fecha"] = pd.to_datetime(df["fecha"])
+    if "turno_id" in df:
+        df["turno_id"] = df["turno_id"].astype("Int64")
+    return df
+
+
+def _a_filas(df, columnas):
+    """DataFrame del archivo como dicts, con los tipos que da la BD."""
+    valores = []
+    for columna in columnas:
+        serie = df[columna]
+        if columna in MONTOS:
+            valores.append([a_pesos(v) for v in serie.tolist()])
+        elif columna == "fecha":
+            valores.append(serie.dt.to_pydatetime().tolist())
+        else:
+            valores.append([None if pd.isna(v) else v for v in serie.astype(object).tolist()])
+    return [dict(zip(columnas, fila)) for fila in zip(*valores)]
+
+
+# ------------------ Archivar ------------------
+def _rango_mes(cursor, tabla, desde, hasta):
+    cursor.execute(f"""
+        SELECT {', '.join(COLUMNAS[tabla])}
+        FROM {tabla}
+        WHERE fecha >= %s AND fecha < %s
+    """, (desde, hasta))
+    return _a_tabla(tabla, cursor.fetchall())
+
+
+def _borrar_archivadas(tabla, ids):
+    """
+    Borra de la BD las filas ya archivadas, por id y en bloques de
+    `LOTE_BORRADO` (una transacción cada uno). Una venta que entró al rango
+    después de leerlo (p. ej. una diferida atrasada) no se toca: queda
+    para la siguiente corrida.
+    """
+    ids = [int(i) for i in ids]
+    for inicio in range(0, len(ids), LOTE_BORRADO):
+        bloque = ids[inicio:inicio + LOTE_BORRADO]
+        marcadores = ", ".join(["%s"] * len(bloque))
+        with abrir_cursor() as cursor:
+            cursor.execute(f"DELETE FROM {tabla} WHERE id IN ({marcadores})", bloque)
+
+
+@medir("archivo.archivar")
+def archivar(dias=None, directorio=None, hoy=None):
+    """
+    Pasa al archivo las ventas de los días anteriores a `hoy - dias` y las
+    borra de la BD (`dias` nunca baja de `analitica_dias`, ver
+    horizonte_dias). Cada mes se escribe y se anota en el manifiesto antes
+    de borrarlo, así una consulta nunca deja de ver una venta aunque el
+    proceso se corte a la mitad (volver a correrlo lo termina).
+
+    Retorna una lista de dicts por mes con ventas y renglones archivados.
+    """
+    dias = horizonte_dias(dias)
+    directorio = directorio or _directorio()
+    corte = _como_fecha_hora((hoy or date.today()) - timedelta(days=dias))
+
+    with abrir_cursor(lectura=True) as cursor:
+        cursor.execute(
+            "SELECT fecha FROM ventas WHERE fecha < %s ORDER BY fecha LIMIT 1", (corte,)
+        )
+        primera = cursor.fetchone()
+    if primera is None:
+        return []
+    primera = primera[0]
+
+    marcar_escritura()
+    archivados = []
+    with _lock:
+        manifiesto = _leer_manifiesto(directorio)
+        inicio = datetime(primera.year, primera.month, 1)
+        while inicio < corte:
+            fin = min(_inicio_mes_siguiente(inicio), corte)
+            mes = _mes(inicio)
+
+            with abrir_cursor(solo_lectura=True) as cursor:
+                ventas = _rango_mes(cursor, "ventas", inicio, fin)
+                renglones = _rango_mes(cursor, "venta_items", inicio, fin)
+
+            if len(ventas) or len(renglones):
+                ventas_mes = _escribir_particion(directorio, "ventas", mes, ventas)
+                renglones_mes = _escribir_particion(directorio, "venta_items", mes, renglones)
+                manifiesto["particiones"][mes] = {
+                    "ventas": len(ventas_mes),
+                    "renglones": len(renglones_mes),
+                    "id_min": int(ventas_mes["id"].min()) if len(ventas_mes) else None,
+                    "id_max": int(ventas_mes["id"].max()) if len(ventas_mes) else None,
+                }
+                archivados.append({"mes": mes, "ventas": len(ventas), "renglones": len(renglones)})
+
+            anterior = manifiesto["hasta"]
+            if anterior is None or anterior < f"{fin:%Y-%m-%d}":
+                manifiesto["hasta"] = f"{fin:%Y-%m-%d}"
+            _guardar_manifiesto(directorio, manifiesto)
+
+            _borrar_archivadas("venta_items", renglones["id"])
+            _borrar_archivadas("ventas", ventas["id"])
+            inicio = fin
+
+    return archivados
+
+
+# ------------------ Consultas (BD + archivo) ------------------
+def _archivado_hasta(manifiesto):
+    hasta = manifiesto["hasta"]
+    return datetime.fromisoformat(hasta) if hasta else None
+
+
+def _meses(manifiesto, desde, hasta):
+    """Meses archivados que se cruzan con [desde, hasta)."""
+    primero, ultimo = _mes(desde), _mes(hasta - timedelta(microseconds=1))
+    return [mes for mes in sorted(manifiesto["particiones"]) if primero <= mes <= ultimo]
+
+
+def _leer_archivo(tabla, desde, hasta, directorio):
+    manifiesto = _leer_manifiesto(directorio)
+    limite = _archivado_hasta(manifiesto)
+    if limite is None or desde >= limite:
+        return [], limite
+
+    partes = []
+    for mes in _meses(manifiesto, desde, min(hasta, limite)):
+        ruta = _ruta_existente(directorio, tabla, mes)
+        if ruta is not None:
+            partes.append(_leer_particion(ruta, desde, hasta))
+    if not partes:
+        return [], limite
+    return [pd.concat(partes, ignore_index=True)], limite
+
+
+def _unir(archivadas, vivas):
+    """Filas del archivo y de la BD, sin repetir las de un mes a medio archivar."""
+    vistos = {fila["id"] for fila in vivas}
+    filas = [fila for fila in archivadas if fila["id"] not in vistos] + list(vivas)
+    filas.sort(key=lambda fila: (fila["fecha"], fila["id"]))
+    return filas
+
+
+@medir("archivo.ventas_entre")
+def ventas_entre(desde, hasta, directorio=None):
+    """
+    Encabezados (id, clave, fecha, total, articulos) de las ventas con fecha en
+    [desde, hasta), vivas o archivadas. Del archivo solo se leen los meses
+    que toca el rango. La BD se consulta siempre: en el tramo ya archivado
+    es una búsqueda vacía por índice, salvo ventas que llegaron tarde y
+    esperan la siguiente corrida de `archivar`.
+    """
+    desde, hasta = _como_fecha_hora(desde), _como_fecha_hora(hasta)
+    partes, _ = _leer_archivo("ventas", desde, hasta, directorio or _directorio())
+    columnas = ("id", "clave", "fecha", "total", "articulos")
+    archivadas = [fila for df in partes for fila in _a_filas(df, columnas)]
+    return _unir(archivadas, _ventas_vivas(desde, hasta))
+
+
+@medir("archivo.renglones_entre")
+def renglones_entre(desde, hasta, directorio=None):
+    """Renglones de venta con fecha en [desde, hasta), vivos o archivados."""
+    desde, hasta = _como_fecha_hora(desde), _como_fecha_hora(hasta)
+    directorio = directorio or _directorio()
+    partes, _ = _leer_archivo("venta_items", desde, hasta, directorio)
+    columnas = COLUMNAS["venta_items"]
+    archivadas = [fila for df in partes for fila in _a_filas(df, columnas)]
+
+    with abrir_cursor(dictionary=True, lectura=True) as cursor:
+        cursor.execute(f"""
+            SELECT {', '.join(columnas)}
+            FROM venta_items
+            WHERE fecha >= %s AND fecha < %s
+        """, (desde, hasta))
+        vivas = cursor.fetchall()
+    return _unir(archivadas, vivas)
+
+
+@medir("archivo.obtener_venta")
+def obtener_venta(venta_id, directorio=None):
+    """
+    Como `db.obtener_venta`, pero si la venta ya no está en la BD la busca
+    en el mes archivado cuyo rango de ids la contiene.
+    """
+    venta = _venta_viva(venta_id)
+    if venta is not None:
+        return venta
+
+    directorio = directorio or _directorio()
+    manifiesto = _leer_manifiesto(directorio)
+    for mes, particion in manifiesto["particiones"].items():
+        if particion["id_min"] is None or not particion["id_min"] <= venta_id <= particion["id_max"]:
+            continue
+        ruta = _ruta_existente(directorio, "ventas", mes)
+        if ruta is None:
+            continue
+        ventas = _leer_particion(ruta)
+        ventas = ventas[ventas["id"] == venta_id]
+        if not len(ventas):
+            continue
+
+        venta = _a_filas(ventas, ("id", "clave", "fecha", "total", "articulos"))[0]
+        ruta = _ruta_existente(directorio, "venta_items", mes)
+        renglones = _leer_particion(ruta) if ruta is not None else pd.DataFrame(columns=["venta_id"])
+        renglones = renglones[renglones["venta_id"] == venta_id].sort_values("id")
+        venta["items"] = _a_filas(renglones, ("codigo", "nombre", "precio", "cantidad", "subtotal"))
+        return venta
+    return None
+
+
+def estadisticas(directorio=None):
+    """Meses archivados, filas por mes y tamaño en disco."""
+    directorio = directorio or _directorio()
+    manifiesto = _leer_manifiesto(directorio)
+    bytes_ = 0
+    for mes in manifiesto["particiones"]:
+        for tabla in COLUMNAS:
+            ruta = _ruta_existente(directorio, tabla, mes)
+            if ruta is not None:
+                bytes_ += os.path.getsize(ruta)
+    return {
+        "archivado_hasta": manifiesto["hasta"],
+        "meses": len(manifiesto["particiones"]),
+        "ventas": sum(p["ventas"] for p in manifiesto["particiones"].values()),
+        "renglones": sum(p["renglones"] for p in manifiesto["particiones"].values()),
+        "mb": round(bytes_ / 2**20, 2),
+        "formato": EXTENSION,
+    }
+
+
+# ------------------ Principal ------------------
+def main():
+    parser = argparse.ArgumentParser(description="Archiva las ventas viejas.")
+    parser.add_argument("--dias", type=int, default=None,
+                        help="días que se quedan en la BD (por defecto `archivo_dias`; "
+                             "nunca menos que `analitica_dias`)")
+    parser.add_argument("--directorio", default=None)
+    args = parser.parse_args()
+
+    for mes in archivar(args.dias, args.directorio):
+        print(f"{mes['mes']}: {mes['ventas']:,} ventas, {mes['renglones']:,} renglones")
+    print(json.dumps(estadisticas(args.directorio), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
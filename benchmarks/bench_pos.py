@@ -0,0 +1,356 @@
+"""
+Benchmarks de los caminos críticos del punto de venta contra una BD local.
+
+Siembra una base de datos de pruebas (se BORRAN sus tablas) con 1k/10k/100k
+productos y mide:
+
+- escaneo: `obtener_producto_por_codigo` en frío (BD) y en caliente (índice)
+- venta: `registrar_venta` según el tamaño de la canasta
+- catálogo: `obtener_productos` + DataFrame/Styler de `render_catalogo`, y
+  la memoria de la copia compartida del catálogo
+- concurrencia: ventas por segundo con varias cajas a la vez
+- análisis: métricas de `analitica` sobre un año de renglones sintéticos
+  (en memoria, sin pasar por la BD)
+
+Uso:
+    python benchmarks/bench_pos.py --host 127.0.0.1 --user root \\
+        --password secreto --database sgventas_bench --salida bench.json
+    python benchmarks/bench_pos.py --motor sqlite --ruta /tmp/bench.sqlite3
+
+El resultado es JSON (una entrada por medición) para comparar versiones.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import esquema  # noqa: E402
+from analitica import AnaliticaVentas, _segundos  # noqa: E402
+from catalogo import construir_tabla, PRODUCTOS_POR_PAGINA  # noqa: E402
+
+TABLAS_VACIAR = (
+    "venta_items", "ventas", "resumen_dia", "resumen_hora",
+    "resumen_producto_dia", "productos_cambios", "movimientos_stock",
+    "stock_corte_items", "stock_cortes", "productos",
+)
+
+
+# ------------------ Utilidades ------------------
+def medir(funcion, repeticiones):
+    """Ejecuta `funcion` varias veces y retorna los tiempos en ms."""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+
+def resumen(tiempos):
+    ordenados = sorted(tiempos)
+
+    def percentil(p):
+        return ordenados[min(len(ordenados) - 1, int(p / 100 * len(ordenados)))]
+
+    return {
+        "n": len(tiempos),
+        "media_ms": round(statistics.fmean(tiempos), 4),
+        "p50_ms": round(percentil(50), 4),
+        "p95_ms": round(percentil(95), 4),
+        "p99_ms": round(percentil(99), 4),
+        "max_ms": round(ordenados[-1], 4),
+    }
+
+
+def version_codigo():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ------------------ Siembra ------------------
+def preparar_bd(n_productos):
+    sqlite = db.motor() == "sqlite"
+    if not sqlite:
+        with db.abrir_cursor() as cursor:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS productos (
+                    codigo VARCHAR(64) NOT NULL,
+                    nombre VARCHAR(255) NOT NULL,
+                    precio DECIMAL(12, 2) NOT NULL,
+                    stock INT NOT NULL DEFAULT 0,
+                    PRIMARY KEY (codigo)
+                ) ENGINE=InnoDB
+            """)
+    esquema.asegurar_esquema()
+
+    with db.abrir_cursor() as cursor:
+        for tabla in TABLAS_VACIAR:
+            # SQLite no lleva registro de cambios
+            if not (sqlite and tabla == "productos_cambios"):
+                cursor.execute(f"DELETE FROM {tabla}")
+
+    rnd = random.Random(n_productos)
+    palabras = ["Agua", "Café", "Leche", "Pan", "Jabón", "Arroz", "Frijol", "Atún",
+                "Sopa", "Galleta", "Refresco", "Chocolate", "Azúcar", "Aceite", "Harina"]
+    filas = [
+        (
+            f"75{i:011d}",
+            f"{rnd.choice(palabras)} {rnd.choice(palabras)} {i}",
+            round(rnd.uniform(5, 500), 2),
+            1_000_000,
+        )
+        for i in range(n_productos)
+    ]
+    with db.abrir_cursor() as cursor:
+        db._insertar_filas(cursor, "productos", ("codigo", "nombre", "precio", "stock"), filas)
+
+    db.invalidar_catalogo()
+    return [f[0] for f in filas]
+
+
+# ------------------ Mediciones ------------------
+def bench_escaneo(codigos, repeticiones):
+    rnd = random.Random(1)
+    resultados = []
+
+    # En frío: consulta directa a la BD, como antes del índice en memoria
+    tiempos = medir(lambda: db._cargar_codigos([rnd.choice(codigos)]), repeticiones)
+    resultados.append(("escaneo_bd", {}, resumen(tiempos)))
+
+    # Primera lectura: carga completa del catálogo al índice
+    db.invalidar_catalogo()
+    tiempos = medir(lambda: db.obtener_producto_por_codigo(codigos[0]), 1)
+    resultados.append(("escaneo_carga_indice", {}, resumen(tiempos)))
+
+    # En caliente: índice en memoria
+    tiempos = medir(lambda: db.obtener_producto_por_codigo(rnd.choice(codigos)), repeticiones)
+    resultados.append(("escaneo_indice", {}, resumen(tiempos)))
+
+    # Código desconocido reescaneado (caché negativa)
+    tiempos = medir(lambda: db.obtener_producto_por_codigo("NO-EXISTE"), repeticiones)
+    resultados.append(("escaneo_desconocido", {}, resumen(tiempos)))
+    return resultados
+
+
+def _canasta(rnd, codigos, renglones):
+    return [
+        {"codigo": c, "nombre": "bench", "precio": "10.00", "cantidad": rnd.randint(1, 3)}
+        for c in rnd.sample(codigos, renglones)
+    ]
+
+
+def bench_venta(codigos, repeticiones):
+    rnd = random.Random(2)
+    resultados = []
+    for renglones in (1, 5, 20, 40, 100):
+        if renglones > len(codigos):
+            continue
+        tiempos = medir(
+            lambda: db.registrar_venta(_canasta(rnd, codigos, renglones)),
+            repeticiones
+        )
+        resultados.append(("registrar_venta", {"renglones": renglones}, resumen(tiempos)))
+    return resultados
+
+
+def bench_catalogo(repeticiones):
+    resultados = []
+
+    tiempos = medir(db.obtener_productos, repeticiones)
+    resultados.append(("obtener_productos", {}, resumen(tiempos)))
+
+    # Tabla de una página (lo que arma render_catalogo hoy)
+    def pagina():
+        productos, _ = db.buscar_productos(limite=PRODUCTOS_POR_PAGINA)
+        construir_tabla(productos).to_html()
+
+    tiempos = medir(pagina, repeticiones)
+    resultados.append(("catalogo_pagina", {"filas": PRODUCTOS_POR_PAGINA}, resumen(tiempos)))
+
+    # Tabla del catálogo completo (como se hacía antes de paginar)
+    # La lista va como argumento por defecto: el `del` de abajo la suelta
+    # sin dejar a la lambda con un nombre borrado
+    productos = db.obtener_productos()
+    tiempos = medir(
+        lambda productos=productos: construir_tabla(productos).to_html(),
+        max(1, repeticiones // 10)
+    )
+    resultados.append(("catalogo_completo", {"filas": len(productos)}, resumen(tiempos)))
+    del productos
+
+    # Memoria de la copia en columnas (la comparten todas las sesiones) y
+    # pico durante la carga
+    db.invalidar_catalogo()
+    tracemalloc.start()
+    db.hay_productos()
+    retenida, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    estadisticas = db.estadisticas_catalogo()
+    resultados.append(("catalogo_memoria", {}, {
+        "retenida_bytes": retenida,
+        "pico_carga_bytes": pico,
+        "estimada_bytes": estadisticas["memoria_bytes"],
+        "bytes_por_producto": estadisticas["bytes_por_producto"],
+    }))
+    return resultados
+
+
+def bench_concurrencia(codigos, cajas, segundos):
+    """Varias cajas registrando ventas de 10 renglones durante `segundos`."""
+    fin = time.monotonic() + segundos
+    conteos = [0] * cajas
+    errores = [0] * cajas
+
+    def caja(n):
+        rnd = random.Random(100 + n)
+        while time.monotonic() < fin:
+            try:
+                db.registrar_venta(_canasta(rnd, codigos, min(10, len(codigos))))
+                conteos[n] += 1
+            except Exception:
+                errores[n] += 1
+
+    hilos = [threading.Thread(target=caja, args=(n,)) for n in range(cajas)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+    return [(
+        "ventas_concurrentes",
+        {"cajas": cajas, "segundos": segundos},
+        {
+            "ventas": sum(conteos),
+            "errores": sum(errores),
+            "ventas_por_segundo": round(sum(conteos) / segundos, 2),
+        }
+    )]
+
+
+def bench_analitica(codigos, renglones, repeticiones):
+    """Un año de renglones (canastas de 1 a 6, ventas sesgadas a pocos productos)."""
+    rnd = random.Random(3)
+    inicio = _segundos(date.today() - timedelta(days=365))
+    filas = []
+    venta = 0
+    while len(filas) < renglones:
+        venta += 1
+        segundos = inicio + rnd.randrange(365 * 86400)
+        for _ in range(rnd.randint(1, 6)):
+            codigo = codigos[int(rnd.paretovariate(1.2)) % len(codigos)]
+            filas.append((len(filas) + 1, venta, segundos, codigo, "bench",
+                          rnd.randint(1, 3), rnd.randint(500, 50000)))
+
+    def cargar(desde, recibir):
+        recibir(filas)
+        return len(filas)
+
+    analitica = AnaliticaVentas(cargar, lambda despues_de, huecos: [])
+    tiempos = medir(analitica._sincronizar, 1)
+    resultados = [("analitica_carga", {"renglones": len(filas)}, resumen(tiempos))]
+
+    hasta = date.today()
+    desde = hasta - timedelta(days=364)
+    consultas = {
+        "mas_vendidos": lambda: analitica.mas_vendidos(desde, hasta),
+        "clasificacion_abc": lambda: analitica.clasificacion_abc(desde, hasta),
+        "sin_movimiento": lambda: analitica.sin_movimiento(),
+        "mapa_calor": lambda: analitica.mapa_calor(desde, hasta, valor="tickets"),
+        "comprados_juntos": lambda: analitica.comprados_juntos(desde, hasta),
+    }
+    for nombre, consulta in consultas.items():
+        tiempos = medir(consulta, repeticiones)
+        resultados.append((f"analitica_{nombre}", {"renglones": len(filas)}, resumen(tiempos)))
+    return resultados
+
+
+# ------------------ Principal ------------------
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--motor", choices=["mysql", "sqlite"], default="mysql")
+    parser.add_argument("--ruta", default="sgventas_bench.sqlite3", help="archivo (solo SQLite)")
+    parser.add_argument("--host", default=os.environ.get("SGV_BENCH_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("SGV_BENCH_PORT", 3306)))
+    parser.add_argument("--user", default=os.environ.get("SGV_BENCH_USER", "root"))
+    parser.add_argument("--password", default=os.environ.get("SGV_BENCH_PASSWORD", ""))
+    parser.add_argument("--database", default=os.environ.get("SGV_BENCH_DATABASE", "sgventas_bench"))
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeticiones", type=int, default=200)
+    parser.add_argument("--cajas", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--segundos", type=float, default=5.0)
+    parser.add_argument("--renglones-analitica", type=int, default=1_000_000)
+    parser.add_argument("--salida", help="archivo JSON (por defecto a la salida estándar)")
+    args = parser.parse_args()
+
+    if args.motor == "sqlite":
+        conexion = {"ruta": args.ruta}
+    else:
+        conexion = {
+            "host": args.host,
+            "port": args.port,
+            "user": args.user,
+            "password": args.password,
+            "database": args.database,
+        }
+    db.inicializar_pool({"motor": args.motor, "pool_size": max(args.cajas) + 2, **conexion})
+
+    mediciones = []
+    for n in args.tamanos:
+        print(f"· {n:,} productos", file=sys.stderr)
+        codigos = preparar_bd(n)
+
+        grupos = [
+            bench_escaneo(codigos, args.repeticiones),
+            bench_venta(codigos, max(1, args.repeticiones // 4)),
+            bench_catalogo(max(1, args.repeticiones // 10)),
+        ]
+        for cajas in args.cajas:
+            grupos.append(bench_concurrencia(codigos, cajas, args.segundos))
+        grupos.append(bench_analitica(codigos, args.renglones_analitica,
+                                      max(1, args.repeticiones // 20)))
+
+        for grupo in grupos:
+            for nombre, parametros, valores in grupo:
+                mediciones.append({
+                    "prueba": nombre,
+                    "productos": n,
+                    **parametros,
+                    **valores,
+                })
+
+    resultado = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "version": version_codigo(),
+        "motor": args.motor,
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "mediciones": mediciones,
+    }
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
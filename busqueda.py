@@ -0,0 +1,160 @@
+import re
+import unicodedata
+
+import numpy as np
+
+_NO_ALFANUMERICO = re.compile(r"[^0-9a-z]+")
+
+_BONO_PREFIJO = 0.5
+_BONO_PALABRA = 0.25
+_HOLGURA = 5
+_VACIO = np.empty(0, dtype=np.int32)
+
+
+def normalizar_texto(texto):
+    """
+    Texto sin acentos, en minúsculas y con solo letras/números separados
+    por un espacio ("Café  Molido-500g" -> "cafe molido 500g").
+    """
+    texto = unicodedata.normalize("NFKD", str(texto or ""))
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return _NO_ALFANUMERICO.sub(" ", texto.casefold()).strip()
+
+
+def _trigramas(normalizado):
+    """Trigramas de cada palabra con relleno ("  ca", " caf", "afe ", ...)."""
+    trigramas = set()
+    for palabra in normalizado.split():
+        relleno = f"  {palabra} "
+        for i in range(len(relleno) - 2):
+            trigramas.add(relleno[i:i + 3])
+    return trigramas
+
+
+class IndiceNombres:
+    """
+    Índice de trigramas sobre los nombres de productos para búsquedas que
+    toleran acentos, mayúsculas y errores de dedo ("cafe" encuentra "Café",
+    "cocacola" encuentra "Coca Cola").
+
+    Cada nombre tiene un id entero; las listas de ids por trigrama se
+    guardan también como arreglos de NumPy, así contar cuántos trigramas
+    comparte cada nombre con la búsqueda es un solo `bincount`. Solo los
+    mejores por conteo (`limite * _HOLGURA`) se revisan en Python para dar
+    un bono a los nombres que empiezan como la búsqueda.
+    """
+
+    def __init__(self, similitud=0.5):
+        self._similitud = similitud
+        self._ids = {}           # clave -> id
+        self._claves = []        # id -> clave (None si se quitó)
+        self._nombres = []       # id -> nombre normalizado
+        self._libres = []        # ids reutilizables
+        self._trigramas = {}     # trigrama -> set de ids
+        self._arreglos = {}      # trigrama -> np.ndarray (se arma bajo demanda)
+
+    # -------- Mantenimiento --------
+    def _indexar(self, id_, normalizado):
+        for trigrama in _trigramas(normalizado):
+            self._trigramas.setdefault(trigrama, set()).add(id_)
+            self._arreglos.pop(trigrama, None)
+
+    def agregar(self, clave, nombre):
+        self.quitar(clave)
+        normalizado = normalizar_texto(nombre)
+
+        if self._libres:
+            id_ = self._libres.pop()
+            self._claves[id_] = clave
+            self._nombres[id_] = normalizado
+        else:
+            id_ = len(self._claves)
+            self._claves.append(clave)
+            self._nombres.append(normalizado)
+
+        self._ids[clave] = id_
+        self._indexar(id_, normalizado)
+
+    def quitar(self, clave):
+        id_ = self._ids.pop(clave, None)
+        if id_ is None:
+            return
+        for trigrama in _trigramas(self._nombres[id_]):
+            ids = self._trigramas.get(trigrama)
+            if ids is not None:
+                ids.discard(id_)
+                self._arreglos.pop(trigrama, None)
+                if not ids:
+                    del self._trigramas[trigrama]
+        self._claves[id_] = None
+        self._nombres[id_] = ""
+        self._libres.append(id_)
+
+    def reconstruir(self, pares):
+        """Arma el índice desde cero con pares (clave, nombre)."""
+        self._ids = {}
+        self._claves = []
+        self._nombres = []
+        self._libres = []
+        self._trigramas = {}
+        self._arreglos = {}
+        for clave, nombre in pares:
+            normalizado = normalizar_texto(nombre)
+            id_ = len(self._claves)
+            self._ids[clave] = id_
+            self._claves.append(clave)
+            self._nombres.append(normalizado)
+            for trigrama in _trigramas(normalizado):
+                self._trigramas.setdefault(trigrama, set()).add(id_)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _arreglo(self, trigrama):
+        arreglo = self._arreglos.get(trigrama)
+        if arreglo is None:
+            ids = self._trigramas.get(trigrama)
+            if not ids:
+                return _VACIO
+            arreglo = np.fromiter(ids, dtype=np.int32, count=len(ids))
+            self._arreglos[trigrama] = arreglo
+        return arreglo
+
+    # -------- Búsqueda --------
+    def buscar(self, texto, limite=20):
+        """Claves de los mejores resultados, de mayor a menor puntaje."""
+        consulta = normalizar_texto(texto)
+        if not consulta or not self._ids:
+            return []
+
+        trigramas = _trigramas(consulta)
+        total = len(trigramas)
+        minimo = max(1, int(total * self._similitud + 0.999))
+
+        conteo = np.bincount(
+            np.concatenate([self._arreglo(t) for t in trigramas]),
+            minlength=len(self._claves)
+        )
+        candidatos = np.flatnonzero(conteo >= minimo)
+        if not len(candidatos):
+            return []
+
+        # Los mejores por conteo; el resto no alcanzaría aunque tuviera bono
+        lista_corta = limite * _HOLGURA
+        if len(candidatos) > lista_corta:
+            mejores = np.argpartition(-conteo[candidatos], lista_corta)[:lista_corta]
+            candidatos = candidatos[mejores]
+
+        primera = consulta.split()[0]
+        resultados = []
+        for id_ in candidatos.tolist():
+            nombre = self._nombres[id_]
+            puntaje = conteo[id_] / total
+            if nombre.startswith(consulta):
+                puntaje += _BONO_PREFIJO
+            elif f" {primera}" in f" {nombre}":
+                puntaje += _BONO_PALABRA
+            resultados.append((-puntaje, len(nombre), nombre, id_))
+
+        resultados.sort()
+        return [self._claves[id_] for _, _, _, id_ in resultados[:limite]]
@@ -0,0 +1,444 @@
+import itertools
+import sys
+import threading
+import time
+from collections.abc import Mapping
+
+import numpy as np
+
+from busqueda import IndiceNombres
+from carrito import a_centavos, a_pesos
+
+
+def normalizar_codigo(codigo):
+    """
+    Forma canónica de un código de barras: sin espacios ni saltos de línea
+    que agregan algunos lectores, y en mayúsculas (igual que la collation
+    de MySQL, que no distingue mayúsculas).
+    """
+    if codigo is None:
+        return ""
+    return str(codigo).strip().upper()
+
+
+# ------------------ Columnas ------------------
+class _Columnas:
+    """
+    Catálogo en columnas: códigos y nombres en listas de cadenas internadas,
+    precio (en centavos) y stock en arreglos de NumPy. Una fila por
+    producto; las filas borradas quedan sin usar hasta la siguiente carga.
+    """
+
+    __slots__ = ("codigo", "nombre", "precio", "stock")
+
+    def __init__(self, filas=()):
+        filas = list(filas)
+        self.codigo = [sys.intern(str(f[0])) for f in filas]
+        self.nombre = [sys.intern(str(f[1])) for f in filas]
+        self.precio = np.fromiter((a_centavos(f[2]) for f in filas), dtype=np.int64, count=len(filas))
+        self.stock = np.fromiter((int(f[3]) for f in filas), dtype=np.int64, count=len(filas))
+
+    def __len__(self):
+        return len(self.codigo)
+
+    def agregar(self, codigo, nombre, precio, stock):
+        fila = len(self.codigo)
+        if fila >= len(self.precio):
+            # Crece al doble: agregar sigue costando O(1) en promedio
+            capacidad = max(16, 2 * len(self.precio))
+            self.precio = np.resize(self.precio, capacidad)
+            self.stock = np.resize(self.stock, capacidad)
+        self.codigo.append(None)
+        self.nombre.append(None)
+        self.poner(fila, codigo, nombre, precio, stock)
+        return fila
+
+    def poner(self, fila, codigo, nombre, precio, stock):
+        self.codigo[fila] = sys.intern(str(codigo))
+        self.nombre[fila] = sys.intern(str(nombre))
+        self.precio[fila] = a_centavos(precio)
+        self.stock[fila] = int(stock)
+
+    def clave_orden(self, fila):
+        return (self.nombre[fila].casefold(), self.codigo[fila])
+
+    def memoria(self):
+        """Bytes aproximados: arreglos, listas y cada cadena una sola vez."""
+        total = (self.precio.nbytes + self.stock.nbytes
+                 + sys.getsizeof(self.codigo) + sys.getsizeof(self.nombre))
+        vistos = set()
+        for texto in itertools.chain(self.codigo, self.nombre):
+            if id(texto) not in vistos:
+                vistos.add(id(texto))
+                total += sys.getsizeof(texto)
+        return total
+
+
+class Producto(Mapping):
+    """
+    Vista de solo lectura de una fila del catálogo. Se usa como un dict
+    (`producto["stock"]`) pero no copia nada: lee las columnas compartidas,
+    así siempre muestra el stock vigente.
+    """
+
+    __slots__ = ("_columnas", "_fila")
+
+    _CAMPOS = ("codigo", "nombre", "precio", "stock")
+
+    def __init__(self, columnas, fila):
+        self._columnas = columnas
+        self._fila = fila
+
+    def __getitem__(self, campo):
+        if campo == "codigo":
+            return self._columnas.codigo[self._fila]
+        if campo == "nombre":
+            return self._columnas.nombre[self._fila]
+        if campo == "precio":
+            return a_pesos(int(self._columnas.precio[self._fila]))
+        if campo == "stock":
+            return int(self._columnas.stock[self._fila])
+        raise KeyError(campo)
+
+    def __iter__(self):
+        return iter(self._CAMPOS)
+
+    def __len__(self):
+        return len(self._CAMPOS)
+
+    def __repr__(self):
+        return f"Producto({dict(self)!r})"
+
+
+class CacheCatalogo:
+    """
+    Copia en memoria del catálogo de productos compartida por todas las
+    sesiones del proceso, guardada en columnas (`_Columnas`) con un índice
+    de código de barras a fila. Las lecturas entregan vistas `Producto`,
+    no copias: ninguna sesión guarda su propio catálogo.
+
+    - `cargar()` trae el catálogo completo de la BD (solo en un fallo) como
+      tuplas (codigo, nombre, precio, stock).
+    - `cargar_codigos(codigos)` trae solo esas filas, en el mismo formato;
+      se usa para mantener la copia al día tras cada escritura.
+    - `cambios(desde)` (opcional) es el registro de cambios: retorna
+      (version, codigos) con los códigos modificados después de la versión
+      `desde`, o codigos=None si son demasiados y conviene recargar todo.
+      Se consulta como máximo cada `verificar_cada` segundos y solo esos
+      productos se vuelven a leer, así el stock que venden otras cajas se
+      ve sin recargar el catálogo.
+    - Los códigos que no existen se recuerdan `ttl_negativo` segundos para
+      que un código mal leído y reescaneado no consulte la BD cada vez.
+
+    La sincronización y la consulta de códigos faltantes van a la BD sin
+    tener el candado: un escaneo no espera la ida y vuelta de otro. Si
+    fallan con una de las excepciones `tolerar` se sigue sirviendo la
+    copia que ya hay en memoria.
+    """
+
+    def __init__(self, cargar, cargar_codigos, cambios=None,
+                 verificar_cada=1.0, ttl_negativo=3.0, tolerar=()):
+        self._cargar = cargar
+        self._cargar_codigos = cargar_codigos
+        self._cambios = cambios
+        self._verificar_cada = verificar_cada
+        self._ttl_negativo = ttl_negativo
+        self._tolerar = tolerar
+
+        self._lock = threading.Lock()
+        self._columnas = None      # _Columnas
+        self._indice = None        # codigo normalizado -> fila
+        self._ordenados = None     # filas por nombre, se arma bajo demanda
+        self._nombres = None       # IndiceNombres, se arma en la primera búsqueda
+        self._negativos = {}       # codigo normalizado -> expiración
+        self._version = None
+        self._ultima_verificacion = 0.0
+        self._sincronizando = False
+        self._generacion = 0       # sube con cada cambio aplicado a la copia
+
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidaciones = 0
+        self.cambios_externos = 0
+        self.recargas_externas = 0
+        self.aciertos_negativos = 0
+        self.errores_bd = 0
+        self.ultimo_error = None
+
+    # -------- Carga --------
+    def _asegurar_cargado(self):
+        """Carga completa si no hay copia. Se llama con el candado tomado."""
+        if self._indice is not None:
+            self.aciertos += 1
+            return
+
+        self.fallos += 1
+        # La versión se lee antes que las filas: lo que cambie durante la
+        # carga llega en la siguiente sincronización
+        version = self._cambios(None)[0] if self._cambios is not None else None
+        self._columnas = _Columnas(self._cargar())
+        self._indice = {}
+        for fila, codigo in enumerate(self._columnas.codigo):
+            # Si el código ya es canónico la llave es la misma cadena
+            clave = normalizar_codigo(codigo)
+            self._indice[codigo if clave == codigo else clave] = fila
+        self._ordenados = None
+        self._nombres = None
+        self._negativos.clear()
+        self._version = version
+        self._ultima_verificacion = time.monotonic()
+
+    def _error_bd(self, error):
+        self.errores_bd += 1
+        self.ultimo_error = str(error)
+
+    def _sincronizar(self, forzar=False, aplicados=()):
+        """
+        Aplica los cambios registrados desde la última versión vista.
+        `aplicados` son claves que quien llama ya dejó al día. Se llama sin
+        el candado: las consultas van fuera y solo el resultado se aplica
+        con él. Un solo hilo sincroniza a la vez; los demás no esperan.
+        """
+        if self._cambios is None:
+            return
+
+        with self._lock:
+            if self._indice is None or self._sincronizando:
+                return
+            ahora = time.monotonic()
+            if not forzar and ahora - self._ultima_verificacion < self._verificar_cada:
+                return
+            self._ultima_verificacion = ahora
+            self._sincronizando = True
+            desde = self._version
+            generacion = self._generacion
+
+        try:
+            try:
+                version, codigos = self._cambios(desde)
+                claves = filas = None
+                if codigos is not None:
+                    claves = list({normalizar_codigo(c) for c in codigos}.difference(aplicados))
+                    filas = self._cargar_codigos(claves) if claves else []
+            except self._tolerar as e:
+                # Sin BD se sigue vendiendo con la copia; se reintenta en la siguiente vuelta
+                self._error_bd(e)
+                return
+
+            with self._lock:
+                if self._indice is None or self._version != desde:
+                    return
+                if codigos is None:
+                    self.recargas_externas += 1
+                    self._indice = None
+                    return
+                if self._generacion != generacion:
+                    # Una escritura aplicó filas mientras se leía: las leídas
+                    # pueden ser más viejas. Se repite en la siguiente lectura.
+                    self._ultima_verificacion = 0.0
+                    return
+                if claves:
+                    self._aplicar(claves, filas)
+                    self.cambios_externos += len(claves)
+                self._version = version
+        finally:
+            self._sincronizando = False
+
+    # -------- Lectura --------
+    def obtener(self):
+        """Lista de productos (vistas) ordenada por nombre."""
+        self._sincronizar()
+        with self._lock:
+            self._asegurar_cargado()
+            columnas = self._columnas
+            if self._ordenados is None:
+                self._ordenados = sorted(self._indice.values(), key=columnas.clave_orden)
+            return [Producto(columnas, fila) for fila in self._ordenados]
+
+    def por_codigo(self, codigo):
+        """
+        Producto con ese código o None. Si no está en el índice se consulta
+        la BD una vez (pudo darse de alta en otro proceso) y el resultado
+        negativo se recuerda unos segundos.
+        """
+        return self.por_codigos([codigo]).get(codigo)
+
+    def por_codigos(self, codigos):
+        """
+        {codigo: producto} de los códigos que existen, con las llaves tal
+        como llegaron. Los que no están en el índice se consultan juntos en
+        un solo `cargar_codigos`.
+        """
+        claves = {codigo: normalizar_codigo(codigo) for codigo in codigos}
+
+        self._sincronizar()
+        with self._lock:
+            self._asegurar_cargado()
+
+            ahora = time.monotonic()
+            faltantes = set()
+            for clave in claves.values():
+                if not clave or clave in self._indice:
+                    continue
+                if self._negativos.get(clave, 0.0) > ahora:
+                    self.aciertos_negativos += 1
+                else:
+                    faltantes.add(clave)
+
+        if faltantes:
+            # Fuera del candado: los demás escaneos no esperan esta consulta
+            faltantes = list(faltantes)
+            try:
+                filas = self._cargar_codigos(faltantes)
+            except self._tolerar as e:
+                # Sin BD un código desconocido cuenta como no encontrado
+                # (sin recordarlo: se vuelve a consultar al reescanear)
+                self._error_bd(e)
+                faltantes = filas = None
+
+        with self._lock:
+            if self._indice is None:
+                self._asegurar_cargado()
+            if faltantes:
+                # Otro hilo pudo agregar alguno mientras tanto; su fila no se pisa
+                faltantes = [clave for clave in faltantes if clave not in self._indice]
+                self._aplicar(faltantes, filas)
+                expira = time.monotonic() + self._ttl_negativo
+                for clave in faltantes:
+                    if clave not in self._indice:
+                        self._negativos[clave] = expira
+
+            productos = {}
+            for codigo, clave in claves.items():
+                fila = self._indice.get(clave)
+                if fila is not None:
+                    productos[codigo] = Producto(self._columnas, fila)
+            return productos
+
+    def buscar_nombre(self, texto, limite=20):
+        """
+        Productos cuyo nombre se parece a `texto` (sin importar acentos,
+        mayúsculas ni errores de dedo), del más al menos parecido.
+        """
+        self._sincronizar()
+        with self._lock:
+            self._asegurar_cargado()
+            if self._nombres is None:
+                self._nombres = IndiceNombres()
+                self._nombres.reconstruir(
+                    (clave, self._columnas.nombre[fila]) for clave, fila in self._indice.items()
+                )
+            return [
+                Producto(self._columnas, self._indice[clave])
+                for clave in self._nombres.buscar(texto, limite)
+            ]
+
+    def __len__(self):
+        self._sincronizar()
+        with self._lock:
+            self._asegurar_cargado()
+            return len(self._indice)
+
+    # -------- Escrituras --------
+    def _aplicar(self, claves, filas):
+        """Sustituye en el índice las `claves` por las `filas` leídas de la BD."""
+        encontrados = {normalizar_codigo(f[0]): f for f in filas}
+        columnas = self._columnas
+        self._generacion += 1
+
+        for clave in claves:
+            datos = encontrados.get(clave)
+            fila = self._indice.get(clave)
+
+            if datos is None:
+                if fila is not None:
+                    del self._indice[clave]
+                    self._ordenados = None
+                    if self._nombres is not None:
+                        self._nombres.quitar(clave)
+                continue
+
+            self._negativos.pop(clave, None)
+            if fila is None:
+                self._indice[clave] = columnas.agregar(*datos)
+                self._ordenados = None
+                if self._nombres is not None:
+                    self._nombres.agregar(clave, datos[1])
+            else:
+                antes = columnas.clave_orden(fila)
+                # Se modifica en su lugar: las vistas ya entregadas ven el
+                # valor nuevo
+                columnas.poner(fila, *datos)
+                if columnas.clave_orden(fila) != antes:
+                    self._ordenados = None
+                    if self._nombres is not None:
+                        self._nombres.agregar(clave, datos[1])
+
+    def refrescar(self, codigos):
+        """Vuelve a leer de la BD solo estos códigos tras una escritura."""
+        claves = [normalizar_codigo(c) for c in codigos]
+        with self._lock:
+            if self._indice is None:
+                return
+            self._aplicar(claves, self._cargar_codigos(claves))
+        self._sincronizar(forzar=True, aplicados=claves)
+
+    def aplicar_stock(self, stocks):
+        """Actualiza el stock ya conocido de varios productos ({codigo: stock})."""
+        with self._lock:
+            if self._indice is None:
+                return
+            claves = []
+            for codigo, stock in stocks.items():
+                clave = normalizar_codigo(codigo)
+                fila = self._indice.get(clave)
+                if fila is not None:
+                    self._columnas.stock[fila] = stock
+                    claves.append(clave)
+            self._generacion += 1
+        # Se avanza la versión sin volver a leer lo que ya se aplicó
+        self._sincronizar(forzar=True, aplicados=claves)
+
+    def invalidar(self):
+        """Descarta la copia; la siguiente lectura recarga desde la BD."""
+        with self._lock:
+            if self._indice is not None:
+                self.invalidaciones += 1
+            self._columnas = None
+            self._indice = None
+            self._ordenados = None
+            self._nombres = None
+            self._negativos.clear()
+            self._generacion += 1
+
+    # -------- Métricas --------
+    def memoria(self):
+        """Bytes aproximados de la copia compartida (columnas e índice)."""
+        if self._indice is None:
+            return 0
+        total = self._columnas.memoria() + sys.getsizeof(self._indice)
+        codigos = {id(c) for c in self._columnas.codigo}
+        for clave, fila in self._indice.items():
+            if id(clave) not in codigos:
+                total += sys.getsizeof(clave)
+            total += sys.getsizeof(fila)
+        return total
+
+    def estadisticas(self):
+        with self._lock:
+            memoria = self.memoria()
+            productos = len(self._indice) if self._indice is not None else 0
+            return {
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "aciertos_negativos": self.aciertos_negativos,
+                "invalidaciones": self.invalidaciones,
+                "cambios_externos": self.cambios_externos,
+                "recargas_externas": self.recargas_externas,
+                "errores_bd": self.errores_bd,
+                "ultimo_error": self.ultimo_error,
+                "version": self._version,
+                "productos": productos,
+                "memoria_bytes": memoria,
+                "bytes_por_producto": round(memoria / productos, 1) if productos else 0.0,
+            }
@@ -0,0 +1,279 @@
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+import pandas as pd
+import streamlit as st
+
+from config import opcion
+from db import abrir_cursor
+
+# ------------------ TURNOS DE CAJA ------------------
+# Cada turno guarda sus totales corrientes (fondo, ventas, ingresos
+# manuales, gastos y tickets). Se actualizan en la misma transacción que
+# registra cada venta o gasto (ver db._acumular_turnos), así el saldo del
+# turno y el corte son una sola lectura por llave, sin recorrer ventas.
+
+CERO = Decimal("0.00")
+
+
+def _a_monto(valor):
+    try:
+        monto = Decimal(str(valor).replace("$", "").replace(",", "").strip())
+        if not monto.is_finite():
+            raise InvalidOperation
+        return monto.quantize(Decimal("0.01"))
+    except InvalidOperation:
+        raise ValueError(f"Monto inválido: {valor!r}")
+
+
+def saldo_esperado(turno):
+    """Efectivo que debería haber en el cajón."""
+    return turno["fondo"] + turno["ventas"] + turno["ingresos"] - turno["gastos"]
+
+
+def abrir_turno(caja, cajero, fondo):
+    """Abre un turno con su fondo inicial y retorna su id."""
+    fondo = _a_monto(fondo)
+    if fondo < 0:
+        raise ValueError("El fondo no puede ser negativo.")
+
+    ahora = datetime.now().replace(microsecond=0)
+    with abrir_cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO turnos (caja, cajero, apertura, fondo)
+            VALUES (%s, %s, %s, %s)
+        """, (caja, cajero, ahora, fondo))
+        turno_id = cursor.lastrowid
+        cursor.execute("""
+            INSERT INTO movimientos_caja (turno_id, fecha, tipo, concepto, monto)
+            VALUES (%s, %s, 'fondo', 'Fondo inicial', %s)
+        """, (turno_id, ahora, fondo))
+    return turno_id
+
+
+def obtener_turno(turno_id):
+    """Turno con sus totales corrientes, o None."""
+    with abrir_cursor(dictionary=True, solo_lectura=True) as cursor:
+        cursor.execute("""
+            SELECT id, caja, cajero, apertura, cierre, fondo, ventas,
+                   ingresos, gastos, tickets, contado
+            FROM turnos
+            WHERE id = %s
+        """, (turno_id,))
+        return cursor.fetchone()
+
+
+def turnos_abiertos():
+    with abrir_cursor(dictionary=True, solo_lectura=True) as cursor:
+        cursor.execute("""
+            SELECT id, caja, cajero, apertura
+            FROM turnos
+            WHERE cierre IS NULL
+            ORDER BY apertura
+        """)
+        return cursor.fetchall()
+
+
+def turnos_cerrados(limite=10):
+    """
+    Últimos turnos cerrados. `tardias` suma las ventas diferidas que
+    llegaron después del corte (no están en los totales del turno).
+    """
+    with abrir_cursor(dictionary=True, solo_lectura=True) as cursor:
+        cursor.execute("""
+            SELECT id, caja, cajero, apertura, cierre, fondo, ventas,
+                   ingresos, gastos, tickets, contado,
+                   (SELECT COALESCE(SUM(m.monto), 0)
+                    FROM movimientos_caja m
+                    WHERE m.turno_id = turnos.id AND m.tipo = 'venta_tardia') AS tardias
+            FROM turnos
+            WHERE cierre IS NOT NULL
+            ORDER BY cierre DESC
+            LIMIT %s
+        """, (limite,))
+        return cursor.fetchall()
+
+
+def registrar_gasto(turno_id, concepto, monto):
+    """Anota un gasto pagado con efectivo del cajón y lo resta del turno."""
+    monto = _a_monto(monto)
+    if monto <= 0:
+        raise ValueError("El monto del gasto debe ser mayor que cero.")
+    if not concepto.strip():
+        raise ValueError("Indica el concepto del gasto.")
+
+    with abrir_cursor() as cursor:
+        cursor.execute("""
+            UPDATE turnos SET gastos = gastos + %s
+            WHERE id = %s AND cierre IS NULL
+        """, (monto, turno_id))
+        if cursor.rowcount != 1:
+            raise ValueError("El turno ya está cerrado.")
+        cursor.execute("""
+            INSERT INTO movimientos_caja (turno_id, fecha, tipo, concepto, monto)
+            VALUES (%s, %s, 'gasto', %s, %s)
+        """, (turno_id, datetime.now().replace(microsecond=0), concepto.strip(), monto))
+
+
+def movimientos_turno(turno_id):
+    with abrir_cursor(dictionary=True, solo_lectura=True) as cursor:
+        cursor.execute("""
+            SELECT fecha, tipo, concepto, monto
+            FROM movimientos_caja
+            WHERE turno_id = %s
+            ORDER BY id DESC
+        """, (turno_id,))
+        return cursor.fetchall()
+
+
+def cerrar_turno(turno_id, contado):
+    """
+    Cierra el turno con el efectivo contado. Los totales ya están al día:
+    el corte no recorre ventas ni gastos. Retorna el turno cerrado.
+    """
+    contado = _a_monto(contado)
+    with abrir_cursor() as cursor:
+        cursor.execute("""
+            UPDATE turnos SET cierre = %s, contado = %s
+            WHERE id = %s AND cierre IS NULL
+        """, (datetime.now().replace(microsecond=0), contado, turno_id))
+        if cursor.rowcount != 1:
+            raise ValueError("El turno ya está cerrado.")
+    return obtener_turno(turno_id)
+
+
+# ------------------ Render ------------------
+def _pesos(valor):
+    return f"${valor:,.2f}"
+
+
+def turno_de_sesion():
+    """Turno abierto de esta sesión (o None si no hay o ya se cerró)."""
+    turno_id = st.session_state.get("turno_id")
+    if turno_id is None:
+        return None
+    turno = obtener_turno(turno_id)
+    if turno is None or turno["cierre"] is not None:
+        st.session_state.pop("turno_id", None)
+        return None
+    return turno
+
+
+def render_resumen_turno(turno):
+    """Saldo del turno en la barra lateral (una lectura por llave)."""
+    st.sidebar.markdown("---")
+    if turno is None:
+        st.sidebar.caption("Sin turno abierto · ábrelo en «Corte de caja».")
+        return
+    st.sidebar.markdown(f"**Turno {turno['caja']}** · {turno['cajero']}")
+    st.sidebar.markdown(
+        f"En caja: **{_pesos(saldo_esperado(turno))}**  \n"
+        f"Ventas {_pesos(turno['ventas'])} · Ingresos {_pesos(turno['ingresos'])}  \n"
+        f"Gastos {_pesos(turno['gastos'])} · Tickets {turno['tickets']:,}"
+    )
+
+
+def render_gastos(turno):
+    st.subheader("Gastos")
+
+    if turno is None:
+        st.info("Abre un turno en «Corte de caja» para registrar gastos.")
+        return
+
+    with st.form("form_gasto", clear_on_submit=True):
+        concepto = st.text_input("Concepto")
+        monto = st.text_input("Monto")
+        if st.form_submit_button("Registrar gasto"):
+            try:
+                registrar_gasto(turno["id"], concepto, monto)
+                st.rerun()
+            except ValueError as e:
+                st.error(str(e))
+
+    gastos = [m for m in movimientos_turno(turno["id"]) if m["tipo"] == "gasto"]
+    if gastos:
+        df = pd.DataFrame(gastos)[["fecha", "concepto", "monto"]]
+        df["monto"] = df["monto"].map(_pesos)
+        st.dataframe(df, hide_index=True, use_container_width=True)
+    else:
+        st.caption("Sin gastos en este turno.")
+
+
+def render_corte_caja(turno):
+    st.subheader("Corte de caja")
+
+    if turno is None:
+        col1, col2 = st.columns(2)
+
+        with col1:
+            with st.form("form_abrir_turno"):
+                st.markdown("**Abrir turno**")
+                caja = st.text_input("Caja", value=opcion("caja", "Caja 1"))
+                cajero = st.text_input("Cajero")
+                fondo = st.text_input("Fondo inicial", value="0")
+                if st.form_submit_button("Abrir turno"):
+                    if not caja.strip() or not cajero.strip():
+                        st.error("Indica la caja y el cajero.")
+                    else:
+                        try:
+                            st.session_state.turno_id = abrir_turno(caja.strip(), cajero.strip(), fondo)
+                            st.rerun()
+                        except ValueError as e:
+                            st.error(str(e))
+
+        # Tras recargar la página la sesión es nueva: se retoma el turno
+        with col2:
+            abiertos = turnos_abiertos()
+            if abiertos:
+                st.markdown("**Continuar turno abierto**")
+                elegido = st.selectbox(
+                    "Turno",
+                    abiertos,
+                    format_func=lambda t: f"{t['caja']} · {t['cajero']} · {t['apertura']:%d/%m %H:%M}"
+                )
+                if st.button("Continuar"):
+                    st.session_state.turno_id = elegido["id"]
+                    st.rerun()
+
+        cerrados = turnos_cerrados()
+        if cerrados:
+            st.markdown("**Últimos cortes**")
+            df = pd.DataFrame(cerrados)
+            df["esperado"] = [saldo_esperado(t) for t in cerrados]
+            df["diferencia"] = df["contado"] - df["esperado"]
+            for columna in ("fondo", "ventas", "ingresos", "gastos", "esperado", "contado",
+                            "diferencia", "tardias"):
+                df[columna] = df[columna].map(_pesos)
+            st.dataframe(
+                df[["caja", "cajero", "apertura", "cierre", "tickets", "fondo", "ventas",
+                    "ingresos", "gastos", "esperado", "contado", "diferencia", "tardias"]],
+                hide_index=True,
+                use_container_width=True
+            )
+        return
+
+    esperado = saldo_esperado(turno)
+    st.caption(f"{turno['caja']} · {turno['cajero']} · desde {turno['apertura']:%d/%m/%Y %H:%M}")
+
+    c1, c2, c3, c4, c5 = st.columns(5)
+    c1.metric("Fondo", _pesos(turno["fondo"]))
+    c2.metric("Ventas", _pesos(turno["ventas"]))
+    c3.metric("Ingresos", _pesos(turno["ingresos"]))
+    c4.metric("Gastos", _pesos(turno["gastos"]))
+    c5.metric("Esperado en caja", _pesos(esperado))
+    st.caption(f"{turno['tickets']:,} tickets en el turno.")
+
+    with st.form("form_cerrar_turno"):
+        contado = st.text_input("Efectivo contado")
+        if st.form_submit_button("Cerrar turno"):
+            try:
+                cerrado = cerrar_turno(turno["id"], contado)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                st.session_state.pop("turno_id", None)
+                diferencia = cerrado["contado"] - saldo_esperado(cerrado)
+                st.success(
+                    f"Turno cerrado. Esperado {_pesos(saldo_esperado(cerrado))}, "
+                    f"contado {_pesos(cerrado['contado'])}, diferencia {_pesos(diferencia)}."
+                )
@@ -0,0 +1,182 @@
+import re
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+import pandas as pd
+
+CODIGO_INGRESO = "INGRESO"
+
+_SEPARADORES = re.compile(r"[\s,;]+")
+
+
+def a_centavos(valor):
+    """
+    Convierte un precio (float, str o Decimal) a centavos enteros.
+    Lanza ValueError si no es un número finito ("abc", "inf", "nan").
+    """
+    try:
+        monto = Decimal(str(valor))
+    except InvalidOperation:
+        raise ValueError(f"Monto inválido: {valor!r}")
+    if not monto.is_finite():
+        raise ValueError(f"Monto inválido: {valor!r}")
+    return int((monto * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+def a_pesos(centavos):
+    return Decimal(centavos).scaleb(-2)
+
+
+def contar_codigos(texto):
+    """
+    Códigos de un escaneo en ráfaga (separados por espacios, saltos de
+    línea, comas o punto y coma) con cuántas veces aparece cada uno, en el
+    orden en que aparecieron por primera vez.
+    """
+    conteo = {}
+    for codigo in _SEPARADORES.split(texto or ""):
+        if codigo:
+            conteo[codigo] = conteo.get(codigo, 0) + 1
+    return conteo
+
+
+class Linea:
+    __slots__ = ("codigo", "nombre", "precio", "cantidad")
+
+    def __init__(self, codigo, nombre, precio, cantidad):
+        self.codigo = codigo
+        self.nombre = nombre
+        self.precio = precio          # centavos
+        self.cantidad = cantidad
+
+    @property
+    def subtotal(self):
+        return self.precio * self.cantidad
+
+
+class Carrito:
+    """
+    Carrito de la venta en curso.
+
+    Los escaneos repetidos de un mismo código se suman en una sola línea y
+    el total (en centavos) y las unidades se mantienen al agregar o quitar,
+    sin recorrer el carrito. La tabla para mostrar se arma solo cuando el
+    carrito cambió desde la última vez.
+    """
+
+    __slots__ = ("_lineas", "_total", "_unidades", "_ingresos",
+                 "_version", "_vista", "_opciones", "_vista_version")
+
+    def __init__(self):
+        self._lineas = {}             # clave -> Linea (en orden de escaneo)
+        self._total = 0
+        self._unidades = 0
+        self._ingresos = 0
+        self._version = 0
+        self._vista = None
+        self._opciones = None
+        self._vista_version = -1
+
+    # -------- Cambios --------
+    def agregar(self, codigo, nombre, precio, cantidad=1):
+        """Suma `cantidad` del producto; si ya estaba, aumenta su línea."""
+        linea = self._lineas.get(codigo)
+        if linea is None:
+            linea = Linea(codigo, nombre, a_centavos(precio), 0)
+            self._lineas[codigo] = linea
+
+        linea.cantidad += cantidad
+        self._total += linea.precio * cantidad
+        self._unidades += cantidad
+        self._version += 1
+
+    def agregar_ingreso(self, monto):
+        """Monto manual ("VARIOS"); cada ingreso es una línea aparte."""
+        self._ingresos += 1
+        clave = f"{CODIGO_INGRESO}#{self._ingresos}"
+        linea = Linea(CODIGO_INGRESO, "VARIOS", a_centavos(monto), 1)
+        self._lineas[clave] = linea
+        self._total += linea.precio
+        self._unidades += 1
+        self._version += 1
+
+    def eliminar(self, clave):
+        """Quita la línea completa y retorna su nombre."""
+        linea = self._lineas.pop(clave)
+        self._total -= linea.subtotal
+        self._unidades -= linea.cantidad
+        self._version += 1
+        return linea.nombre
+
+    def vaciar(self):
+        self._lineas.clear()
+        self._total = 0
+        self._unidades = 0
+        self._version += 1
+
+    # -------- Consultas --------
+    @property
+    def total_centavos(self):
+        return self._total
+
+    @property
+    def total(self):
+        return a_pesos(self._total)
+
+    @property
+    def unidades(self):
+        return self._unidades
+
+    @property
+    def version(self):
+        return self._version
+
+    def cantidad_de(self, codigo):
+        linea = self._lineas.get(codigo)
+        return linea.cantidad if linea is not None else 0
+
+    def __len__(self):
+        return len(self._lineas)
+
+    def __bool__(self):
+        return bool(self._lineas)
+
+    def __iter__(self):
+        """Líneas como dicts, en el formato que espera `db.registrar_venta`."""
+        for linea in self._lineas.values():
+            yield {
+                "codigo": linea.codigo,
+                "nombre": linea.nombre,
+                "precio": a_pesos(linea.precio),
+                "cantidad": linea.cantidad
+            }
+
+    def _armar_vista(self):
+        if self._vista_version == self._version:
+            return
+
+        lineas = list(self._lineas.values())
+        self._vista = pd.DataFrame(
+            {
+                "codigo": [l.codigo for l in lineas],
+                "nombre": [l.nombre for l in lineas],
+                "precio": [f"${a_pesos(l.precio):,.2f}" for l in lineas],
+                "cantidad": [f"{l.cantidad:,.2f}" for l in lineas],
+                "subtotal": [f"${a_pesos(l.subtotal):,.2f}" for l in lineas],
+            },
+            index=range(1, len(lineas) + 1)
+        )
+        self._opciones = [
+            (f"{linea.nombre} – ${a_pesos(linea.subtotal):,.2f}", clave)
+            for clave, linea in self._lineas.items()
+        ]
+        self._vista_version = self._version
+
+    def vista(self):
+        """Tabla formateada para mostrar; se reconstruye solo si hubo cambios."""
+        self._armar_vista()
+        return self._vista
+
+    def opciones(self):
+        """(etiqueta, clave) de cada línea, para el selector de eliminar."""
+        self._armar_vista()
+        return self._opciones
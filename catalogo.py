@@ -1,20 +1,53 @@
+import io
+
 import streamlit as st
 import pandas as pd
 import streamlit.components.v1 as components
 
+from carrito import a_centavos, a_pesos
 from db import (
-    obtener_productos,
+    buscar_productos,
+    buscar_por_nombre,
+    contar_productos,
+    obtener_producto_por_codigo,
     crear_producto,
     actualizar_producto,
     eliminar_producto
 )
+from importacion import importar_csv, exportar_csv
+from metricas import seccion
+
+PRODUCTOS_POR_PAGINA = 50
+
+
+def _precio(texto):
+    """
+    Precio capturado en el formulario como Decimal de pesos. ValueError si
+    no es un número finito: "nan" o "inf" romperían la carga del catálogo.
+    """
+    return a_pesos(a_centavos(texto.strip()))
+
+
+# ------------------ Tabla de productos ------------------
+def construir_tabla(productos, codigo_actual=""):
+    """Tabla con formato de una página de productos, resaltando `codigo_actual`."""
+    df = pd.DataFrame(productos)
+    df.set_index("codigo", inplace=True)
+    df["precio"] = df["precio"].map("${:,.2f}".format)
+
+    codigo_actual = str(codigo_actual).strip()
+
+    def resaltar_codigo(row):
+        if str(row.name).strip() == codigo_actual:
+            return ["background-color: #088602"] * len(row)
+        return [""] * len(row)
+
+    return df.style.apply(resaltar_codigo, axis=1)
+
 
 # ------------------ Render Catálogo ------------------
 def render_catalogo():
 
-    # -------- Obtener productos desde BD --------
-    productos = obtener_productos()
-
     if "codigo_value" not in st.session_state:
         st.session_state.codigo_value = ""
 
@@ -62,18 +95,18 @@ def render_catalogo():
 
     if submitted:
         try:
-            precio_float = float(precio)
+            precio_val = _precio(precio)
             codigo_val = st.session_state.get("codigo_value", "").strip()
 
-            if not codigo_val or not nombre or precio_float <= 0:
+            if not codigo_val or not nombre or precio_val <= 0:
                 st.sidebar.error("Debe completar todos los campos obligatorios.")
-            elif any(str(p["codigo"]).strip() == codigo_val for p in productos):
+            elif obtener_producto_por_codigo(codigo_val) is not None:
                 st.sidebar.error("El código de barras ya está registrado.")
             else:
                 crear_producto(
                     codigo=codigo_val,
                     nombre=nombre,
-                    precio=precio_float,
+                    precio=precio_val,
                     stock=stock
                 )
                 st.sidebar.success("Producto agregado correctamente.")
@@ -82,6 +115,50 @@ def render_catalogo():
         except ValueError:
             st.sidebar.error("El precio debe ser un número válido.")
 
+    # -------- Importar / exportar CSV --------
+    with st.sidebar.expander("Importar / exportar catálogo"):
+        archivo = st.file_uploader(
+            "Lista de precios (CSV: codigo, nombre, precio, stock)",
+            type=["csv"]
+        )
+
+        if archivo is not None and st.button("Importar", use_container_width=True):
+            barra = st.progress(0.0, text="Importando…")
+
+            def avance(filas, fraccion):
+                barra.progress(fraccion or 0.0, text=f"{filas:,} filas leídas")
+
+            try:
+                reporte = importar_csv(archivo, progreso=avance)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                barra.progress(1.0, text=f"{reporte['filas']:,} filas leídas")
+                st.success(f"{reporte['enviadas']:,} productos importados o actualizados.")
+
+                if reporte["errores_filas"]:
+                    st.warning(f"{len(reporte['errores_filas'])} filas con errores:")
+                    st.dataframe(
+                        pd.DataFrame(reporte["errores_filas"], columns=["línea", "error"]),
+                        hide_index=True
+                    )
+                for inicio, fin, mensaje in reporte["errores_lotes"]:
+                    st.error(f"Líneas {inicio}–{fin} no se guardaron: {mensaje}")
+
+        if st.button("Preparar exportación", use_container_width=True):
+            salida = io.StringIO()
+            exportar_csv(salida)
+            st.session_state.catalogo_csv = salida.getvalue().encode("utf-8")
+
+        if st.session_state.get("catalogo_csv"):
+            st.download_button(
+                "Descargar catálogo CSV",
+                st.session_state.catalogo_csv,
+                file_name="catalogo.csv",
+                mime="text/csv",
+                use_container_width=True
+            )
+
     # ------------------ Panel principal ------------------
     col1, col2 = st.columns(2)
 
@@ -89,30 +166,56 @@ def render_catalogo():
     with col1:
         st.subheader("Productos registrados")
 
-        if productos:
-            df = pd.DataFrame(productos)
-            df.set_index("codigo", inplace=True)
+        filtro = st.text_input("Buscar producto")
+        codigo_actual = st.session_state.get("codigo_value", "")
 
-            df_styled = df.copy()
-            df_styled["precio"] = df_styled["precio"].map("${:,.2f}".format)
+        if filtro.strip():
+            # Búsqueda tolerante en el índice en memoria, por parecido
+            resultados = buscar_por_nombre(filtro, PRODUCTOS_POR_PAGINA)
+            if resultados:
+                st.caption(f"{len(resultados)} productos más parecidos a «{filtro}»")
+                with seccion("catalogo.tabla"):
+                    st.write(construir_tabla(resultados, codigo_actual))
+            else:
+                st.info("Ningún producto coincide con la búsqueda.")
+        else:
+            # Listado completo por páginas. Pila de llaves (nombre, codigo)
+            # donde empieza cada página.
+            if "catalogo_paginas" not in st.session_state:
+                st.session_state.catalogo_paginas = [None]
+
+            paginas = st.session_state.catalogo_paginas
+            productos, hay_mas = buscar_productos(
+                despues_de=paginas[-1],
+                limite=PRODUCTOS_POR_PAGINA
+            )
 
-            filtro = st.text_input("Buscar producto")
-            codigo_actual = st.session_state.get("codigo_value", "")
+            if productos:
+                total = contar_productos()
+                st.caption(
+                    f"Página {len(paginas)} de "
+                    f"{max(1, -(-total // PRODUCTOS_POR_PAGINA))} · {total:,} productos"
+                )
 
-            def resaltar_codigo(row):
-                if str(row.name).strip() == str(codigo_actual).strip():
-                    return ["background-color: #088602"] * len(row)
-                return [""] * len(row)
+                with seccion("catalogo.tabla"):
+                    st.write(construir_tabla(productos, codigo_actual))
 
-            if filtro:
-                df_filtrado = df_styled[
-                    df_styled["nombre"].str.contains(filtro, case=False, na=False)
-                ]
-                st.write(df_filtrado.style.apply(resaltar_codigo, axis=1))
+                p1, p2 = st.columns(2)
+                with p1:
+                    if len(paginas) > 1 and st.button("◀ Anterior", use_container_width=True):
+                        paginas.pop()
+                        st.rerun()
+                with p2:
+                    if hay_mas and st.button("Siguiente ▶", use_container_width=True):
+                        ultimo = productos[-1]
+                        paginas.append((ultimo["nombre"], ultimo["codigo"]))
+                        st.rerun()
+            elif len(paginas) > 1:
+                # La página guardada quedó vacía (p. ej. se borraron productos)
+                st.session_state.catalogo_paginas = [None]
+                st.rerun()
             else:
-                st.write(df_styled.style.apply(resaltar_codigo, axis=1))
-        else:
-            st.info("No hay productos registrados.")
+                st.info("No hay productos registrados.")
 
 
     # -------- Editar / Eliminar --------
@@ -120,13 +223,9 @@ def render_catalogo():
         st.markdown("### Editar / Eliminar producto")
 
         codigo_edicion = st.session_state.get("codigo_input", "").strip()
-        producto_sel_idx = next(
-            (i for i, p in enumerate(productos) if str(p["codigo"]).strip() == codigo_edicion),
-            None
-        )
+        producto_sel = obtener_producto_por_codigo(codigo_edicion)
 
-        if producto_sel_idx is not None:
-            producto_sel = productos[producto_sel_idx]
+        if producto_sel is not None:
 
             nuevo_nombre = st.text_input(
                 "Nuevo nombre",
@@ -162,28 +261,36 @@ def render_catalogo():
             with c1:
                 if st.button("Guardar cambios", use_container_width="True"):
                     try:
+                        precio_val = _precio(nuevo_precio)
+                    except ValueError:
+                        precio_val = None
+                        st.error("El precio debe ser un número válido.")
+
+                    if precio_val is not None and precio_val <= 0:
+                        st.error("El precio debe ser mayor que cero.")
+                    elif precio_val is not None:
                         from db import actualizar_stock, sumar_stock
 
-                        productos[producto_sel_idx]["nombre"] = nuevo_nombre
-                        productos[producto_sel_idx]["precio"] = float(nuevo_precio)
+                        # Los productos vienen de la caché compartida:
+                        # se actualiza la BD y la caché se invalida sola.
+                        actualizar_producto(
+                            producto_sel["codigo"],
+                            nuevo_nombre,
+                            precio_val
+                        )
 
                         if agregar_stock > 0:
                             sumar_stock(producto_sel["codigo"], agregar_stock)
-                            productos[producto_sel_idx]["stock"] += agregar_stock
                         else:
                             actualizar_stock(producto_sel["codigo"], nuevo_stock)
-                            productos[producto_sel_idx]["stock"] = nuevo_stock
 
                         st.success("Producto actualizado correctamente.")
                         st.rerun()
 
-                    except ValueError:
-                        st.error("El precio debe ser un número válido.")
-
 
             with c2:
                 if st.button("Eliminar producto", use_container_width="True"):
-                    del productos[producto_sel_idx]
+                    eliminar_producto(producto_sel["codigo"])
                     st.success("Producto eliminado correctamente.")
                     st.rerun()
 
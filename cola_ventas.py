@@ -0,0 +1,328 @@
+import json
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+
+from mysql.connector import errors
+
+from config import opcion
+
+# ------------------ COLA DE VENTAS DIFERIDAS ------------------
+# En modo diferido la venta se guarda primero en un diario local (SQLite)
+# y se confirma al cajero de inmediato. Un hilo en segundo plano envía las
+# ventas pendientes a la BD principal por lotes, con reintentos. Cada venta
+# lleva una clave única para que un reenvío no la duplique.
+#
+# Si la BD no responde (error transitorio) se reintenta todo con espera
+# creciente. Si un lote falla por otra cosa se envía venta por venta: las
+# buenas pasan y la que falla suma un intento; al llegar a
+# `intentos_maximos` pasa a `descartadas` para no frenar a las demás.
+
+INTENTOS_MAXIMOS = 5
+
+# Errores de conexión o de bloqueo: no son culpa de la venta
+_TRANSITORIOS = (
+    errors.InterfaceError, errors.OperationalError, errors.PoolError,
+    ConnectionError, TimeoutError,
+)
+# Por número, porque mysql.connector no siempre los lanza con la clase
+# esperada: 1205 (espera de candado, DatabaseError) y 1213 (deadlock,
+# InternalError) pasan mientras un corte o un conteo bloquea `productos`;
+# 2006 y 2013 son la conexión perdida.
+_ERRNO_TRANSITORIOS = {1205, 1213, 2006, 2013}
+
+
+def _es_transitorio(error):
+    return (isinstance(error, _TRANSITORIOS)
+            or getattr(error, "errno", None) in _ERRNO_TRANSITORIOS)
+
+
+def _a_json(valor):
+    if isinstance(valor, Decimal):
+        return str(valor)
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    raise TypeError(f"No se puede guardar {type(valor).__name__} en el diario")
+
+
+def _total_guardado(carrito):
+    # Una venta descartada puede traer justo el carrito que no se entiende
+    try:
+        return sum(
+            (Decimal(l["precio"]) * int(l["cantidad"]) for l in json.loads(carrito)),
+            Decimal("0.00")
+        )
+    except (ValueError, TypeError, KeyError, ArithmeticError):
+        return None
+
+
+class ColaVentas:
+    """
+    Diario local de ventas pendientes + hilo que lo vacía hacia `destino`.
+
+    `destino(lote)` recibe una lista de dicts con clave, fecha, carrito y turno
+    (normalmente `db.registrar_ventas`) y debe lanzar una excepción si no
+    pudo registrarlas; en ese caso el lote se reintenta más tarde, con
+    espera creciente entre `espera_min` y `espera_max` segundos.
+    """
+
+    def __init__(self, ruta, destino, lote=20, espera_max=30.0, espera_min=0.5,
+                 intentos_maximos=INTENTOS_MAXIMOS):
+        self._ruta = ruta
+        self._destino = destino
+        self._lote = lote
+        self._espera_max = espera_max
+        self._espera_min = espera_min
+        self._intentos_maximos = intentos_maximos
+
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._detener = threading.Event()
+        self._hilo = None
+
+        self.enviadas = 0
+        self.fallos = 0
+        self.ultimo_error = None
+
+        with self._conectar() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS pendientes (
+                    n INTEGER PRIMARY KEY AUTOINCREMENT,
+                    clave TEXT NOT NULL UNIQUE,
+                    fecha TEXT NOT NULL,
+                    carrito TEXT NOT NULL,
+                    intentos INTEGER NOT NULL DEFAULT 0,
+                    turno INTEGER
+                )
+            """)
+            # Diarios creados antes de los turnos de caja
+            columnas = {fila[1] for fila in conn.execute("PRAGMA table_info(pendientes)")}
+            if "turno" not in columnas:
+                conn.execute("ALTER TABLE pendientes ADD COLUMN turno INTEGER")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS descartadas (
+                    n INTEGER PRIMARY KEY,
+                    clave TEXT NOT NULL UNIQUE,
+                    fecha TEXT NOT NULL,
+                    carrito TEXT NOT NULL,
+                    intentos INTEGER NOT NULL,
+                    turno INTEGER,
+                    error TEXT,
+                    descartada TEXT NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _conectar(self):
+        conn = sqlite3.connect(self._ruta, timeout=10)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # -------- Encolar --------
+    def encolar(self, carrito, fecha=None, turno=None):
+        """
+        Guarda la venta en el diario local y retorna su clave.
+        Cuando esta función regresa la venta ya sobrevive a un reinicio.
+        """
+        clave = uuid.uuid4().hex
+        fecha = fecha or datetime.now().replace(microsecond=0)
+
+        with self._lock, self._conectar() as conn:
+            conn.execute(
+                "INSERT INTO pendientes (clave, fecha, carrito, turno) VALUES (?, ?, ?, ?)",
+                (clave, fecha.isoformat(), json.dumps(list(carrito), default=_a_json), turno)
+            )
+
+        self._despertar.set()
+        return clave
+
+    def pendientes(self):
+        """Número de ventas que aún no llegan a la BD."""
+        with self._conectar() as conn:
+            return conn.execute("SELECT COUNT(*) FROM pendientes").fetchone()[0]
+
+    # -------- Descartadas --------
+    def descartadas(self):
+        """Ventas que agotaron sus intentos, con el último error."""
+        with self._conectar() as conn:
+            filas = conn.execute("""
+                SELECT clave, fecha, carrito, intentos, error, descartada
+                FROM descartadas
+                ORDER BY n
+            """).fetchall()
+        return [
+            {
+                "clave": clave,
+                "fecha": datetime.fromisoformat(fecha),
+                "total": _total_guardado(carrito),
+                "intentos": intentos,
+                "error": error,
+                "descartada": datetime.fromisoformat(descartada)
+            }
+            for clave, fecha, carrito, intentos, error, descartada in filas
+        ]
+
+    def reintentar_descartadas(self):
+        """Devuelve las descartadas a la cola (p. ej. tras corregir la causa)."""
+        with self._lock, self._conectar() as conn:
+            conn.execute("""
+                INSERT INTO pendientes (n, clave, fecha, carrito, intentos, turno)
+                SELECT n, clave, fecha, carrito, 0, turno FROM descartadas
+            """)
+            movidas = conn.execute("DELETE FROM descartadas").rowcount
+        self._despertar.set()
+        return movidas
+
+    # -------- Envío --------
+    def _siguiente_lote(self):
+        with self._conectar() as conn:
+            filas = conn.execute("""
+                SELECT n, clave, fecha, carrito, turno
+                FROM pendientes
+                ORDER BY n
+                LIMIT ?
+            """, (self._lote,)).fetchall()
+
+        return [
+            {
+                "n": n,
+                "clave": clave,
+                "fecha": datetime.fromisoformat(fecha),
+                "carrito": json.loads(carrito),
+                "turno": turno
+            }
+            for n, clave, fecha, carrito, turno in filas
+        ]
+
+    def _enviar(self, lote):
+        self._destino([
+            {"clave": v["clave"], "fecha": v["fecha"], "carrito": v["carrito"], "turno": v["turno"]}
+            for v in lote
+        ])
+        with self._lock, self._conectar() as conn:
+            conn.executemany(
+                "DELETE FROM pendientes WHERE n = ?",
+                [(v["n"],) for v in lote]
+            )
+        self.enviadas += len(lote)
+        return len(lote)
+
+    def _fallo_propio(self, venta, error):
+        """Suma un intento a la venta; si ya no le quedan, la descarta."""
+        with self._lock, self._conectar() as conn:
+            conn.execute("UPDATE pendientes SET intentos = intentos + 1 WHERE n = ?", (venta["n"],))
+            conn.execute("""
+                INSERT INTO descartadas (n, clave, fecha, carrito, intentos, turno, error, descartada)
+                SELECT n, clave, fecha, carrito, intentos, turno, ?, ?
+                FROM pendientes
+                WHERE n = ? AND intentos >= ?
+            """, (str(error), datetime.now().isoformat(timespec="seconds"),
+                  venta["n"], self._intentos_maximos))
+            conn.execute("""
+                DELETE FROM pendientes
+                WHERE n = ? AND n IN (SELECT n FROM descartadas)
+            """, (venta["n"],))
+
+    def enviar_pendientes(self):
+        """
+        Envía un lote al destino. Retorna cuántas ventas se enviaron;
+        deja la excepción del destino subir si no pasó ninguna.
+        """
+        lote = self._siguiente_lote()
+        if not lote:
+            return 0
+
+        try:
+            return self._enviar(lote)
+        except Exception as e:
+            if _es_transitorio(e):
+                raise
+            if len(lote) == 1:
+                self._fallo_propio(lote[0], e)
+                raise
+            error = e
+
+        # Algo del lote no pasa: venta por venta para aislar la culpable
+        enviadas = 0
+        for venta in lote:
+            try:
+                enviadas += self._enviar([venta])
+            except Exception as e:
+                if _es_transitorio(e):
+                    raise
+                error = e
+                self._fallo_propio(venta, e)
+        if not enviadas:
+            raise error
+        return enviadas
+
+    def _trabajar(self):
+        espera = self._espera_min
+        while not self._detener.is_set():
+            try:
+                enviadas = self.enviar_pendientes()
+                self.ultimo_error = None
+                espera = self._espera_min
+            except Exception as e:
+                self.fallos += 1
+                self.ultimo_error = str(e)
+                enviadas = 0
+                # Reintento con espera creciente mientras la BD no responde
+                self._detener.wait(espera)
+                espera = min(espera * 2, self._espera_max)
+                continue
+
+            if not enviadas:
+                self._despertar.wait(self._espera_max)
+                self._despertar.clear()
+
+    def iniciar(self):
+        if self._hilo is None or not self._hilo.is_alive():
+            self._detener.clear()
+            self._hilo = threading.Thread(
+                target=self._trabajar, name="sgventas-cola", daemon=True
+            )
+            self._hilo.start()
+
+    def detener(self, espera=5.0):
+        self._detener.set()
+        self._despertar.set()
+        if self._hilo is not None:
+            self._hilo.join(espera)
+
+
+# ------------------ Cola del proceso ------------------
+_cola = None
+_cola_lock = threading.Lock()
+
+
+def modo_diferido():
+    """True si la configuración pide registrar ventas en modo diferido."""
+    return opcion("modo_venta", "directo") == "diferido"
+
+
+def obtener_cola():
+    """Cola compartida por todas las sesiones, con su hilo ya en marcha."""
+    global _cola
+
+    if _cola is None:
+        with _cola_lock:
+            if _cola is None:
+                from db import registrar_ventas
+
+                _cola = ColaVentas(
+                    opcion("diario_ventas", "ventas_pendientes.sqlite3"),
+                    registrar_ventas,
+                    lote=int(opcion("cola_lote", 20)),
+                    intentos_maximos=int(opcion("cola_intentos", INTENTOS_MAXIMOS))
+                )
+                _cola.iniciar()
+    return _cola
@@ -0,0 +1,12 @@
+import streamlit as st
+
+
+def opcion(clave, defecto=None):
+    """
+    Opción de la sección [sgventas] de los secrets.
+    Retorna `defecto` si no existe la sección, la clave o el archivo.
+    """
+    try:
+        return st.secrets.get("sgventas", {}).get(clave, defecto)
+    except FileNotFoundError:
+        return defecto
@@ -1,184 +1,1163 @@
-import mysql.connector
-import os
+from mysql.connector import errors, pooling
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from cache_catalogo import CacheCatalogo, normalizar_codigo
+from carrito import CODIGO_INGRESO
+from config import opcion
+from metricas import medir, registrar
 
 # ------------------ CONEXIÓN ------------------
-def get_connection():
-    return mysql.connector.connect(
-        host=st.secrets["mysql"]["host"],
-        user=st.secrets["mysql"]["user"],
-        password=st.secrets["mysql"]["password"],
-        database=st.secrets["mysql"]["database"]
+# Un solo pool por proceso: Streamlit importa este módulo una vez y todas
+# las sesiones (terminales) comparten las mismas conexiones abiertas.
+# `motor = "sqlite"` en [sgventas] usa un archivo local en lugar de un
+# servidor MySQL (ver motor_sqlite.py); el resto del módulo no cambia.
+_pool = None
+_motor = "mysql"
+_pool_espera = None
+_pool_lock = threading.Lock()
+
+POOL_SIZE_DEFECTO = 5
+POOL_ESPERA_DEFECTO = 5.0
+
+# -------- Réplicas de lectura --------
+# Opcionales: `replicas = [{ host = "..." }, ...]` en [mysql]. Cada réplica
+# hereda usuario, clave, base y tamaño de pool del primario salvo que los
+# indique. Las lecturas de listados y reportes (`lectura=True`) se reparten
+# entre ellas; las escrituras y todo lo demás van al primario.
+REPLICA_REINTENTO = 30.0       # s fuera de rotación tras una falla
+REPLICA_VERIFICAR_CADA = 10.0  # s entre revisiones de retraso
+REPLICA_RETRASO_MAX = 5.0      # s; más atrasada se trata como caída
+ER_ACCESO_ESPECIFICO = 1227    # falta el privilegio (REPLICATION CLIENT)
+
+
+class _Replica:
+    __slots__ = ("nombre", "config", "tamano", "pool", "caida_hasta", "verificada", "retraso", "error")
+
+    def __init__(self, nombre, config, tamano):
+        self.nombre = nombre
+        self.config = config
+        self.tamano = tamano
+        self.pool = None
+        self.caida_hasta = 0.0
+        self.verificada = 0.0
+        self.retraso = None
+        self.error = None
+
+
+_replicas = []
+_replica_turno = 0
+_replica_espera = 0.5
+_retraso_max = REPLICA_RETRASO_MAX
+
+# Sesión -> instante hasta el que sus lecturas van al primario
+_escrituras = {}
+
+
+def _config_bd():
+    """Sección [mysql] o [sqlite] de los secrets, según `motor`."""
+    motor = opcion("motor", "mysql")
+    if motor == "sqlite":
+        return {"motor": motor, **dict(st.secrets.get("sqlite", {}))}
+    return {"motor": motor, **dict(st.secrets["mysql"])}
+
+
+def _nuevo_pool(nombre, config, pool_size):
+    if _motor == "sqlite":
+        from motor_sqlite import PoolSQLite
+        return PoolSQLite(nombre, pool_size, **config)
+    return pooling.MySQLConnectionPool(
+        pool_name=nombre,
+        pool_size=pool_size,
+        pool_reset_session=True,
+        **config
     )
 
 
+def _crear_pool(config):
+    global _pool, _pool_espera, _replicas, _retraso_max, _motor
+
+    config = dict(config)
+    _motor = config.pop("motor", "mysql")
+    pool_size = int(config.pop("pool_size", POOL_SIZE_DEFECTO))
+    _pool_espera = float(config.pop("pool_timeout", POOL_ESPERA_DEFECTO))
+    _retraso_max = float(config.pop("replica_retraso_max", REPLICA_RETRASO_MAX))
+    replicas = config.pop("replicas", None) or []
+
+    _pool = _nuevo_pool("sgventas", config, pool_size)
+
+    # Los pools de réplicas se abren al primer uso: una réplica apagada
+    # no debe impedir que arranque la aplicación. Con SQLite no hay.
+    _replicas = []
+    if _motor == "sqlite":
+        replicas = []
+    for i, extra in enumerate(replicas):
+        extra = dict(extra)
+        tamano = int(extra.pop("pool_size", pool_size))
+        _replicas.append(_Replica(f"sgventas_r{i}", {**config, **extra}, tamano))
+    return _pool
+
+
+def inicializar_pool(config=None):
+    """
+    Crea (o recrea) el pool de conexiones del proceso.
+    Si no se indica `config` se usa la sección [mysql] (o [sqlite]) de los
+    secrets. `motor` ("mysql" o "sqlite") elige la base de datos; con
+    SQLite `ruta` es el archivo.
+    Opciones extra: pool_size (conexiones), pool_timeout (segundos de espera
+    cuando todas las conexiones están ocupadas), replicas (lista de
+    conexiones de solo lectura) y replica_retraso_max (segundos).
+    """
+    with _pool_lock:
+        return _crear_pool(config if config is not None else _config_bd())
+
+
+def _obtener_pool():
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _crear_pool(_config_bd())
+    return _pool
+
+
+def motor():
+    """Base de datos en uso: "mysql" o "sqlite"."""
+    _obtener_pool()
+    return _motor
+
+
+def _conexion_de(pool, espera):
+    """
+    Toma una conexión de `pool`, esperando hasta `espera` segundos si están
+    todas ocupadas. Verifica que siga viva y la reconecta si caducó
+    (p. ej. por wait_timeout del servidor).
+    """
+    limite = time.monotonic() + espera
+
+    while True:
+        try:
+            conn = pool.get_connection()
+            break
+        except errors.PoolError:
+            if time.monotonic() >= limite:
+                raise
+            time.sleep(0.01)
+
+    try:
+        conn.ping(reconnect=True, attempts=2, delay=0)
+    except errors.Error:
+        conn.close()
+        raise
+    return conn
+
+
+# -------- Lectura de lo propio --------
+def _sesion():
+    """Sesión de Streamlit en curso (o el hilo, fuera de un rerun)."""
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx is not None else threading.get_ident()
+
+
+def marcar_escritura():
+    """
+    Anota que esta sesión acaba de escribir: durante `replica_retraso_max`
+    segundos sus lecturas van al primario y ve sus propios cambios aunque
+    las réplicas vayan atrasadas.
+    """
+    if not _replicas:
+        return
+    ahora = time.monotonic()
+    _escrituras[_sesion()] = ahora + _retraso_max
+    if len(_escrituras) > 1000:
+        for sesion, hasta in list(_escrituras.items()):
+            if hasta <= ahora:
+                _escrituras.pop(sesion, None)
+
+
+def _lee_del_primario():
+    return _escrituras.get(_sesion(), 0.0) > time.monotonic()
+
+
+def _retraso_replica(conn):
+    """
+    Segundos de atraso de la réplica; None si no replica (sin fila de
+    estado, p. ej. una segunda BD local). Lanza ValueError si replica
+    pero el atraso no se puede saber: hilos de replicación detenidos o
+    rotos (atraso NULL) o un usuario sin permiso para consultarlo.
+    """
+    cursor = conn.cursor(dictionary=True)
+    try:
+        for consulta, columna in (
+            ("SHOW REPLICA STATUS", "Seconds_Behind_Source"),
+            ("SHOW SLAVE STATUS", "Seconds_Behind_Master"),
+        ):
+            try:
+                cursor.execute(consulta)
+                fila = cursor.fetchone()
+            except errors.Error as e:
+                if e.errno == ER_ACCESO_ESPECIFICO:
+                    raise ValueError(f"sin permiso para {consulta} (REPLICATION CLIENT)")
+                # Sintaxis de otra versión de MySQL: se prueba la siguiente
+                continue
+            if fila is None:
+                # Sin replicación configurada
+                return None
+            retraso = fila.get(columna)
+            if retraso is None:
+                raise ValueError("replicación detenida (atraso desconocido)")
+            return retraso
+        return None
+    finally:
+        cursor.close()
+
+
+def _conexion_replica():
+    """
+    Conexión a una réplica sana, por turnos. Si una falla o va demasiado
+    atrasada sale de la rotación por `REPLICA_REINTENTO` segundos.
+    Retorna None si no hay ninguna disponible (se usa el primario).
+    """
+    global _replica_turno
+
+    ahora = time.monotonic()
+    candidatas = [r for r in _replicas if r.caida_hasta <= ahora]
+    if not candidatas:
+        return None
+
+    _replica_turno += 1
+    for i in range(len(candidatas)):
+        replica = candidatas[(_replica_turno + i) % len(candidatas)]
+        try:
+            if replica.pool is None:
+                with _pool_lock:
+                    if replica.pool is None:
+                        replica.pool = _nuevo_pool(replica.nombre, replica.config, replica.tamano)
+            conn = _conexion_de(replica.pool, _replica_espera)
+        except errors.PoolError:
+            # Ocupada, no caída
+            continue
+        except errors.Error as e:
+            replica.caida_hasta = ahora + REPLICA_REINTENTO
+            replica.error = str(e)
+            continue
+
+        if ahora - replica.verificada >= REPLICA_VERIFICAR_CADA:
+            replica.verificada = ahora
+            motivo = None
+            try:
+                replica.retraso = _retraso_replica(conn)
+            except errors.Error:
+                replica.retraso = None
+            except ValueError as e:
+                # Puede ir atrasada sin límite: igual que una muy atrasada
+                replica.retraso = None
+                motivo = str(e)
+            if replica.retraso is not None and replica.retraso > _retraso_max:
+                motivo = f"{replica.retraso} s de retraso"
+            if motivo is not None:
+                conn.close()
+                replica.caida_hasta = ahora + REPLICA_REINTENTO
+                replica.error = motivo
+                continue
+
+        replica.error = None
+        return conn
+    return None
+
+
+def _tomar_conexion(lectura=False, solo_lectura=False):
+    """
+    Conexión del primario o, para lecturas que toleran algo de retraso,
+    de una réplica. Sin réplicas disponibles, o si la sesión escribió hace
+    poco, las lecturas también van al primario. `solo_lectura` es una
+    lectura que debe ir al primario: en SQLite no toma el candado de
+    escritura.
+    """
+    inicio = time.monotonic()
+
+    if lectura and _replicas and not _lee_del_primario():
+        conn = _conexion_replica()
+        if conn is not None:
+            registrar("db.conexion_replica", time.monotonic() - inicio)
+            return conn
+
+    try:
+        conn = _conexion_de(_obtener_pool(), _pool_espera)
+    except Exception:
+        # Pool agotado tras la espera o servidor caído: también se mide
+        registrar("db.conexion", time.monotonic() - inicio, error=True)
+        raise
+    if _motor == "sqlite":
+        # Las de escritura toman el candado al empezar (ver motor_sqlite)
+        conn.lectura = lectura or solo_lectura
+
+    # Tiempo de espera por una conexión libre + ping
+    registrar("db.conexion", time.monotonic() - inicio)
+    return conn
+
+
+def get_connection():
+    """
+    Conexión prestada del pool. Al llamar `close()` vuelve al pool.
+    Preferir `conexion()` o `abrir_cursor()`.
+    """
+    return _tomar_conexion()
+
+
+@contextmanager
+def conexion(lectura=False, solo_lectura=False):
+    """
+    Presta una conexión del pool durante el bloque `with`.
+    Hace rollback si el bloque lanza una excepción y siempre la devuelve.
+    Con `lectura=True` puede venir de una réplica: solo para SELECT.
+    Con `solo_lectura=True` viene del primario y solo se usa para SELECT:
+    con SQLite no espera a las escrituras en curso ni las detiene.
+    """
+    conn = _tomar_conexion(lectura, solo_lectura)
+    try:
+        yield conn
+    except Exception:
+        try:
+            conn.rollback()
+        except errors.Error:
+            pass
+        raise
+    finally:
+        conn.close()
+
+
+@contextmanager
+def abrir_cursor(dictionary=False, lectura=False, solo_lectura=False):
+    """
+    Cursor sobre una conexión del pool (ver `conexion`).
+    Hace commit al salir del bloque sin errores.
+    """
+    with conexion(lectura, solo_lectura) as conn:
+        cursor = conn.cursor(dictionary=dictionary)
+        try:
+            yield cursor
+            conn.commit()
+        finally:
+            cursor.close()
+
+
+def estado_replicas():
+    """Estado de cada réplica para el panel de diagnóstico."""
+    ahora = time.monotonic()
+    return [
+        {
+            "replica": r.nombre,
+            "host": r.config.get("host"),
+            "disponible": r.caida_hasta <= ahora,
+            "retraso_s": r.retraso,
+            "error": r.error,
+        }
+        for r in _replicas
+    ]
+
+
 # ======================================================
 # ===================== PRODUCTOS ======================
 # ======================================================
 
 # -------- CREATE --------
+@medir("db.crear_producto")
 def crear_producto(codigo, nombre, precio, stock=0):
-    conn = get_connection()
-    cursor = conn.cursor()
+    marcar_escritura()
+    with abrir_cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO productos (codigo, nombre, precio, stock)
+            VALUES (%s, %s, %s, %s)
+        """, (codigo, nombre, precio, stock))
+        registrar_movimientos(cursor, [
+            (datetime.now().replace(microsecond=0), codigo, MOVIMIENTO_ENTRADA, int(stock), "alta")
+        ])
+    _catalogo.refrescar([codigo])
+
+
+# -------- READ (uno) --------
+@medir("db.obtener_producto")
+def obtener_producto(codigo):
+    with abrir_cursor(dictionary=True, solo_lectura=True) as cursor:
+        cursor.execute(
+            "SELECT * FROM productos WHERE codigo = %s",
+            (codigo,)
+        )
+        return cursor.fetchone()
+
+
+# -------- READ (todos) --------
+# Tuplas (codigo, nombre, precio, stock): la caché las pasa a columnas y
+# no hace falta un dict por producto. Siempre del primario: la carga y el
+# registro de cambios tienen que venir del mismo servidor.
+@medir("db.cargar_productos")
+def _cargar_productos():
+    with abrir_cursor(solo_lectura=True) as cursor:
+        cursor.execute("""
+            SELECT codigo, nombre, precio, stock
+            FROM productos
+        """)
+        return cursor.fetchall()
 
-    query = """
-        INSERT INTO productos (codigo, nombre, precio, stock)
-        VALUES (%s, %s, %s, %s)
+
+@medir("db.cargar_codigos")
+def _cargar_codigos(codigos):
+    """Filas de `productos` para una lista de códigos (un solo SELECT ... IN)."""
+    if not codigos:
+        return []
+    marcadores = ", ".join(["%s"] * len(codigos))
+    with abrir_cursor(solo_lectura=True) as cursor:
+        cursor.execute(f"""
+            SELECT codigo, nombre, precio, stock
+            FROM productos
+            WHERE codigo IN ({marcadores})
+        """, list(codigos))
+        return cursor.fetchall()
+
+
+# -------- Registro de cambios --------
+# Los triggers de `productos` (ver esquema.py) anotan en `productos_cambios`
+# cada código insertado, modificado o borrado, desde cualquier caja o
+# herramienta. Cada proceso consulta "qué cambió después del id N" y
+# vuelve a leer solo esos productos.
+CAMBIOS_MAXIMOS = 1000
+# Un cambio se anota al ejecutarse pero se ve al confirmar la transacción:
+# un id menor puede aparecer después de uno mayor. Los cambios de los
+# últimos segundos se vuelven a entregar para no perder esos casos.
+CAMBIOS_VENTANA = 5
+CAMBIOS_RETENCION_HORAS = 24
+CAMBIOS_PURGAR_CADA = 3600.0
+
+_ultima_purga = 0.0
+
+
+@medir("db.cambios_productos")
+def _cambios_productos(desde):
+    """
+    (version, codigos) cambiados después de la versión `desde`. Con
+    desde=None solo retorna la versión actual; codigos=None indica que
+    conviene recargar todo (demasiados cambios o registro ya purgado).
     """
-    cursor.execute(query, (codigo, nombre, precio, stock))
+    if motor() == "sqlite":
+        # Un solo proceso usa el archivo: la caché ya ve todos los cambios
+        return desde or 0, []
 
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with abrir_cursor() as cursor:
+        try:
+            cursor.execute("SELECT MIN(id), MAX(id) FROM productos_cambios")
+        except errors.ProgrammingError:
+            # Sin registro (migración pendiente): no hay sincronización
+            return desde or 0, []
+        minimo, maximo = cursor.fetchone()
+        maximo = maximo or 0
 
-def obtener_productos():
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
+        if desde is None:
+            return maximo, []
+        if minimo is not None and desde < minimo - 1:
+            # Se purgaron cambios que este proceso no alcanzó a ver
+            return maximo, None
 
-    cursor.execute("""
-        SELECT codigo, nombre, precio, stock
-        FROM productos
-        ORDER BY nombre
-    """)
+        cursor.execute("""
+            SELECT DISTINCT codigo
+            FROM productos_cambios
+            WHERE id > %s
+               OR fecha >= NOW(3) - INTERVAL %s SECOND
+            LIMIT %s
+        """, (desde, CAMBIOS_VENTANA, CAMBIOS_MAXIMOS + 1))
+        codigos = [fila[0] for fila in cursor.fetchall()]
 
-    productos = cursor.fetchall()
+        _purgar_cambios(cursor)
 
-    cursor.close()
-    conn.close()
+    if len(codigos) > CAMBIOS_MAXIMOS:
+        return maximo, None
+    return max(desde, maximo), codigos
 
-    return productos
 
+def _purgar_cambios(cursor):
+    global _ultima_purga
 
-# -------- READ (uno) --------
-def obtener_producto(codigo):
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
+    ahora = time.monotonic()
+    if ahora - _ultima_purga < CAMBIOS_PURGAR_CADA:
+        return
+    _ultima_purga = ahora
 
-    cursor.execute(
-        "SELECT * FROM productos WHERE codigo = %s",
-        (codigo,)
-    )
-    producto = cursor.fetchone()
+    cursor.execute("""
+        DELETE FROM productos_cambios
+        WHERE fecha < NOW(3) - INTERVAL %s HOUR
+        LIMIT 10000
+    """, (CAMBIOS_RETENCION_HORAS,))
 
-    cursor.close()
-    conn.close()
-    return producto
 
+CATALOGO_VERIFICAR_CADA = 1.0
 
-# -------- READ (todos) --------
+_catalogo = CacheCatalogo(
+    _cargar_productos,
+    _cargar_codigos,
+    cambios=_cambios_productos,
+    verificar_cada=CATALOGO_VERIFICAR_CADA,
+    # Con la BD caída el punto de venta sigue con la copia en memoria
+    tolerar=(errors.Error,)
+)
+
+
+@medir("db.obtener_productos")
 def obtener_productos():
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
+    """
+    Catálogo completo ordenado por nombre, servido desde la caché del
+    proceso como vistas de solo lectura (ver cache_catalogo.Producto).
+    """
+    return _catalogo.obtener()
+
+
+def _filtro_nombre(texto):
+    """
+    Condición de búsqueda por nombre. Se busca por prefijo (`LIKE 'texto%'`)
+    para que MySQL use el índice sobre `nombre`.
+    """
+    texto = (texto or "").strip()
+    if not texto:
+        return "", []
+    patron = texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    return "WHERE nombre LIKE %s", [patron]
+
+
+@medir("db.buscar_productos")
+def buscar_productos(texto="", despues_de=None, limite=50):
+    """
+    Una página del catálogo ordenada por (nombre, codigo).
+
+    Paginación por llave: `despues_de` es el (nombre, codigo) del último
+    producto de la página anterior, así cada página cuesta lo mismo sin
+    importar cuántas haya antes. Retorna (productos, hay_mas).
+    """
+    where, params = _filtro_nombre(texto)
+
+    if despues_de is not None:
+        nombre, codigo = despues_de
+        where += " AND " if where else "WHERE "
+        where += "(nombre > %s OR (nombre = %s AND codigo > %s))"
+        params += [nombre, nombre, codigo]
+
+    with abrir_cursor(dictionary=True, lectura=True) as cursor:
+        cursor.execute(f"""
+            SELECT codigo, nombre, precio, stock
+            FROM productos
+            {where}
+            ORDER BY nombre, codigo
+            LIMIT %s
+        """, params + [limite + 1])
+        filas = cursor.fetchall()
+
+    return filas[:limite], len(filas) > limite
 
-    cursor.execute("""
-        SELECT codigo, nombre, precio, stock
-        FROM productos
-        ORDER BY nombre
-    """)
-    productos = cursor.fetchall()
 
-    cursor.close()
-    conn.close()
-    return productos
+@medir("db.contar_productos")
+def contar_productos(texto=""):
+    """Cuántos productos coinciden con la búsqueda (sin traerlos)."""
+    where, params = _filtro_nombre(texto)
+    with abrir_cursor(lectura=True) as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM productos {where}", params)
+        return cursor.fetchone()[0]
+
+
+def hay_productos():
+    return len(_catalogo) > 0
+
+
+@medir("db.buscar_por_nombre")
+def buscar_por_nombre(texto, limite=20):
+    """
+    Búsqueda tolerante (acentos, mayúsculas, errores de dedo) sobre el
+    índice en memoria del catálogo. Retorna productos ordenados por
+    parecido; no modificar los dicts.
+    """
+    return _catalogo.buscar_nombre(texto, limite)
+
+
+def invalidar_catalogo():
+    """Descarta la caché del catálogo (p. ej. tras una importación masiva)."""
+    _catalogo.invalidar()
+
+
+def estadisticas_catalogo():
+    """Aciertos/fallos de la caché del catálogo."""
+    return _catalogo.estadisticas()
+
+
+@medir("db.obtener_producto_por_codigo")
+def obtener_producto_por_codigo(codigo):
+    """
+    Devuelve un producto por su código de barras.
+    Retorna None si no existe.
+    Se resuelve con el índice en memoria; los códigos desconocidos se
+    consultan en la BD y se recuerdan unos segundos.
+    """
+    return _catalogo.por_codigo(codigo)
+
+
+@medir("db.obtener_productos_por_codigos")
+def obtener_productos_por_codigos(codigos):
+    """
+    {codigo: producto} para varios códigos a la vez (escaneo en ráfaga).
+    Los que no existen no aparecen. Lo que no está en memoria se consulta
+    con un solo SELECT ... IN.
+    """
+    return _catalogo.por_codigos(codigos)
 
 
 # -------- UPDATE producto --------
+@medir("db.actualizar_producto")
 def actualizar_producto(codigo, nombre, precio):
-    conn = get_connection()
-    cursor = conn.cursor()
+    marcar_escritura()
+    with abrir_cursor() as cursor:
+        cursor.execute("""
+            UPDATE productos
+            SET nombre = %s,
+                precio = %s
+            WHERE codigo = %s
+        """, (nombre, precio, codigo))
+    _catalogo.refrescar([codigo])
 
-    cursor.execute("""
-        UPDATE productos
-        SET nombre = %s,
-            precio = %s
-        WHERE codigo = %s
-    """, (nombre, precio, codigo))
 
-    conn.commit()
-    cursor.close()
-    conn.close()
+# -------- UPDATE stock --------
+@medir("db.actualizar_stock")
+def actualizar_stock(codigo, nuevo_stock, referencia=None):
+    """
+    Actualiza el stock de un producto sobrescribiendo el valor. La
+    diferencia queda en el diario como ajuste.
+    """
+    nuevo_stock = int(nuevo_stock)
+    marcar_escritura()
+    with abrir_cursor() as cursor:
+        cursor.execute(
+            "SELECT stock FROM productos WHERE codigo = %s FOR UPDATE",
+            (codigo,)
+        )
+        fila = cursor.fetchone()
+        if fila is not None:
+            cursor.execute("""
+                UPDATE productos
+                SET stock = %s
+                WHERE codigo = %s
+            """, (nuevo_stock, codigo))
+            registrar_movimientos(cursor, [(
+                datetime.now().replace(microsecond=0), codigo,
+                MOVIMIENTO_AJUSTE, nuevo_stock - fila[0], referencia
+            )])
+    _catalogo.refrescar([codigo])
 
 
-# -------- UPDATE stock --------
-def actualizar_stock(codigo, stock):
-    conn = get_connection()
-    cursor = conn.cursor()
+#-------SUMARSTOCK---------
+@medir("db.sumar_stock")
+def sumar_stock(codigo, cantidad, tipo=None, referencia=None):
+    """Suma (o resta) `cantidad` al stock; por defecto cuenta como entrada."""
+    marcar_escritura()
+    with abrir_cursor() as cursor:
+        cursor.execute("""
+            UPDATE productos
+            SET stock = stock + %s
+            WHERE codigo = %s
+        """, (cantidad, codigo))
+        if cursor.rowcount:
+            registrar_movimientos(cursor, [(
+                datetime.now().replace(microsecond=0), codigo,
+                tipo or MOVIMIENTO_ENTRADA, int(cantidad), referencia
+            )])
+    _catalogo.refrescar([codigo])
 
-    cursor.execute("""
-        UPDATE productos
-        SET stock = %s
-        WHERE codigo = %s
-    """, (stock, codigo))
 
-    conn.commit()
-    cursor.close()
-    conn.close()
+# -------- Conteo físico --------
+@medir("db.conciliar_stock")
+def conciliar_stock(conteo, referencia="conteo físico", lote=1000):
+    """
+    Fija el stock de varios productos a lo contado ({codigo: cantidad}) en
+    una sola transacción: bloquea las filas con un SELECT ... IN, calcula
+    las diferencias, las aplica con un UPDATE de varias filas por bloque y
+    anota los ajustes en el diario.
+
+    Retorna (diferencias, desconocidos): una fila por producto con stock
+    distinto (codigo, nombre, sistema, contado, diferencia) y los códigos
+    que no existen.
+    """
+    pedidos = {normalizar_codigo(codigo): int(cantidad) for codigo, cantidad in conteo.items()}
+    if not pedidos:
+        return [], []
+
+    codigos = sorted(pedidos)
+    existentes = {}
+    diferencias = []
+    marcar_escritura()
+    with abrir_cursor(dictionary=True) as cursor:
+        for inicio in range(0, len(codigos), lote):
+            bloque = codigos[inicio:inicio + lote]
+            cursor.execute(f"""
+                SELECT codigo, nombre, stock
+                FROM productos
+                WHERE codigo IN ({", ".join(["%s"] * len(bloque))})
+                ORDER BY codigo
+                FOR UPDATE
+            """, bloque)
+            for fila in cursor.fetchall():
+                existentes[normalizar_codigo(fila["codigo"])] = fila
+
+        for clave, contado in pedidos.items():
+            fila = existentes.get(clave)
+            if fila is not None and fila["stock"] != contado:
+                diferencias.append({
+                    "codigo": fila["codigo"],
+                    "nombre": fila["nombre"],
+                    "sistema": fila["stock"],
+                    "contado": contado,
+                    "diferencia": contado - fila["stock"]
+                })
+
+        for inicio in range(0, len(diferencias), lote):
+            bloque = diferencias[inicio:inicio + lote]
+            valores, params = _tabla_valores(
+                [(d["codigo"], d["contado"]) for d in bloque],
+                ("codigo", "stock")
+            )
+            _actualizar_stock_desde(cursor, valores, params, "v.stock")
+
+        ahora = datetime.now().replace(microsecond=0)
+        registrar_movimientos(cursor, [
+            (ahora, d["codigo"], MOVIMIENTO_AJUSTE, d["diferencia"], referencia)
+            for d in diferencias
+        ])
+
+    _catalogo.aplicar_stock({d["codigo"]: d["contado"] for d in diferencias})
+    desconocidos = [codigo for codigo in conteo if normalizar_codigo(codigo) not in existentes]
+    return diferencias, desconocidos
 
 
 # -------- DELETE --------
+@medir("db.eliminar_producto")
 def eliminar_producto(codigo):
-    conn = get_connection()
-    cursor = conn.cursor()
+    marcar_escritura()
+    with abrir_cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM productos WHERE codigo = %s",
+            (codigo,)
+        )
+    _catalogo.refrescar([codigo])
 
-    cursor.execute(
-        "DELETE FROM productos WHERE codigo = %s",
-        (codigo,)
+
+# -------- Movimientos de stock --------
+# Diario de solo anexar: cada cambio de stock deja una fila con la
+# diferencia, escrita en la misma transacción que el cambio y en bloque
+# cuando son varias (una venta, una importación). `productos.stock` sigue
+# siendo el valor vigente; el diario más los cortes de inventario.py
+# permiten reconstruirlo y auditarlo.
+MOVIMIENTO_VENTA = "venta"
+MOVIMIENTO_ENTRADA = "entrada"
+MOVIMIENTO_AJUSTE = "ajuste"
+
+_COLUMNAS_MOVIMIENTO = ("fecha", "codigo", "tipo", "cantidad", "referencia")
+
+
+def registrar_movimientos(cursor, movimientos):
+    """
+    Anota movimientos (fecha, codigo, tipo, cantidad, referencia) con
+    INSERT de varias filas. Los de cantidad 0 se omiten.
+    """
+    movimientos = [m for m in movimientos if m[3]]
+    if movimientos:
+        _insertar_filas(cursor, "movimientos_stock", _COLUMNAS_MOVIMIENTO, movimientos)
+
+
+# ======================================================
+# ====================== VENTAS ========================
+# ======================================================
+
+def _agrupar_cantidades(carrito):
+    """
+    Suma las cantidades del carrito por código normalizado (ignora
+    ingresos manuales): "abc1" y "ABC1" son el mismo producto, igual que
+    para la BD. Conserva el orden de la primera aparición.
+    """
+    cantidades = {}
+    for item in carrito:
+        if item["codigo"] == CODIGO_INGRESO:
+            continue
+        clave = normalizar_codigo(item["codigo"])
+        cantidades[clave] = cantidades.get(clave, 0) + int(item["cantidad"])
+    return cantidades
+
+
+def _tabla_valores(filas, columnas):
+    """
+    Tabla derivada `SELECT %s AS a, %s AS b UNION ALL SELECT %s, %s ...`
+    para unir varias filas de parámetros en una sola sentencia. En SQLite
+    es `VALUES (...), (...)`, que no tiene límite de UNION ALL.
+    """
+    params = [valor for fila in filas for valor in fila]
+    if motor() == "sqlite":
+        marcador = "(" + ", ".join(["%s"] * len(columnas)) + ")"
+        alias = ", ".join(f"column{i} AS {c}" for i, c in enumerate(columnas, 1))
+        return f"SELECT {alias} FROM (VALUES {', '.join([marcador] * len(filas))})", params
+
+    primera = "SELECT " + ", ".join(f"%s AS {c}" for c in columnas)
+    resto = " UNION ALL SELECT " + ", ".join(["%s"] * len(columnas))
+    sql = primera + resto * (len(filas) - 1)
+    return sql, params
+
+
+def _actualizar_stock_desde(cursor, valores, params, stock):
+    """
+    UPDATE de productos (`p`) unido a la tabla derivada `v` de
+    _tabla_valores; `stock` es la expresión del nuevo stock.
+    """
+    if motor() == "sqlite":
+        sql = f"""
+            UPDATE productos AS p
+            SET stock = {stock}
+            FROM ({valores}) AS v
+            WHERE p.codigo = v.codigo
+        """
+    else:
+        sql = f"""
+            UPDATE productos p
+            JOIN ({valores}) v ON v.codigo = p.codigo
+            SET p.stock = {stock}
+        """
+    cursor.execute(sql, params)
+
+
+def _insertar_filas(cursor, tabla, columnas, filas, lote=1000):
+    """
+    INSERT de varias filas por sentencia (`VALUES (...), (...), ...`),
+    en bloques de `lote` filas.
+    """
+    marcador = "(" + ", ".join(["%s"] * len(columnas)) + ")"
+    for inicio in range(0, len(filas), lote):
+        bloque = filas[inicio:inicio + lote]
+        cursor.execute(
+            f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES "
+            + ", ".join([marcador] * len(bloque)),
+            [valor for fila in bloque for valor in fila]
+        )
+
+
+def _a_decimal(valor):
+    return Decimal(str(valor)).quantize(Decimal("0.01"))
+
+
+def _renglones_venta(carrito):
+    """Renglones del carrito con precio y subtotal en Decimal."""
+    renglones = []
+    for item in carrito:
+        precio = _a_decimal(item["precio"])
+        cantidad = int(item["cantidad"])
+        renglones.append({
+            "codigo": item["codigo"],
+            "nombre": item["nombre"],
+            "precio": precio,
+            "cantidad": cantidad,
+            "subtotal": precio * cantidad
+        })
+    return renglones
+
+
+def _descontar_stock(cursor, cantidades):
+    """
+    Resta `cantidades` ({codigo normalizado: n}) con un único UPDATE
+    relativo. Retorna ({codigo normalizado: stock antes de la venta},
+    {codigo normalizado: codigo como está guardado}).
+    """
+    if not cantidades:
+        return {}, {}
+
+    codigos = sorted(cantidades)
+    marcadores = ", ".join(["%s"] * len(codigos))
+
+    # Bloquea las filas (en orden fijo para evitar deadlocks entre cajas)
+    cursor.execute(f"""
+        SELECT codigo, stock
+        FROM productos
+        WHERE codigo IN ({marcadores})
+        ORDER BY codigo
+        FOR UPDATE
+    """, codigos)
+    filas = cursor.fetchall()
+    stock_actual = {normalizar_codigo(p["codigo"]): p["stock"] for p in filas}
+    codigos_bd = {normalizar_codigo(p["codigo"]): p["codigo"] for p in filas}
+
+    valores, params = _tabla_valores(
+        [(codigo, cantidades[codigo]) for codigo in codigos],
+        ("codigo", "cantidad")
+    )
+    _actualizar_stock_desde(
+        cursor, valores, params,
+        "CASE WHEN p.stock > v.cantidad THEN p.stock - v.cantidad ELSE 0 END"
     )
 
-    conn.commit()
-    cursor.close()
-    conn.close()
+    return stock_actual, codigos_bd
 
 
-#-------SUMARSTOCK---------
-def sumar_stock(codigo, cantidad):
-    conn = get_connection()
-    cursor = conn.cursor()
+def _guardar_venta(cursor, renglones, fecha, clave=None, turno=None):
+    """Inserta el encabezado y todos los renglones; retorna el id de la venta."""
+    total = sum((r["subtotal"] for r in renglones), Decimal("0.00"))
+    articulos = sum(r["cantidad"] for r in renglones)
 
     cursor.execute("""
-        UPDATE productos
-        SET stock = stock + %s
-        WHERE codigo = %s
-    """, (cantidad, codigo))
+        INSERT INTO ventas (clave, fecha, total, articulos, turno_id)
+        VALUES (%s, %s, %s, %s, %s)
+    """, (clave, fecha, total, articulos, turno))
+    venta_id = cursor.lastrowid
 
-    conn.commit()
-    cursor.close()
-    conn.close()
+    _insertar_filas(
+        cursor,
+        "venta_items",
+        ("venta_id", "fecha", "codigo", "nombre", "precio", "cantidad", "subtotal"),
+        [
+            (venta_id, fecha, r["codigo"], r["nombre"], r["precio"], r["cantidad"], r["subtotal"])
+            for r in renglones
+        ]
+    )
+    return venta_id, total
 
-def obtener_producto_por_codigo(codigo):
+
+def _acumular(cursor, tabla, claves, sumas, filas):
     """
-    Devuelve un producto por su código de barras.
-    Retorna None si no existe.
+    Upsert de varias filas que suma `sumas` a las existentes:
+    INSERT ... VALUES (...), (...) ON DUPLICATE KEY UPDATE col = col + VALUES(col)
     """
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
+    if not filas:
+        return
+    columnas = list(claves) + list(sumas)
+    marcador = "(" + ", ".join(["%s"] * len(columnas)) + ")"
+    actualizar = ", ".join(f"{c} = {c} + VALUES({c})" for c in sumas)
+    cursor.execute(
+        f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES "
+        + ", ".join([marcador] * len(filas))
+        + f" ON DUPLICATE KEY UPDATE {actualizar}",
+        [valor for fila in filas for valor in fila]
+    )
 
-    cursor.execute("""
-        SELECT codigo, nombre, precio, stock
-        FROM productos
-        WHERE codigo = %s
-    """, (codigo,))
 
-    producto = cursor.fetchone()
+def _actualizar_resumenes(cursor, ventas):
+    """
+    Suma las ventas registradas a resumen_dia, resumen_hora y
+    resumen_producto_dia (un upsert por tabla para todo el lote).
+    """
+    por_dia = {}
+    por_hora = {}
+    por_producto = {}
+
+    for venta in ventas:
+        dia = venta["fecha"].date()
+        total = sum((r["subtotal"] for r in venta["renglones"]), Decimal("0.00"))
+        articulos = sum(r["cantidad"] for r in venta["renglones"])
 
-    cursor.close()
-    conn.close()
+        t, a, s = por_dia.get(dia, (0, 0, Decimal("0.00")))
+        por_dia[dia] = (t + 1, a + articulos, s + total)
 
-    return producto
+        clave = (dia, venta["fecha"].hour)
+        t, s = por_hora.get(clave, (0, Decimal("0.00")))
+        por_hora[clave] = (t + 1, s + total)
 
-def actualizar_stock(codigo, nuevo_stock):
+        for r in venta["renglones"]:
+            clave = (dia, r["codigo"])
+            nombre, u, s = por_producto.get(clave, (r["nombre"], 0, Decimal("0.00")))
+            por_producto[clave] = (nombre, u + r["cantidad"], s + r["subtotal"])
+
+    _acumular(cursor, "resumen_dia", ("fecha",), ("tickets", "articulos", "total"),
+              [(dia,) + v for dia, v in por_dia.items()])
+    _acumular(cursor, "resumen_hora", ("fecha", "hora"), ("tickets", "total"),
+              [k + v for k, v in por_hora.items()])
+    _acumular(cursor, "resumen_producto_dia", ("fecha", "codigo", "nombre"), ("unidades", "total"),
+              [(dia, codigo, nombre, u, s) for (dia, codigo), (nombre, u, s) in por_producto.items()])
+
+
+def _acumular_turnos(cursor, ventas):
     """
-    Actualiza el stock de un producto sobrescribiendo el valor.
+    Suma las ventas a los totales corrientes de su turno de caja: productos
+    a `ventas` e ingresos manuales a `ingresos` (un UPDATE por turno).
+    Solo a turnos abiertos: una venta diferida que llega después del corte
+    no cambia un turno ya cuadrado; se anota aparte como movimiento
+    `venta_tardia` del turno para que el corte la muestre.
     """
-    conn = get_connection()
-    cursor = conn.cursor()
+    por_turno = {}
+    for venta in ventas:
+        if venta["turno"] is None:
+            continue
+        productos, ingresos, tickets = por_turno.get(venta["turno"], (Decimal("0.00"), Decimal("0.00"), 0))
+        for r in venta["renglones"]:
+            if r["codigo"] == CODIGO_INGRESO:
+                ingresos += r["subtotal"]
+            else:
+                productos += r["subtotal"]
+        por_turno[venta["turno"]] = (productos, ingresos, tickets + 1)
 
-    cursor.execute("""
-        UPDATE productos
-        SET stock = %s
-        WHERE codigo = %s
-    """, (int(nuevo_stock), codigo))
-
-    conn.commit()
-    cursor.close()
-    conn.close()
+    for turno, (productos, ingresos, tickets) in por_turno.items():
+        cursor.execute("""
+            UPDATE turnos
+            SET ventas = ventas + %s, ingresos = ingresos + %s, tickets = tickets + %s
+            WHERE id = %s AND cierre IS NULL
+        """, (productos, ingresos, tickets, turno))
+        if cursor.rowcount == 0:
+            cursor.execute("""
+                INSERT INTO movimientos_caja (turno_id, fecha, tipo, concepto, monto)
+                VALUES (%s, %s, 'venta_tardia', %s, %s)
+            """, (turno, datetime.now().replace(microsecond=0),
+                  f"{tickets} ticket(s) después del corte", productos + ingresos))
+
+
+def _resultados_stock(cantidades, restante, codigos_bd):
+    """
+    Resultado por código de una venta. `restante` ({codigo normalizado:
+    stock}) se va descontando para que varias ventas de un mismo lote
+    encadenen su stock. El código reportado es el guardado en la BD.
+    """
+    resultados = []
+    for clave, cantidad in cantidades.items():
+        anterior = restante.get(clave)
+        nuevo = None if anterior is None else max(anterior - cantidad, 0)
+        if anterior is not None:
+            restante[clave] = nuevo
+        resultados.append({
+            "codigo": codigos_bd.get(clave, clave),
+            "cantidad": cantidad,
+            "stock_anterior": anterior,
+            "stock_nuevo": nuevo,
+            "encontrado": anterior is not None
+        })
+    return resultados
+
+
+def registrar_venta(carrito, fecha=None, clave=None, turno=None):
+    """
+    Guarda la venta (encabezado y renglones) y descuenta del stock todos los
+    productos del carrito en una sola transacción. Las cantidades se
+    agrupan por código y se restan con un único UPDATE relativo
+    (stock = stock - n, sin bajar de 0), así dos cajas vendiendo el mismo
+    producto no pisan sus cambios.
+
+    `clave` (opcional) identifica la venta; registrar dos veces la misma
+    clave no duplica la venta. `turno` (opcional) es el turno de caja al
+    que se suma.
+
+    Retorna un dict con id, fecha, total y `resultados`: un dict por código
+    con codigo, cantidad, stock_anterior, stock_nuevo y encontrado.
+    """
+    registradas = registrar_ventas([{
+        "clave": clave,
+        "fecha": fecha,
+        "carrito": carrito,
+        "turno": turno
+    }])
+    return registradas[0] if registradas else None
+
+
+@medir("db.registrar_ventas")
+def registrar_ventas(lote):
+    """
+    Registra varias ventas en una sola transacción (lo usa la cola de
+    ventas diferidas). Cada elemento es un dict con carrito, fecha, clave y
+    (opcional) turno.
+    Las ventas cuya clave ya está en la BD se omiten.
+
+    Retorna una lista con el resultado de cada venta registrada, en el
+    mismo formato que `registrar_venta`.
+    """
+    ventas = []
+    for venta in lote:
+        renglones = _renglones_venta(venta["carrito"])
+        if renglones:
+            ventas.append({
+                "clave": venta.get("clave"),
+                "fecha": venta.get("fecha") or datetime.now().replace(microsecond=0),
+                "turno": venta.get("turno"),
+                "renglones": renglones
+            })
+    if not ventas:
+        return []
+
+    registradas = []
+    marcar_escritura()
+    with abrir_cursor(dictionary=True) as cursor:
+        claves = [v["clave"] for v in ventas if v["clave"]]
+        if claves:
+            marcadores = ", ".join(["%s"] * len(claves))
+            cursor.execute(
+                f"SELECT clave FROM ventas WHERE clave IN ({marcadores})",
+                claves
+            )
+            existentes = {fila["clave"] for fila in cursor.fetchall()}
+            ventas = [v for v in ventas if v["clave"] not in existentes]
+
+        cantidades = _agrupar_cantidades(
+            r for v in ventas for r in v["renglones"]
+        )
+        stock_actual, codigos_bd = _descontar_stock(cursor, cantidades)
+        restante = dict(stock_actual)
+        movimientos = []
+
+        for venta in ventas:
+            venta_id, total = _guardar_venta(
+                cursor, venta["renglones"], venta["fecha"], venta["clave"], venta["turno"]
+            )
+            resultados = _resultados_stock(
+                _agrupar_cantidades(venta["renglones"]), restante, codigos_bd
+            )
+            registradas.append({
+                "id": venta_id,
+                "clave": venta["clave"],
+                "fecha": venta["fecha"],
+                "total": total,
+                "resultados": resultados
+            })
+            # Lo que bajó de verdad (el stock no pasa de 0)
+            movimientos.extend(
+                (venta["fecha"], r["codigo"], MOVIMIENTO_VENTA,
+                 r["stock_nuevo"] - r["stock_anterior"], f"venta {venta_id}")
+                for r in resultados if r["encontrado"]
+            )
+
+        registrar_movimientos(cursor, movimientos)
+        _actualizar_resumenes(cursor, ventas)
+        _acumular_turnos(cursor, ventas)
+
+    _catalogo.aplicar_stock(restante)
+    return registradas
+
+
+@medir("db.obtener_venta")
+def obtener_venta(venta_id):
+    """Encabezado de una venta con sus renglones en `items`, o None."""
+    with abrir_cursor(dictionary=True, lectura=True) as cursor:
+        cursor.execute("""
+            SELECT id, clave, fecha, total, articulos
+            FROM ventas
+            WHERE id = %s
+        """, (venta_id,))
+        venta = cursor.fetchone()
+        if venta is None:
+            return None
+
+        cursor.execute("""
+            SELECT codigo, nombre, precio, cantidad, subtotal
+            FROM venta_items
+            WHERE venta_id = %s
+            ORDER BY id
+        """, (venta_id,))
+        venta["items"] = cursor.fetchall()
+        return venta
+
+
+@medir("db.obtener_ventas")
+def obtener_ventas(desde, hasta):
+    """Encabezados de las ventas con fecha en [desde, hasta)."""
+    with abrir_cursor(dictionary=True, lectura=True) as cursor:
+        cursor.execute("""
+            SELECT id, clave, fecha, total, articulos
+            FROM ventas
+            WHERE fecha >= %s AND fecha < %s
+            ORDER BY fecha
+        """, (desde, hasta))
+        return cursor.fetchall()
@@ -0,0 +1,49 @@
+import streamlit as st
+import pandas as pd
+
+import metricas
+from archivo import estadisticas as estadisticas_archivo
+from db import estadisticas_catalogo, estado_replicas
+
+
+# ------------------ Panel de diagnóstico ------------------
+def render_diagnostico():
+    """
+    Tiempos de consultas y secciones del rerun (media y percentiles),
+    estado de la caché del catálogo y descarga en formato de Prometheus.
+    Se activa con `diagnostico = true` en [sgventas].
+    """
+    with st.sidebar.expander("Diagnóstico"):
+        filas = metricas.resumen()
+        if filas:
+            st.dataframe(
+                pd.DataFrame(filas).set_index("serie"),
+                use_container_width=True
+            )
+        else:
+            st.caption("Todavía no hay mediciones.")
+
+        st.markdown("**Caché del catálogo**")
+        st.json(estadisticas_catalogo(), expanded=False)
+
+        st.markdown("**Archivo histórico**")
+        st.json(estadisticas_archivo(), expanded=False)
+
+        replicas = estado_replicas()
+        if replicas:
+            st.markdown("**Réplicas de lectura**")
+            st.dataframe(pd.DataFrame(replicas), hide_index=True, use_container_width=True)
+
+        c1, c2 = st.columns(2)
+        with c1:
+            st.download_button(
+                "Prometheus",
+                metricas.exportar_prometheus(),
+                file_name="sgventas.prom",
+                mime="text/plain",
+                use_container_width=True
+            )
+        with c2:
+            if st.button("Reiniciar", use_container_width=True):
+                metricas.reiniciar()
+                st.rerun()
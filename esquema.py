@@ -0,0 +1,687 @@
+import threading
+from datetime import datetime
+
+from mysql.connector import errors
+
+from db import abrir_cursor, motor
+
+# ------------------ TABLAS ------------------
+# Todo lo que usa SGVentas, incluida `productos`. Son CREATE ... IF NOT
+# EXISTS: en una instalación existente no cambian nada; los ajustes a
+# tablas que ya existen van en MIGRACIONES.
+
+TABLAS = [
+    # Catálogo. `codigo` es la llave: cada escaneo es una búsqueda por ella.
+    """
+    CREATE TABLE IF NOT EXISTS productos (
+        codigo VARCHAR(64) NOT NULL,
+        nombre VARCHAR(255) NOT NULL,
+        precio DECIMAL(12, 2) NOT NULL,
+        stock INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (codigo),
+        KEY idx_productos_nombre (nombre, codigo)
+    ) ENGINE=InnoDB
+    """,
+    # Encabezado de cada venta. `clave` evita duplicados cuando la cola de
+    # ventas diferidas reintenta un envío.
+    """
+    CREATE TABLE IF NOT EXISTS ventas (
+        id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+        clave CHAR(32) NULL,
+        fecha DATETIME NOT NULL,
+        total DECIMAL(12, 2) NOT NULL,
+        articulos INT NOT NULL,
+        PRIMARY KEY (id),
+        UNIQUE KEY uq_ventas_clave (clave),
+        KEY idx_ventas_fecha (fecha)
+    ) ENGINE=InnoDB
+    """,
+    # Renglones de cada venta. `fecha` se repite para que las consultas por
+    # día y por producto no tengan que unir con `ventas`.
+    """
+    CREATE TABLE IF NOT EXISTS venta_items (
+        id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+        venta_id BIGINT UNSIGNED NOT NULL,
+        fecha DATETIME NOT NULL,
+        codigo VARCHAR(64) NOT NULL,
+        nombre VARCHAR(255) NOT NULL,
+        precio DECIMAL(12, 2) NOT NULL,
+        cantidad INT NOT NULL,
+        subtotal DECIMAL(12, 2) NOT NULL,
+        PRIMARY KEY (id),
+        KEY idx_items_venta (venta_id),
+        KEY idx_items_fecha (fecha),
+        KEY idx_items_codigo_fecha (codigo, fecha)
+    ) ENGINE=InnoDB
+    """,
+    # Resúmenes precalculados para "Registros del día". Se acumulan en la
+    # misma transacción que registra cada venta.
+    """
+    CREATE TABLE IF NOT EXISTS resumen_dia (
+        fecha DATE NOT NULL,
+        tickets INT NOT NULL,
+        articulos INT NOT NULL,
+        total DECIMAL(14, 2) NOT NULL,
+        PRIMARY KEY (fecha)
+    ) ENGINE=InnoDB
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS resumen_hora (
+        fecha DATE NOT NULL,
+        hora TINYINT UNSIGNED NOT NULL,
+        tickets INT NOT NULL,
+        total DECIMAL(14, 2) NOT NULL,
+        PRIMARY KEY (fecha, hora)
+    ) ENGINE=InnoDB
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS resumen_producto_dia (
+        fecha DATE NOT NULL,
+        codigo VARCHAR(64) NOT NULL,
+        nombre VARCHAR(255) NOT NULL,
+        unidades INT NOT NULL,
+        total DECIMAL(14, 2) NOT NULL,
+        PRIMARY KEY (fecha, codigo)
+    ) ENGINE=InnoDB
+    """,
+]
+
+# Índices que necesitan las consultas frecuentes. Se revisan en cada
+# arranque y se crean si faltan (p. ej. tablas hechas a mano):
+# (tabla, nombre del índice, columnas)
+INDICES = [
+    # Orden y búsqueda por prefijo del catálogo paginado
+    ("productos", "idx_productos_nombre", "nombre, codigo"),
+    # Ventas por rango de fechas y renglones de cada venta
+    ("ventas", "idx_ventas_fecha", "fecha"),
+    ("venta_items", "idx_items_venta", "venta_id"),
+    ("venta_items", "idx_items_fecha", "fecha"),
+]
+
+
+# ------------------ MIGRACIONES ------------------
+# Cambios a tablas existentes, en orden. Cada una corre una sola vez y
+# queda anotada en `esquema_version`. Si una falla no se anota: se
+# reporta como advertencia y se reintenta en el siguiente arranque. Solo
+# se saltan las que dependen de ella (`requiere`); las demás siguen.
+
+def _crear_tablas(cursor):
+    for ddl in TABLAS:
+        cursor.execute(ddl)
+
+
+def _codigo_unico(cursor):
+    """
+    `productos` instaladas a mano pueden no tener llave en `codigo`; sin
+    ella cada escaneo recorre la tabla completa.
+    """
+    cursor.execute("""
+        SELECT INDEX_NAME
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE()
+          AND TABLE_NAME = 'productos'
+          AND NON_UNIQUE = 0
+        GROUP BY INDEX_NAME
+        HAVING COUNT(*) = 1 AND MAX(COLUMN_NAME) = 'codigo'
+    """)
+    if cursor.fetchall():
+        return
+
+    cursor.execute("""
+        SELECT codigo
+        FROM productos
+        GROUP BY codigo
+        HAVING COUNT(*) > 1
+        LIMIT 5
+    """)
+    repetidos = [fila[0] for fila in cursor.fetchall()]
+    if repetidos:
+        raise ValueError(
+            "productos tiene códigos repetidos "
+            f"({', '.join(map(str, repetidos))}); corríjalos para crear la llave única"
+        )
+
+    cursor.execute("ALTER TABLE productos ADD UNIQUE KEY uq_productos_codigo (codigo)")
+
+
+def _registro_cambios(cursor):
+    """
+    Registro de cambios de `productos` para que cada proceso sincronice su
+    caché del catálogo (ver db._cambios_productos). Lo llenan triggers, así
+    también quedan anotados los cambios hechos fuera de SGVentas.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS productos_cambios (
+            id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+            codigo VARCHAR(64) NOT NULL,
+            fecha DATETIME(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3),
+            PRIMARY KEY (id),
+            KEY idx_cambios_fecha (fecha)
+        ) ENGINE=InnoDB
+    """)
+    for trigger in ("trg_productos_insert", "trg_productos_update", "trg_productos_delete"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+
+    cursor.execute("""
+        CREATE TRIGGER trg_productos_insert AFTER INSERT ON productos
+        FOR EACH ROW
+            INSERT INTO productos_cambios (codigo) VALUES (NEW.codigo)
+    """)
+    # Un UPDATE que no cambia nada (p. ej. una importación que repite el
+    # mismo precio) no se anota
+    cursor.execute("""
+        CREATE TRIGGER trg_productos_update AFTER UPDATE ON productos
+        FOR EACH ROW
+        BEGIN
+            IF NOT (OLD.codigo <=> NEW.codigo) THEN
+                INSERT INTO productos_cambios (codigo) VALUES (OLD.codigo);
+            END IF;
+            IF NOT (OLD.codigo <=> NEW.codigo AND OLD.nombre <=> NEW.nombre
+                    AND OLD.precio <=> NEW.precio AND OLD.stock <=> NEW.stock) THEN
+                INSERT INTO productos_cambios (codigo) VALUES (NEW.codigo);
+            END IF;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER trg_productos_delete AFTER DELETE ON productos
+        FOR EACH ROW
+            INSERT INTO productos_cambios (codigo) VALUES (OLD.codigo)
+    """)
+
+
+def _columna_existe(cursor, tabla, columna):
+    cursor.execute("""
+        SELECT COUNT(*)
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    """, (tabla, columna))
+    return cursor.fetchone()[0] > 0
+
+
+def _turnos_caja(cursor):
+    """
+    Turnos de caja con sus totales corrientes y el libro de movimientos
+    (fondo y gastos). Cada venta anota su turno.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS turnos (
+            id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+            caja VARCHAR(64) NOT NULL,
+            cajero VARCHAR(100) NOT NULL,
+            apertura DATETIME NOT NULL,
+            cierre DATETIME NULL,
+            fondo DECIMAL(12, 2) NOT NULL,
+            ventas DECIMAL(14, 2) NOT NULL DEFAULT 0,
+            ingresos DECIMAL(14, 2) NOT NULL DEFAULT 0,
+            gastos DECIMAL(14, 2) NOT NULL DEFAULT 0,
+            tickets INT NOT NULL DEFAULT 0,
+            contado DECIMAL(14, 2) NULL,
+            PRIMARY KEY (id),
+            KEY idx_turnos_cierre (cierre)
+        ) ENGINE=InnoDB
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS movimientos_caja (
+            id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+            turno_id BIGINT UNSIGNED NOT NULL,
+            fecha DATETIME NOT NULL,
+            tipo VARCHAR(16) NOT NULL,
+            concepto VARCHAR(255) NOT NULL,
+            monto DECIMAL(12, 2) NOT NULL,
+            PRIMARY KEY (id),
+            KEY idx_movimientos_turno (turno_id)
+        ) ENGINE=InnoDB
+    """)
+    if not _columna_existe(cursor, "ventas", "turno_id"):
+        cursor.execute("""
+            ALTER TABLE ventas
+            ADD COLUMN turno_id BIGINT UNSIGNED NULL,
+            ADD KEY idx_ventas_turno (turno_id)
+        """)
+
+
+def _inventario(cursor):
+    """
+    Diario de movimientos de stock, cortes (fotos del stock) y mínimos por
+    producto. `faltante` es una columna generada e indexada: la lista de
+    productos por reabastecer es un recorrido del índice, no de la tabla.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS movimientos_stock (
+            id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+            fecha DATETIME NOT NULL,
+            codigo VARCHAR(64) NOT NULL,
+            tipo VARCHAR(16) NOT NULL,
+            cantidad INT NOT NULL,
+            referencia VARCHAR(100) NULL,
+            PRIMARY KEY (id),
+            KEY idx_movimientos_codigo (codigo, id),
+            KEY idx_movimientos_fecha (fecha)
+        ) ENGINE=InnoDB
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stock_cortes (
+            id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+            fecha DATETIME NOT NULL,
+            hasta_movimiento BIGINT UNSIGNED NOT NULL,
+            productos INT NOT NULL,
+            PRIMARY KEY (id)
+        ) ENGINE=InnoDB
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stock_corte_items (
+            corte_id BIGINT UNSIGNED NOT NULL,
+            codigo VARCHAR(64) NOT NULL,
+            stock INT NOT NULL,
+            PRIMARY KEY (corte_id, codigo)
+        ) ENGINE=InnoDB
+    """)
+    if not _columna_existe(cursor, "productos", "stock_minimo"):
+        cursor.execute("""
+            ALTER TABLE productos
+            ADD COLUMN stock_minimo INT NULL,
+            ADD COLUMN faltante INT AS (stock_minimo - stock) STORED,
+            ADD KEY idx_productos_faltante (faltante)
+        """)
+
+    # Corte inicial: punto de partida del diario
+    cursor.execute("SELECT COUNT(*) FROM stock_cortes")
+    if not cursor.fetchone()[0]:
+        from inventario import tomar_corte
+        tomar_corte(cursor)
+
+
+# (versión, descripción, función, versiones que requiere)
+MIGRACIONES = [
+    (1, "Tablas base", _crear_tablas, ()),
+    (2, "Llave única en productos.codigo", _codigo_unico, (1,)),
+    (3, "Registro de cambios de productos", _registro_cambios, (1,)),
+    (4, "Turnos y movimientos de caja", _turnos_caja, (1,)),
+    (5, "Inventario: movimientos, cortes y mínimos", _inventario, (1,)),
+]
+
+# Sin estas no se puede registrar una venta (ventas.turno_id,
+# movimientos_stock): la aplicación no arranca si quedan pendientes.
+# La llave única (2) y los triggers (3, que en MySQL con binlog piden
+# SUPER o log_bin_trust_function_creators) solo dejan una advertencia.
+MIGRACIONES_NECESARIAS = (1, 4, 5)
+
+
+# ------------------ SQLITE ------------------
+# Con `motor = "sqlite"` el archivo se crea de una vez con el esquema
+# vigente (el equivalente de todas las MIGRACIONES, menos el registro de
+# cambios: un solo proceso usa el archivo). Una migración nueva debe
+# agregar aquí su versión para SQLite. Códigos y nombres comparan sin
+# distinguir mayúsculas, como la collation de MySQL. Las tablas con llave
+# de texto o compuesta van WITHOUT ROWID: la llave es la tabla y leer
+# una fila es una sola búsqueda en el árbol.
+
+TABLAS_SQLITE = [
+    """
+    CREATE TABLE IF NOT EXISTS productos (
+        codigo VARCHAR(64) NOT NULL COLLATE NOCASE PRIMARY KEY,
+        nombre VARCHAR(255) NOT NULL COLLATE NOCASE,
+        precio DECIMAL(12, 2) NOT NULL,
+        stock INT NOT NULL DEFAULT 0,
+        stock_minimo INT NULL,
+        faltante INT GENERATED ALWAYS AS (stock_minimo - stock) STORED
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_productos_nombre ON productos (nombre, codigo)",
+    "CREATE INDEX IF NOT EXISTS idx_productos_faltante ON productos (faltante)",
+    """
+    CREATE TABLE IF NOT EXISTS ventas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        clave CHAR(32) NULL UNIQUE,
+        fecha DATETIME NOT NULL,
+        total DECIMAL(12, 2) NOT NULL,
+        articulos INT NOT NULL,
+        turno_id BIGINT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_ventas_fecha ON ventas (fecha)",
+    "CREATE INDEX IF NOT EXISTS idx_ventas_turno ON ventas (turno_id)",
+    """
+    CREATE TABLE IF NOT EXISTS venta_items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        venta_id BIGINT NOT NULL,
+        fecha DATETIME NOT NULL,
+        codigo VARCHAR(64) NOT NULL COLLATE NOCASE,
+        nombre VARCHAR(255) NOT NULL,
+        precio DECIMAL(12, 2) NOT NULL,
+        cantidad INT NOT NULL,
+        subtotal DECIMAL(12, 2) NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_items_venta ON venta_items (venta_id)",
+    "CREATE INDEX IF NOT EXISTS idx_items_fecha ON venta_items (fecha)",
+    "CREATE INDEX IF NOT EXISTS idx_items_codigo_fecha ON venta_items (codigo, fecha)",
+    """
+    CREATE TABLE IF NOT EXISTS resumen_dia (
+        fecha DATE NOT NULL PRIMARY KEY,
+        tickets INT NOT NULL,
+        articulos INT NOT NULL,
+        total DECIMAL(14, 2) NOT NULL
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS resumen_hora (
+        fecha DATE NOT NULL,
+        hora TINYINT NOT NULL,
+        tickets INT NOT NULL,
+        total DECIMAL(14, 2) NOT NULL,
+        PRIMARY KEY (fecha, hora)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS resumen_producto_dia (
+        fecha DATE NOT NULL,
+        codigo VARCHAR(64) NOT NULL COLLATE NOCASE,
+        nombre VARCHAR(255) NOT NULL,
+        unidades INT NOT NULL,
+        total DECIMAL(14, 2) NOT NULL,
+        PRIMARY KEY (fecha, codigo)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS turnos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        caja VARCHAR(64) NOT NULL,
+        cajero VARCHAR(100) NOT NULL,
+        apertura DATETIME NOT NULL,
+        cierre DATETIME NULL,
+        fondo DECIMAL(12, 2) NOT NULL,
+        ventas DECIMAL(14, 2) NOT NULL DEFAULT 0,
+        ingresos DECIMAL(14, 2) NOT NULL DEFAULT 0,
+        gastos DECIMAL(14, 2) NOT NULL DEFAULT 0,
+        tickets INT NOT NULL DEFAULT 0,
+        contado DECIMAL(14, 2) NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_turnos_cierre ON turnos (cierre)",
+    """
+    CREATE TABLE IF NOT EXISTS movimientos_caja (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        turno_id BIGINT NOT NULL,
+        fecha DATETIME NOT NULL,
+        tipo VARCHAR(16) NOT NULL,
+        concepto VARCHAR(255) NOT NULL,
+        monto DECIMAL(12, 2) NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_movimientos_turno ON movimientos_caja (turno_id)",
+    """
+    CREATE TABLE IF NOT EXISTS movimientos_stock (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        fecha DATETIME NOT NULL,
+        codigo VARCHAR(64) NOT NULL COLLATE NOCASE,
+        tipo VARCHAR(16) NOT NULL,
+        cantidad INT NOT NULL,
+        referencia VARCHAR(100) NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_movimientos_codigo ON movimientos_stock (codigo, id)",
+    "CREATE INDEX IF NOT EXISTS idx_movimientos_fecha ON movimientos_stock (fecha)",
+    """
+    CREATE TABLE IF NOT EXISTS stock_cortes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        fecha DATETIME NOT NULL,
+        hasta_movimiento BIGINT NOT NULL,
+        productos INT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stock_corte_items (
+        corte_id BIGINT NOT NULL,
+        codigo VARCHAR(64) NOT NULL COLLATE NOCASE,
+        stock INT NOT NULL,
+        PRIMARY KEY (corte_id, codigo)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS esquema_version (
+        version INT NOT NULL PRIMARY KEY,
+        descripcion VARCHAR(255) NOT NULL,
+        aplicada DATETIME NOT NULL
+    )
+    """,
+]
+
+
+def _asegurar_sqlite(cursor):
+    for ddl in TABLAS_SQLITE:
+        cursor.execute(ddl)
+
+    aplicadas = versiones_aplicadas(cursor)
+    for version, descripcion, _, _ in MIGRACIONES:
+        if version not in aplicadas:
+            cursor.execute(
+                "INSERT INTO esquema_version (version, descripcion, aplicada) "
+                "VALUES (%s, %s, %s)",
+                (version, descripcion, datetime.now().replace(microsecond=0))
+            )
+
+    cursor.execute("SELECT COUNT(*) FROM stock_cortes")
+    if not cursor.fetchone()[0]:
+        from inventario import tomar_corte
+        tomar_corte(cursor)
+
+
+# ------------------ VERIFICACIÓN ------------------
+# Consultas frecuentes de db.py con valores de ejemplo y los índices que
+# deberían poder usar. Se revisan con EXPLAIN al arrancar.
+CONSULTAS = [
+    (
+        "escaneo por código",
+        "SELECT codigo, nombre, precio, stock FROM productos WHERE codigo = %s",
+        ("0",),
+        {"productos": ("PRIMARY", "uq_productos_codigo")},
+    ),
+    (
+        "página del catálogo",
+        """
+        SELECT codigo, nombre, precio, stock FROM productos
+        WHERE nombre LIKE %s AND (nombre > %s OR (nombre = %s AND codigo > %s))
+        ORDER BY nombre, codigo LIMIT 51
+        """,
+        ("a%", "a", "a", "0"),
+        {"productos": ("idx_productos_nombre",)},
+    ),
+    (
+        "ventas por fecha",
+        "SELECT id, fecha, total, articulos FROM ventas "
+        "WHERE fecha >= %s AND fecha < %s ORDER BY fecha",
+        ("2000-01-01", "2000-01-02"),
+        {"ventas": ("idx_ventas_fecha",)},
+    ),
+    (
+        "renglones de una venta",
+        "SELECT codigo, nombre, precio, cantidad, subtotal FROM venta_items "
+        "WHERE venta_id = %s ORDER BY id",
+        (0,),
+        {"venta_items": ("idx_items_venta",)},
+    ),
+    (
+        "productos por reabastecer",
+        "SELECT codigo, nombre, stock, stock_minimo, faltante FROM productos "
+        "WHERE faltante >= 0 ORDER BY faltante DESC LIMIT 200",
+        (),
+        {"productos": ("idx_productos_faltante",)},
+    ),
+    (
+        "movimientos de un producto",
+        "SELECT fecha, tipo, cantidad, referencia FROM movimientos_stock "
+        "WHERE codigo = %s ORDER BY id DESC LIMIT 100",
+        ("0",),
+        {"movimientos_stock": ("idx_movimientos_codigo",)},
+    ),
+]
+
+_listo = False
+_lock = threading.Lock()
+_advertencias = []
+_pendientes = []
+
+
+def asegurar_esquema():
+    """
+    Crea y actualiza las tablas, asegura los índices y revisa con EXPLAIN
+    las consultas frecuentes. Solo trabaja la primera vez por proceso.
+    """
+    global _listo
+
+    if _listo:
+        return
+    with _lock:
+        if _listo:
+            return
+        _advertencias.clear()
+        _pendientes.clear()
+        if motor() == "sqlite":
+            with abrir_cursor() as cursor:
+                _asegurar_sqlite(cursor)
+            _advertencias.extend(verificar_consultas())
+            _listo = True
+            return
+
+        with abrir_cursor() as cursor:
+            # Si arrancan varios procesos a la vez, migra solo uno
+            cursor.execute("SELECT GET_LOCK('sgventas_esquema', 60)")
+            cursor.fetchall()
+            try:
+                _migrar(cursor)
+                _asegurar_indices(cursor)
+            finally:
+                cursor.execute("SELECT RELEASE_LOCK('sgventas_esquema')")
+                cursor.fetchall()
+        _advertencias.extend(verificar_consultas())
+        _listo = True
+
+
+def advertencias_esquema():
+    """Problemas encontrados al arrancar (migraciones fallidas, consultas sin índice)."""
+    return list(_advertencias)
+
+
+def migraciones_pendientes():
+    """
+    Migraciones necesarias (MIGRACIONES_NECESARIAS) que no se pudieron
+    aplicar, como (versión, descripción). Con alguna, no se puede vender.
+    """
+    return list(_pendientes)
+
+
+def version_esquema(cursor):
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM esquema_version")
+    return cursor.fetchone()[0]
+
+
+def versiones_aplicadas(cursor):
+    cursor.execute("SELECT version FROM esquema_version")
+    return {fila[0] for fila in cursor.fetchall()}
+
+
+def _migrar(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS esquema_version (
+            version INT NOT NULL,
+            descripcion VARCHAR(255) NOT NULL,
+            aplicada DATETIME NOT NULL,
+            PRIMARY KEY (version)
+        ) ENGINE=InnoDB
+    """)
+    aplicadas = versiones_aplicadas(cursor)
+
+    for version, descripcion, migracion, requiere in MIGRACIONES:
+        if version in aplicadas:
+            continue
+        faltan = [str(v) for v in requiere if v not in aplicadas]
+        if faltan:
+            _advertencias.append(
+                f"Migración {version} ({descripcion}) pendiente: requiere la {', '.join(faltan)}"
+            )
+        else:
+            try:
+                migracion(cursor)
+            except (errors.Error, ValueError) as e:
+                _advertencias.append(f"Migración {version} ({descripcion}) pendiente: {e}")
+            else:
+                cursor.execute(
+                    "INSERT INTO esquema_version (version, descripcion, aplicada) "
+                    "VALUES (%s, %s, NOW())",
+                    (version, descripcion)
+                )
+                aplicadas.add(version)
+                continue
+        if version in MIGRACIONES_NECESARIAS:
+            _pendientes.append((version, descripcion))
+
+
+def _asegurar_indices(cursor):
+    cursor.execute("""
+        SELECT DISTINCT TABLE_NAME, INDEX_NAME
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE()
+    """)
+    existentes = {(tabla, indice) for tabla, indice in cursor.fetchall()}
+
+    for tabla, indice, columnas in INDICES:
+        if (tabla, indice) not in existentes:
+            try:
+                cursor.execute(f"ALTER TABLE {tabla} ADD INDEX {indice} ({columnas})")
+            except errors.Error as e:
+                _advertencias.append(f"No se pudo crear {indice} en {tabla}: {e}")
+
+
+def verificar_consultas():
+    """
+    Corre EXPLAIN sobre CONSULTAS. Retorna una advertencia por cada tabla
+    que se leería completa sin poder usar ninguno de sus índices esperados.
+    """
+    if motor() == "sqlite":
+        return _verificar_consultas_sqlite()
+
+    advertencias = []
+    with abrir_cursor(dictionary=True) as cursor:
+        for nombre, sql, params, esperados in CONSULTAS:
+            try:
+                cursor.execute(f"EXPLAIN {sql}", params)
+                plan = cursor.fetchall()
+            except errors.Error as e:
+                advertencias.append(f"No se pudo revisar «{nombre}»: {e}")
+                continue
+
+            for paso in plan:
+                tabla = paso.get("table")
+                if tabla not in esperados:
+                    continue
+                posibles = set((paso.get("possible_keys") or "").split(","))
+                posibles.add(paso.get("key") or "")
+                if not posibles & set(esperados[tabla]):
+                    advertencias.append(
+                        f"«{nombre}» no usa índice en {tabla} "
+                        f"(acceso {paso.get('type')}); se esperaba {' o '.join(esperados[tabla])}"
+                    )
+    return advertencias
+
+
+def _verificar_consultas_sqlite():
+    """
+    Igual que `verificar_consultas` con EXPLAIN QUERY PLAN: advierte si
+    alguna tabla esperada se recorre completa (SCAN sin índice).
+    """
+    advertencias = []
+    with abrir_cursor(lectura=True) as cursor:
+        for nombre, sql, params, esperados in CONSULTAS:
+            try:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+                plan = [fila[-1] for fila in cursor.fetchall()]
+            except errors.Error as e:
+                advertencias.append(f"No se pudo revisar «{nombre}»: {e}")
+                continue
+
+            for tabla in esperados:
+                for paso in plan:
+                    if paso.split()[:2] == ["SCAN", tabla] and " USING " not in paso:
+                        advertencias.append(f"«{nombre}» recorre {tabla} completa ({paso})")
+    return advertencias
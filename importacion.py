@@ -0,0 +1,215 @@
+import csv
+import io
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from mysql.connector import errors
+
+from db import (
+    conexion,
+    invalidar_catalogo,
+    marcar_escritura,
+    registrar_movimientos,
+    MOVIMIENTO_AJUSTE,
+    MOVIMIENTO_ENTRADA
+)
+
+# ------------------ IMPORTAR / EXPORTAR CATÁLOGO ------------------
+# La importación lee el CSV fila por fila (nunca el archivo completo en
+# memoria), valida cada fila y envía bloques de `tamano_lote` filas como un
+# solo INSERT ... ON DUPLICATE KEY UPDATE. Cada bloque va en su propia
+# transacción: si uno falla se reporta y se sigue con el siguiente.
+
+COLUMNAS = ("codigo", "nombre", "precio", "stock")
+LOTE_IMPORTACION = 500
+LOTE_EXPORTACION = 1000
+
+
+def _validar(fila, con_stock):
+    """Retorna (codigo, nombre, precio, stock) o lanza ValueError."""
+    codigo = (fila.get("codigo") or "").strip()
+    nombre = (fila.get("nombre") or "").strip()
+
+    if not codigo:
+        raise ValueError("falta el código")
+    if len(codigo) > 64:
+        raise ValueError("código de más de 64 caracteres")
+    if not nombre:
+        raise ValueError("falta el nombre")
+
+    try:
+        precio = Decimal((fila.get("precio") or "").replace("$", "").replace(",", "").strip())
+        # NaN e Infinity sí se construyen, pero no se comparan ni redondean
+        if not precio.is_finite():
+            raise InvalidOperation
+        precio = precio.quantize(Decimal("0.01"))
+    except InvalidOperation:
+        raise ValueError(f"precio inválido: {fila.get('precio')!r}")
+    if precio <= 0:
+        raise ValueError("el precio debe ser mayor que cero")
+
+    stock = 0
+    if con_stock:
+        try:
+            stock = int((fila.get("stock") or "0").strip())
+        except ValueError:
+            raise ValueError(f"stock inválido: {fila.get('stock')!r}")
+        if stock < 0:
+            raise ValueError("el stock no puede ser negativo")
+
+    return codigo, nombre, precio, stock
+
+
+def _enviar_lote(filas, con_stock):
+    actualizar = "nombre = VALUES(nombre), precio = VALUES(precio)"
+    if con_stock:
+        actualizar += ", stock = VALUES(stock)"
+
+    marcadores = ", ".join(["(%s, %s, %s, %s)"] * len(filas))
+    marcar_escritura()
+    with conexion() as conn:
+        cursor = conn.cursor()
+        try:
+            anteriores = {}
+            if con_stock:
+                # Stock previo (bloqueado) para anotar la diferencia en el diario
+                cursor.execute(
+                    "SELECT codigo, stock FROM productos WHERE codigo IN ("
+                    + ", ".join(["%s"] * len(filas)) + ") FOR UPDATE",
+                    [fila[0] for fila in filas]
+                )
+                anteriores = {codigo.upper(): stock for codigo, stock in cursor.fetchall()}
+
+            cursor.execute(
+                f"INSERT INTO productos ({', '.join(COLUMNAS)}) VALUES {marcadores} "
+                f"ON DUPLICATE KEY UPDATE {actualizar}",
+                [valor for fila in filas for valor in fila]
+            )
+
+            if con_stock:
+                ahora = datetime.now().replace(microsecond=0)
+                movimientos = []
+                for codigo, _, _, stock in filas:
+                    anterior = anteriores.get(codigo.upper())
+                    tipo = MOVIMIENTO_ENTRADA if anterior is None else MOVIMIENTO_AJUSTE
+                    movimientos.append((ahora, codigo, tipo, stock - (anterior or 0), "importación"))
+                registrar_movimientos(cursor, movimientos)
+            conn.commit()
+        finally:
+            cursor.close()
+
+
+def importar_csv(archivo, tamano_lote=LOTE_IMPORTACION, progreso=None):
+    """
+    Importa productos desde un CSV con columnas codigo, nombre, precio y
+    (opcional) stock. Si el código ya existe se actualizan nombre y precio,
+    y el stock solo si el archivo trae esa columna.
+
+    `archivo` puede ser texto o binario (p. ej. lo que entrega
+    st.file_uploader). `progreso(filas, fraccion)` se llama tras cada bloque.
+
+    Retorna un reporte con filas leídas, filas enviadas, errores por fila
+    y errores por bloque.
+    """
+    crudo = archivo
+    if not isinstance(archivo, io.TextIOBase):
+        archivo = io.TextIOWrapper(archivo, encoding="utf-8-sig", newline="")
+
+    total_bytes = getattr(crudo, "size", None)
+
+    lector = csv.DictReader(archivo)
+    encabezados = [c.strip().lower() for c in (lector.fieldnames or [])]
+    lector.fieldnames = encabezados
+    faltantes = [c for c in ("codigo", "nombre", "precio") if c not in encabezados]
+    if faltantes:
+        raise ValueError(f"Faltan columnas en el archivo: {', '.join(faltantes)}")
+    con_stock = "stock" in encabezados
+
+    reporte = {
+        "filas": 0,
+        "enviadas": 0,
+        "errores_filas": [],     # (línea, mensaje)
+        "errores_lotes": [],     # (primera línea, última línea, mensaje)
+    }
+
+    lote = {}
+    primera_linea = None
+
+    def enviar():
+        if not lote:
+            return
+        try:
+            _enviar_lote(list(lote.values()), con_stock)
+            reporte["enviadas"] += len(lote)
+        except errors.Error as e:
+            reporte["errores_lotes"].append((primera_linea, lector.line_num, str(e)))
+        lote.clear()
+
+        if progreso is not None:
+            fraccion = None
+            if total_bytes:
+                try:
+                    fraccion = min(crudo.tell() / total_bytes, 1.0)
+                except (OSError, ValueError):
+                    pass
+            progreso(reporte["filas"], fraccion)
+
+    for fila in lector:
+        reporte["filas"] += 1
+        try:
+            producto = _validar(fila, con_stock)
+        except ValueError as e:
+            reporte["errores_filas"].append((lector.line_num, str(e)))
+            continue
+
+        if not lote:
+            primera_linea = lector.line_num
+        # Un código repetido dentro del bloque: gana la última fila
+        lote[producto[0]] = producto
+
+        if len(lote) >= tamano_lote:
+            enviar()
+
+    enviar()
+    invalidar_catalogo()
+    return reporte
+
+
+def iterar_productos(lote=LOTE_EXPORTACION):
+    """
+    Recorre todo el catálogo con un cursor sin búfer: el servidor envía las
+    filas por partes y nunca se tiene la tabla completa en memoria.
+    """
+    with conexion(lectura=True) as conn:
+        cursor = conn.cursor(buffered=False)
+        try:
+            cursor.execute(f"""
+                SELECT {', '.join(COLUMNAS)}
+                FROM productos
+                ORDER BY codigo
+            """)
+            while True:
+                filas = cursor.fetchmany(lote)
+                if not filas:
+                    break
+                yield from filas
+        finally:
+            # Si se dejó de leer a medias, se descarta el resto antes de
+            # devolver la conexión al pool
+            if conn.unread_result:
+                conn.consume_results()
+            cursor.close()
+
+
+def exportar_csv(salida, progreso=None):
+    """Escribe el catálogo como CSV en `salida` (texto). Retorna cuántas filas."""
+    escritor = csv.writer(salida)
+    escritor.writerow(COLUMNAS)
+
+    n = 0
+    for fila in iterar_productos():
+        escritor.writerow(fila)
+        n += 1
+        if progreso is not None and n % LOTE_EXPORTACION == 0:
+            progreso(n)
+    return n
@@ -0,0 +1,439 @@
+import csv
+import io
+from datetime import datetime, timedelta
+
+import pandas as pd
+import streamlit as st
+
+from config import opcion
+from carrito import contar_codigos
+from db import (
+    abrir_cursor,
+    conciliar_stock,
+    marcar_escritura,
+    obtener_producto_por_codigo,
+    obtener_productos_por_codigos,
+    sumar_stock,
+    MOVIMIENTO_ENTRADA
+)
+
+# ------------------ CORTES DE STOCK ------------------
+# Un corte es una foto del stock de todos los productos junto con el último
+# movimiento que ya incluye. El stock de cualquier producto se puede
+# reconstruir como corte + movimientos posteriores, sin recorrer todo el
+# diario; comparar eso con `productos.stock` detecta descuadres.
+
+CORTES_CONSERVAR = 30
+
+
+def tomar_corte(cursor=None):
+    """Guarda un corte del stock actual y retorna su id."""
+    if cursor is None:
+        with abrir_cursor() as cursor:
+            return tomar_corte(cursor)
+
+    cursor.execute("""
+        INSERT INTO stock_cortes (fecha, hasta_movimiento, productos)
+        VALUES (%s, 0, 0)
+    """, (datetime.now().replace(microsecond=0),))
+    corte_id = cursor.lastrowid
+
+    # INSERT ... SELECT bloquea (lectura compartida) todas las filas de
+    # productos: ninguna venta puede estar a medias. El MAX(id) se lee
+    # después, así incluye exactamente los movimientos ya reflejados.
+    cursor.execute("""
+        INSERT INTO stock_corte_items (corte_id, codigo, stock)
+        SELECT %s, codigo, stock FROM productos
+    """, (corte_id,))
+    productos = cursor.rowcount
+
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM movimientos_stock")
+    hasta = cursor.fetchone()[0]
+    cursor.execute("""
+        UPDATE stock_cortes SET hasta_movimiento = %s, productos = %s
+        WHERE id = %s
+    """, (hasta, productos, corte_id))
+
+    # Cortes viejos
+    cursor.execute("""
+        SELECT id FROM stock_cortes
+        ORDER BY id DESC
+        LIMIT 1 OFFSET %s
+    """, (CORTES_CONSERVAR,))
+    fila = cursor.fetchone()
+    if fila is not None:
+        cursor.execute("DELETE FROM stock_corte_items WHERE corte_id <= %s", (fila[0],))
+        cursor.execute("DELETE FROM stock_cortes WHERE id <= %s", (fila[0],))
+    return corte_id
+
+
+def ultimo_corte(cursor):
+    cursor.execute("""
+        SELECT id, fecha, hasta_movimiento, productos
+        FROM stock_cortes
+        ORDER BY id DESC
+        LIMIT 1
+    """)
+    return cursor.fetchone()
+
+
+def asegurar_corte_reciente():
+    """Toma un corte si el último tiene más de `corte_stock_horas` horas."""
+    horas = float(opcion("corte_stock_horas", 24))
+    with abrir_cursor(dictionary=True, solo_lectura=True) as cursor:
+        corte = ultimo_corte(cursor)
+    if corte is None or corte["fecha"] < datetime.now() - timedelta(hours=horas):
+        tomar_corte()
+
+
+def stock_calculado(codigos):
+    """
+    {codigo: stock} reconstruido desde el último corte más los movimientos
+    posteriores (usa el índice (codigo, id) del diario).
+    """
+    if not codigos:
+        return {}
+    marcadores = ", ".join(["%s"] * len(codigos))
+    with abrir_cursor(dictionary=True, solo_lectura=True) as cursor:
+        corte = ultimo_corte(cursor)
+        if corte is None:
+            return {}
+
+        cursor.execute(f"""
+            SELECT codigo, stock
+            FROM stock_corte_items
+            WHERE corte_id = %s AND codigo IN ({marcadores})
+        """, [corte["id"]] + list(codigos))
+        stock = {f["codigo"].upper(): f["stock"] for f in cursor.fetchall()}
+
+        cursor.execute(f"""
+            SELECT codigo, SUM(cantidad) AS cantidad
+            FROM movimientos_stock
+            WHERE codigo IN ({marcadores}) AND id > %s
+            GROUP BY codigo
+        """, list(codigos) + [corte["hasta_movimiento"]])
+        for fila in cursor.fetchall():
+            clave = fila["codigo"].upper()
+            stock[clave] = stock.get(clave, 0) + int(fila["cantidad"])
+
+    return {codigo: stock.get(codigo.upper(), 0) for codigo in codigos}
+
+
+def descuadres(limite=200):
+    """
+    Productos cuyo stock no coincide con corte + movimientos. Los
+    movimientos se suman solo desde el último corte. Puede leer de una
+    réplica: stock y diario llegan en la misma transacción.
+    """
+    with abrir_cursor(dictionary=True, lectura=True) as cursor:
+        corte = ultimo_corte(cursor)
+        if corte is None:
+            return []
+        cursor.execute("""
+            SELECT p.codigo, p.nombre, p.stock,
+                   COALESCE(c.stock, 0) + COALESCE(m.cantidad, 0) AS calculado
+            FROM productos p
+            LEFT JOIN stock_corte_items c
+                   ON c.corte_id = %s AND c.codigo = p.codigo
+            LEFT JOIN (
+                SELECT codigo, SUM(cantidad) AS cantidad
+                FROM movimientos_stock
+                WHERE id > %s
+                GROUP BY codigo
+            ) m ON m.codigo = p.codigo
+            WHERE p.stock <> COALESCE(c.stock, 0) + COALESCE(m.cantidad, 0)
+            ORDER BY p.nombre
+            LIMIT %s
+        """, (corte["id"], corte["hasta_movimiento"], limite))
+        return cursor.fetchall()
+
+
+# ------------------ Consultas ------------------
+def productos_por_reabastecer(limite=200):
+    """
+    Productos con stock en o bajo su mínimo, los más faltantes primero.
+    Recorre solo el índice de `faltante` (columna generada).
+    """
+    with abrir_cursor(dictionary=True, lectura=True) as cursor:
+        cursor.execute("""
+            SELECT codigo, nombre, stock, stock_minimo, faltante
+            FROM productos
+            WHERE faltante >= 0
+            ORDER BY faltante DESC
+            LIMIT %s
+        """, (limite,))
+        return cursor.fetchall()
+
+
+def fijar_minimo(codigo, minimo):
+    """Mínimo de stock del producto (None lo quita de la lista)."""
+    marcar_escritura()
+    with abrir_cursor() as cursor:
+        cursor.execute(
+            "UPDATE productos SET stock_minimo = %s WHERE codigo = %s",
+            (None if minimo is None else int(minimo), codigo)
+        )
+
+
+def movimientos_producto(codigo, limite=100):
+    """
+    Últimos movimientos del producto con el stock que dejó cada uno
+    (se reconstruye hacia atrás desde el stock vigente).
+    """
+    producto = obtener_producto_por_codigo(codigo)
+    if producto is None:
+        return []
+
+    with abrir_cursor(dictionary=True, solo_lectura=True) as cursor:
+        cursor.execute("""
+            SELECT fecha, tipo, cantidad, referencia
+            FROM movimientos_stock
+            WHERE codigo = %s
+            ORDER BY id DESC
+            LIMIT %s
+        """, (producto["codigo"], limite))
+        movimientos = cursor.fetchall()
+
+    saldo = producto["stock"]
+    for movimiento in movimientos:
+        movimiento["stock"] = saldo
+        saldo -= movimiento["cantidad"]
+    return movimientos
+
+
+# ------------------ CONTEO FÍSICO ------------------
+# Lo contado se acumula en la sesión ({codigo: cantidad}) sin tocar la BD.
+# Al terminar, `db.conciliar_stock` aplica todas las diferencias en una
+# sola transacción.
+
+def conteo_a_csv(conteo):
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    escritor.writerow(("codigo", "cantidad"))
+    escritor.writerows(conteo.items())
+    return salida.getvalue().encode("utf-8")
+
+
+def conteo_desde_csv(archivo):
+    """{codigo: cantidad} de un CSV con columnas codigo y cantidad."""
+    lector = csv.DictReader(io.TextIOWrapper(archivo, encoding="utf-8-sig", newline=""))
+    conteo = {}
+    for fila in lector:
+        codigo = (fila.get("codigo") or "").strip()
+        if codigo:
+            conteo[codigo] = conteo.get(codigo, 0) + int(fila.get("cantidad") or 0)
+    return conteo
+
+
+def vista_conteo(conteo):
+    """Tabla de lo contado contra el stock del sistema (desde la caché)."""
+    productos = obtener_productos_por_codigos(list(conteo))
+    filas = []
+    for codigo, contado in conteo.items():
+        producto = productos.get(codigo)
+        sistema = producto["stock"] if producto is not None else None
+        filas.append({
+            "codigo": codigo,
+            "nombre": producto["nombre"] if producto is not None else "¿desconocido?",
+            "contado": contado,
+            "sistema": sistema,
+            "diferencia": None if sistema is None else contado - sistema
+        })
+    return pd.DataFrame(filas)
+
+
+def render_conteo():
+    conteo = st.session_state.setdefault("conteo", {})
+
+    with st.form("form_conteo", clear_on_submit=True):
+        codigos = st.text_area(
+            "Códigos escaneados",
+            help="Uno o varios códigos (separados por líneas o espacios); "
+                 "los repetidos se suman."
+        )
+        c1, c2 = st.columns(2)
+        with c1:
+            cantidad = st.number_input("Cantidad por código", min_value=0, step=1, value=1)
+        with c2:
+            reemplazar = st.checkbox("Reemplazar lo contado (corregir)")
+        enviado = st.form_submit_button("Agregar al conteo")
+
+    if enviado and codigos.strip():
+        leidos = contar_codigos(codigos)
+        productos = obtener_productos_por_codigos(list(leidos))
+        desconocidos = [codigo for codigo in leidos if codigo not in productos]
+        for codigo, veces in leidos.items():
+            producto = productos.get(codigo)
+            if producto is None:
+                continue
+            clave = producto["codigo"]
+            if reemplazar:
+                conteo[clave] = int(cantidad)
+            else:
+                conteo[clave] = conteo.get(clave, 0) + veces * int(cantidad)
+        if desconocidos:
+            st.error(f"Código no encontrado: {', '.join(desconocidos)}")
+
+    # -------- Guardar / retomar el conteo --------
+    with st.expander("Guardar o retomar un conteo"):
+        if conteo:
+            st.download_button(
+                "Descargar conteo (CSV)",
+                conteo_a_csv(conteo),
+                file_name="conteo.csv",
+                mime="text/csv"
+            )
+        archivo = st.file_uploader("Retomar conteo (CSV: codigo, cantidad)", type=["csv"])
+        if archivo is not None and st.button("Cargar conteo"):
+            try:
+                conteo.update(conteo_desde_csv(archivo))
+                st.rerun()
+            except ValueError as e:
+                st.error(f"Archivo inválido: {e}")
+
+    reporte = st.session_state.get("conteo_reporte")
+    if reporte is not None:
+        diferencias, desconocidos = reporte
+        st.success(f"Conteo conciliado: {len(diferencias):,} productos con diferencias ajustados.")
+        if diferencias:
+            df = pd.DataFrame(diferencias)
+            st.dataframe(df, hide_index=True, use_container_width=True)
+            st.download_button(
+                "Descargar reporte de diferencias",
+                df.to_csv(index=False).encode("utf-8"),
+                file_name="diferencias_conteo.csv",
+                mime="text/csv"
+            )
+        if desconocidos:
+            st.warning(f"Códigos que ya no existen: {', '.join(desconocidos)}")
+
+    if not conteo:
+        st.info("Escanea productos para empezar el conteo.")
+        return
+
+    df = vista_conteo(conteo)
+    con_diferencia = df["diferencia"].fillna(0).ne(0)
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Productos contados", f"{len(df):,}")
+    c2.metric("Unidades contadas", f"{int(df['contado'].sum()):,}")
+    c3.metric("Con diferencia", f"{int(con_diferencia.sum()):,}")
+
+    solo_diferencias = st.checkbox("Mostrar solo diferencias", value=True)
+    st.dataframe(
+        df[con_diferencia] if solo_diferencias else df,
+        hide_index=True,
+        use_container_width=True
+    )
+
+    b1, b2 = st.columns(2)
+    with b1:
+        if st.button("Conciliar con el sistema", type="primary", use_container_width=True):
+            st.session_state.conteo_reporte = conciliar_stock(conteo)
+            st.session_state.conteo = {}
+            st.rerun()
+    with b2:
+        if st.button("Descartar conteo", use_container_width=True):
+            st.session_state.conteo = {}
+            st.session_state.pop("conteo_reporte", None)
+            st.rerun()
+
+
+# ------------------ Render Inventario ------------------
+def render_inventario():
+    st.header("Inventario")
+    asegurar_corte_reciente()
+
+    reabastecer, entradas, conteo, kardex, minimos, auditoria = st.tabs(
+        ["Reabastecer", "Entradas", "Conteo físico", "Movimientos", "Mínimos", "Auditoría"]
+    )
+
+    # -------- Por reabastecer --------
+    with reabastecer:
+        filas = productos_por_reabastecer()
+        if filas:
+            df = pd.DataFrame(filas).set_index("codigo")
+            st.dataframe(df, use_container_width=True)
+            st.download_button(
+                "Descargar lista (CSV)",
+                df.to_csv().encode("utf-8"),
+                file_name="reabastecer.csv",
+                mime="text/csv"
+            )
+        else:
+            st.info("Ningún producto está en su mínimo (o no hay mínimos definidos).")
+
+    # -------- Entradas de mercancía --------
+    with entradas:
+        with st.form("form_entrada", clear_on_submit=True):
+            codigo = st.text_input("Código de barras")
+            cantidad = st.number_input("Cantidad recibida", min_value=1, step=1, value=1)
+            referencia = st.text_input("Referencia (factura, proveedor)")
+            if st.form_submit_button("Registrar entrada"):
+                producto = obtener_producto_por_codigo(codigo)
+                if producto is None:
+                    st.error(f"Código no encontrado: {codigo}")
+                else:
+                    sumar_stock(
+                        producto["codigo"], int(cantidad),
+                        tipo=MOVIMIENTO_ENTRADA, referencia=referencia.strip() or None
+                    )
+                    st.success(f"{producto['nombre']}: +{int(cantidad)} (stock {producto['stock']}).")
+
+    # -------- Conteo físico --------
+    with conteo:
+        render_conteo()
+
+    # -------- Movimientos de un producto --------
+    with kardex:
+        codigo = st.text_input("Código de barras", key="inventario_kardex")
+        if codigo.strip():
+            # Stock vigente contra el reconstruido desde el diario
+            producto = obtener_producto_por_codigo(codigo)
+            if producto is not None:
+                calculado = stock_calculado([producto["codigo"]])
+                c1, c2 = st.columns(2)
+                c1.metric("Stock", f"{producto['stock']:,}")
+                if calculado:
+                    diferencia = producto["stock"] - calculado[producto["codigo"]]
+                    c2.metric(
+                        "Según el diario", f"{calculado[producto['codigo']]:,}",
+                        delta=f"{diferencia:+,} descuadre" if diferencia else None,
+                        delta_color="inverse"
+                    )
+            movimientos = movimientos_producto(codigo)
+            if movimientos:
+                st.dataframe(pd.DataFrame(movimientos), hide_index=True, use_container_width=True)
+            else:
+                st.info("Sin movimientos para ese código.")
+
+    # -------- Mínimos por producto --------
+    with minimos:
+        with st.form("form_minimo", clear_on_submit=True):
+            codigo = st.text_input("Código de barras")
+            minimo = st.number_input("Stock mínimo (0 = sin mínimo)", min_value=0, step=1)
+            if st.form_submit_button("Guardar mínimo"):
+                producto = obtener_producto_por_codigo(codigo)
+                if producto is None:
+                    st.error(f"Código no encontrado: {codigo}")
+                else:
+                    fijar_minimo(producto["codigo"], int(minimo) or None)
+                    st.success(f"Mínimo de {producto['nombre']} guardado.")
+
+    # -------- Auditoría del diario --------
+    with auditoria:
+        st.caption(
+            "Compara el stock de cada producto con el último corte más los "
+            "movimientos posteriores."
+        )
+        c1, c2 = st.columns(2)
+        with c1:
+            if st.button("Buscar descuadres", use_container_width=True):
+                filas = descuadres()
+                if filas:
+                    st.dataframe(pd.DataFrame(filas), hide_index=True, use_container_width=True)
+                else:
+                    st.success("El stock coincide con el diario.")
+        with c2:
+            if st.button("Tomar corte ahora", use_container_width=True):
+                tomar_corte()
+                st.success("Corte guardado.")
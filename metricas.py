@@ -0,0 +1,202 @@
+import functools
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# ------------------ MÉTRICAS EN MEMORIA ------------------
+# Cada serie guarda las últimas `MUESTRAS` duraciones para calcular
+# percentiles móviles, más contadores acumulados (total y suma) para el
+# formato de Prometheus. Todo es del proceso: lo comparten las sesiones.
+# Las llamadas que terminan en excepción también cuentan (son justo las
+# que interesan: pool agotado, conexión caída) y suman a `errores`.
+
+MUESTRAS = 1000
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+class Serie:
+    __slots__ = ("duraciones", "filas", "total", "suma", "suma_filas", "errores")
+
+    def __init__(self):
+        self.duraciones = deque(maxlen=MUESTRAS)
+        self.filas = deque(maxlen=MUESTRAS)
+        self.total = 0
+        self.suma = 0.0
+        self.suma_filas = 0
+        self.errores = 0
+
+    def agregar(self, segundos, filas=None, error=False):
+        self.duraciones.append(segundos)
+        self.total += 1
+        self.suma += segundos
+        if error:
+            self.errores += 1
+        if filas is not None:
+            self.filas.append(filas)
+            self.suma_filas += filas
+
+    def percentiles(self):
+        ordenadas = sorted(self.duraciones)
+        if not ordenadas:
+            return {p: 0.0 for p in PERCENTILES}
+        return {
+            p: ordenadas[min(len(ordenadas) - 1, int(p * len(ordenadas)))]
+            for p in PERCENTILES
+        }
+
+
+_series = {}
+_lock = threading.Lock()
+
+
+def registrar(nombre, segundos, filas=None, error=False):
+    with _lock:
+        serie = _series.get(nombre)
+        if serie is None:
+            serie = _series[nombre] = Serie()
+        serie.agregar(segundos, filas, error)
+
+
+def _contar_filas(resultado):
+    if resultado is None:
+        return 0
+    if isinstance(resultado, tuple) and resultado and isinstance(resultado[0], list):
+        return len(resultado[0])
+    if isinstance(resultado, list):
+        return len(resultado)
+    if isinstance(resultado, dict):
+        return 1
+    return None
+
+
+def medir(nombre):
+    """
+    Decorador: registra duración y filas devueltas de cada llamada; si
+    lanza una excepción, la duración hasta el error y un error más.
+    """
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            inicio = time.perf_counter()
+            filas = None
+            error = False
+            try:
+                resultado = funcion(*args, **kwargs)
+                filas = _contar_filas(resultado)
+                return resultado
+            except Exception:
+                error = True
+                raise
+            finally:
+                registrar(nombre, time.perf_counter() - inicio, filas, error)
+        return envoltura
+    return decorador
+
+
+@contextmanager
+def seccion(nombre):
+    """Mide un bloque del rerun (p. ej. `with seccion("pos.carrito"):`)."""
+    inicio = time.perf_counter()
+    error = False
+    try:
+        yield
+    except Exception:
+        # st.rerun()/st.stop() no son Exception: no cuentan como error
+        error = True
+        raise
+    finally:
+        registrar(nombre, time.perf_counter() - inicio, error=error)
+
+
+# ------------------ Consulta ------------------
+def resumen():
+    """Lista de dicts por serie: llamadas, errores, media y percentiles en ms, filas."""
+    with _lock:
+        datos = [
+            (nombre, s.percentiles(), s.total, s.suma, list(s.filas), s.errores)
+            for nombre, s in sorted(_series.items())
+        ]
+
+    return [
+        {
+            "serie": nombre,
+            "llamadas": total,
+            "errores": errores,
+            "media_ms": round(suma / total * 1000, 3) if total else 0.0,
+            **{f"p{int(p * 100)}_ms": round(v * 1000, 3) for p, v in percentiles.items()},
+            "filas_media": round(sum(filas) / len(filas), 1) if filas else None,
+        }
+        for nombre, percentiles, total, suma, filas, errores in datos
+    ]
+
+
+def reiniciar():
+    with _lock:
+        _series.clear()
+
+
+# ------------------ Prometheus ------------------
+def _nombre_prometheus(nombre):
+    return re.sub(r"[^a-zA-Z0-9_]", "_", nombre)
+
+
+def exportar_prometheus():
+    """Texto en formato de exposición de Prometheus (tipo summary)."""
+    with _lock:
+        datos = [
+            (nombre, s.percentiles(), s.total, s.suma, s.suma_filas, s.errores)
+            for nombre, s in sorted(_series.items())
+        ]
+
+    lineas = [
+        "# HELP sgventas_duracion_segundos Duración de consultas y secciones de SGVentas.",
+        "# TYPE sgventas_duracion_segundos summary",
+    ]
+    for nombre, percentiles, total, suma, _, _ in datos:
+        etiqueta = f'serie="{_nombre_prometheus(nombre)}"'
+        for p, valor in percentiles.items():
+            lineas.append(f'sgventas_duracion_segundos{{{etiqueta},quantile="{p}"}} {valor:.6f}')
+        lineas.append(f"sgventas_duracion_segundos_sum{{{etiqueta}}} {suma:.6f}")
+        lineas.append(f"sgventas_duracion_segundos_count{{{etiqueta}}} {total}")
+
+    lineas.append("# HELP sgventas_filas_total Filas devueltas por las consultas.")
+    lineas.append("# TYPE sgventas_filas_total counter")
+    for nombre, _, _, _, suma_filas, _ in datos:
+        if suma_filas:
+            lineas.append(
+                f'sgventas_filas_total{{serie="{_nombre_prometheus(nombre)}"}} {suma_filas}'
+            )
+
+    # Todas las series, también en 0: así rate() ve el primer error
+    lineas.append("# HELP sgventas_errores_total Llamadas que terminaron en excepción.")
+    lineas.append("# TYPE sgventas_errores_total counter")
+    for nombre, _, _, _, _, errores in datos:
+        lineas.append(
+            f'sgventas_errores_total{{serie="{_nombre_prometheus(nombre)}"}} {errores}'
+        )
+    return "\n".join(lineas) + "\n"
+
+
+_ultima_escritura = 0.0
+
+
+def escribir_prometheus(ruta, cada=15.0):
+    """
+    Escribe el archivo para el textfile collector de node_exporter, como
+    máximo cada `cada` segundos. Se escribe a un temporal y se renombra
+    para que el lector nunca vea un archivo a medias.
+    """
+    global _ultima_escritura
+
+    ahora = time.monotonic()
+    if ahora - _ultima_escritura < cada:
+        return
+    _ultima_escritura = ahora
+
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        f.write(exportar_prometheus())
+    os.replace(temporal, ruta)
@@ -0,0 +1,235 @@
+import functools
+import os
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+
+from mysql.connector import errors
+
+# ------------------ MOTOR SQLITE ------------------
+# Base de datos en un archivo local para tiendas de una sola caja: sin
+# servidor ni red. Imita la parte de mysql.connector que usa SGVentas
+# (pool, conexión, cursor con `dictionary`, las mismas excepciones), así
+# db.py y los demás módulos no cambian. Las sentencias escritas para
+# MySQL se traducen una vez (ver `traducir`) y sqlite3 guarda compilada
+# cada sentencia por conexión.
+
+SENTENCIAS_EN_CACHE = 512
+ESPERA_BLOQUEO_MS = 5000
+
+
+# -------- Tipos --------
+# DECIMAL se guarda como número y vuelve como Decimal redondeado a
+# centavos; fechas como texto ISO, que se ordena igual que la fecha.
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(datetime, lambda valor: valor.isoformat(" "))
+sqlite3.register_adapter(date, lambda valor: valor.isoformat())
+sqlite3.register_converter("DECIMAL", lambda b: Decimal(b.decode()).quantize(Decimal("0.01")))
+sqlite3.register_converter("DATETIME", lambda b: datetime.fromisoformat(b.decode()))
+sqlite3.register_converter("DATE", lambda b: date.fromisoformat(b.decode()[:10]))
+
+
+# -------- Dialecto --------
+_VALUES_COLUMNA = re.compile(r"VALUES\((\w+)\)")
+_FOR_UPDATE = re.compile(r"\s+FOR UPDATE\b")
+_LIKE = re.compile(r"LIKE %s")
+_LECTURAS = ("SELECT", "WITH", "EXPLAIN", "PRAGMA")
+
+
+@functools.lru_cache(maxsize=SENTENCIAS_EN_CACHE)
+def traducir(sql):
+    """
+    Sentencia de MySQL a SQLite:
+    - `%s` → `?`
+    - `ON DUPLICATE KEY UPDATE c = VALUES(c)` → `ON CONFLICT DO UPDATE SET c = excluded.c`
+    - `SELECT ... FOR UPDATE` → sin la cláusula (la transacción ya tiene
+      el candado de escritura, ver _Conexion)
+    - `LIKE %s` → con ESCAPE '\\' (MySQL lo usa por defecto)
+    """
+    sql = _FOR_UPDATE.sub("", sql)
+    if "ON DUPLICATE KEY UPDATE" in sql:
+        insercion, actualizacion = sql.split("ON DUPLICATE KEY UPDATE", 1)
+        sql = (insercion + "ON CONFLICT DO UPDATE SET "
+               + _VALUES_COLUMNA.sub(r"excluded.\1", actualizacion))
+    sql = _LIKE.sub("LIKE %s ESCAPE '\\\\'", sql)
+    return sql.replace("%s", "?")
+
+
+def _error(e):
+    """Excepción de sqlite3 como la de mysql.connector equivalente."""
+    mensaje = str(e)
+    if isinstance(e, sqlite3.IntegrityError):
+        return errors.IntegrityError(msg=mensaje)
+    if isinstance(e, sqlite3.OperationalError):
+        if mensaje.startswith(("no such", "near ", "table ")) or "syntax error" in mensaje:
+            return errors.ProgrammingError(msg=mensaje)
+        return errors.OperationalError(msg=mensaje)
+    return errors.DatabaseError(msg=mensaje)
+
+
+# -------- Cursor --------
+class _Cursor:
+    """Cursor con la interfaz de mysql.connector (tuplas o dicts)."""
+
+    def __init__(self, conexion, dictionary=False):
+        self._conexion = conexion
+        self._cursor = conexion._db.cursor()
+        self._dictionary = dictionary
+
+    def execute(self, sql, params=()):
+        self._conexion._empezar(sql)
+        try:
+            self._cursor.execute(traducir(sql), tuple(params or ()))
+        except sqlite3.Error as e:
+            raise _error(e) from e
+
+    def _fila(self, fila):
+        if fila is None or not self._dictionary:
+            return fila
+        return dict(zip(self.column_names, fila))
+
+    def fetchone(self):
+        return self._fila(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._fila(f) for f in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        filas = self._cursor.fetchall()
+        if not self._dictionary:
+            return filas
+        columnas = self.column_names
+        return [dict(zip(columnas, f)) for f in filas]
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    @property
+    def column_names(self):
+        return tuple(d[0] for d in self._cursor.description or ())
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def close(self):
+        self._cursor.close()
+
+
+# -------- Conexión --------
+class _Conexion:
+    """
+    Conexión prestada por `PoolSQLite`. Las transacciones se abren al
+    primer comando: las de lectura (`lectura` o `solo_lectura` en
+    db.abrir_cursor) como diferidas y las demás con BEGIN IMMEDIATE, que toma el candado de escritura desde el
+    principio. Así un SELECT ... FOR UPDATE seguido de un UPDATE no choca
+    con otro escritor a la mitad (en WAL los lectores no esperan).
+    """
+
+    def __init__(self, pool, db):
+        self._pool = pool
+        self._db = db
+        self.lectura = False
+
+    def _empezar(self, sql):
+        if self._db.in_transaction:
+            return
+        if self.lectura and sql.lstrip().upper().startswith(_LECTURAS):
+            self._db.execute("BEGIN")
+        else:
+            self._db.execute("BEGIN IMMEDIATE")
+
+    def cursor(self, dictionary=False, buffered=None):
+        return _Cursor(self, dictionary)
+
+    def commit(self):
+        if self._db.in_transaction:
+            self._db.execute("COMMIT")
+
+    def rollback(self):
+        if self._db.in_transaction:
+            self._db.execute("ROLLBACK")
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        pass
+
+    # sqlite3 no deja resultados pendientes en la conexión: cerrar el
+    # cursor basta
+    unread_result = False
+
+    def consume_results(self):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        """Devuelve la conexión al pool (sin transacción abierta)."""
+        try:
+            self.rollback()
+        finally:
+            self.lectura = False
+            self._pool._devolver(self)
+
+
+class PoolSQLite:
+    """
+    Pool de conexiones al archivo, con la interfaz de
+    `pooling.MySQLConnectionPool`: `get_connection()` lanza PoolError si
+    todas están prestadas. Las conexiones se abren al primer uso.
+    """
+
+    def __init__(self, pool_name, pool_size, ruta="sgventas.sqlite3", **config):
+        self.pool_name = pool_name
+        self._ruta = os.path.abspath(ruta)
+        self._tamano = pool_size
+        self._libres = []
+        self._abiertas = 0
+        self._lock = threading.Lock()
+
+        directorio = os.path.dirname(self._ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+
+    def _abrir(self):
+        db = sqlite3.connect(
+            self._ruta,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=SENTENCIAS_EN_CACHE,
+        )
+        db.execute("PRAGMA journal_mode = WAL")
+        db.execute("PRAGMA synchronous = NORMAL")
+        db.execute(f"PRAGMA busy_timeout = {ESPERA_BLOQUEO_MS}")
+        db.execute("PRAGMA temp_store = MEMORY")
+        db.execute("PRAGMA cache_size = -16000")
+        return _Conexion(self, db)
+
+    def get_connection(self):
+        with self._lock:
+            if self._libres:
+                return self._libres.pop()
+            if self._abiertas >= self._tamano:
+                raise errors.PoolError(msg="No hay conexiones libres en el pool")
+            self._abiertas += 1
+        try:
+            return self._abrir()
+        except sqlite3.Error as e:
+            with self._lock:
+                self._abiertas -= 1
+            raise _error(e) from e
+
+    def _devolver(self, conexion):
+        with self._lock:
+            self._libres.append(conexion)
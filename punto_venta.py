@@ -1,24 +1,107 @@
-def render_punto_venta(ventas):
-    import streamlit as st
-    import pandas as pd
+def render_punto_venta():
+    import uuid
     from datetime import datetime
+
+    import streamlit as st
     import streamlit.components.v1 as components
 
     from db import (
-        obtener_producto_por_codigo,
-        actualizar_stock
+        obtener_productos_por_codigos,
+        buscar_por_nombre,
+        registrar_venta
     )
 
-    from db import obtener_productos
+    from db import hay_productos
+    from cola_ventas import modo_diferido, obtener_cola
+    from carrito import Carrito, contar_codigos
+    from caja import turno_de_sesion, render_resumen_turno, render_gastos, render_corte_caja
+    from tickets import tickets_activos, obtener_tickets, venta_para_ticket, render_ultimo_ticket
+    from metricas import seccion
 
-    productos = obtener_productos()
 
+    if not isinstance(st.session_state.get("carrito"), Carrito):
+        st.session_state.carrito = Carrito()
 
-    if "carrito" not in st.session_state:
-        st.session_state.carrito = []
+    carrito = st.session_state.carrito
+
+    def agregar_al_carrito(producto, cantidad):
+        """Agrega si alcanza el stock; si no, retorna el mensaje de error."""
+        # Cuenta lo que ya está en el carrito de ese código
+        en_carrito = carrito.cantidad_de(producto["codigo"])
+        if producto["stock"] < en_carrito + cantidad:
+            return (
+                f"Stock insuficiente de {producto['nombre']}. "
+                f"Disponible: {producto['stock'] - en_carrito}"
+            )
+        carrito.agregar(
+            producto["codigo"],
+            producto["nombre"],
+            producto["precio"],
+            cantidad
+        )
+        return None
+
+    def agregar_codigos(texto, cantidad):
+        """
+        Agrega uno o varios códigos (ráfaga). Se resuelven todos juntos y el
+        stock se revisa por producto con el total pedido. Retorna avisos.
+        """
+        conteo = contar_codigos(texto)
+        productos = obtener_productos_por_codigos(list(conteo))
+
+        avisos = []
+        desconocidos = [codigo for codigo in conteo if codigo not in productos]
+        if desconocidos:
+            avisos.append(f"Código no encontrado: {', '.join(desconocidos)}")
+
+        # Un mismo producto puede llegar escrito de varias formas
+        pedidos = {}
+        for codigo, veces in conteo.items():
+            producto = productos.get(codigo)
+            if producto is not None:
+                anterior = pedidos.get(producto["codigo"], (producto, 0))[1]
+                pedidos[producto["codigo"]] = (producto, anterior + veces * cantidad)
+
+        for producto, pedido in pedidos.values():
+            error = agregar_al_carrito(producto, pedido)
+            if error:
+                avisos.append(error)
+        return avisos
+
+    # Avisos del escaneo anterior (el formulario hace rerun al procesar)
+    for aviso in st.session_state.pop("pos_avisos", []):
+        st.error(aviso)
 
     sub_opcion = st.sidebar.radio("Opciones", ["Ventas", "Gastos", "Corte de caja"])
 
+    # -------- Ventas diferidas pendientes de enviar --------
+    if modo_diferido():
+        cola = obtener_cola()
+        pendientes = cola.pendientes()
+        if pendientes:
+            st.sidebar.warning(f"Ventas pendientes de enviar: {pendientes}")
+            if cola.ultimo_error:
+                st.sidebar.caption(f"Último error: {cola.ultimo_error}")
+        else:
+            st.sidebar.caption("Ventas sincronizadas ✔")
+
+        # Ventas que agotaron sus intentos: ya no frenan la cola, pero no se pierden
+        descartadas = cola.descartadas()
+        if descartadas:
+            st.sidebar.error(f"Ventas sin registrar: {len(descartadas)}")
+            with st.sidebar.expander("Ver ventas sin registrar"):
+                for venta in descartadas:
+                    total = f"${venta['total']:,.2f}" if venta["total"] is not None else "—"
+                    st.write(f"{venta['fecha']:%Y-%m-%d %H:%M} · {total}")
+                    st.caption(venta["error"])
+                if st.button("Reintentar", key="pos_reintentar_descartadas"):
+                    cola.reintentar_descartadas()
+                    st.rerun()
+
+    # -------- Turno de caja (totales corrientes) --------
+    turno = turno_de_sesion()
+    turno_id = turno["id"] if turno is not None else None
+
     if sub_opcion == "Ventas":
 
         col1, col2 = st.columns(2)
@@ -26,14 +109,25 @@ def render_punto_venta(ventas):
         # ---------------- COLUMNA 1 ----------------
         with col1:
 
-            if not productos:
+            if not hay_productos():
                 st.warning("No hay productos disponibles. Agrega productos primero.")
             else:
                 st.subheader("Escaneo de productos")
 
+                # Ráfaga: pegar o descargar del lector varios códigos a la vez
+                rafaga = st.toggle("Varios códigos (ráfaga)", key="pos_rafaga")
+
                 # -------- FORMULARIO PRINCIPAL --------
                 with st.form("form_codigo_barra", clear_on_submit=True):
-                    codigo_input = st.text_input("Código de barras 🟢", key="codigo_barra")
+                    if rafaga:
+                        codigo_input = st.text_area(
+                            "Código de barras 🟢",
+                            key="codigo_barra_rafaga",
+                            help="Un código por línea o separados por espacios; "
+                                 "los repetidos se suman. Ctrl+Enter para agregar."
+                        )
+                    else:
+                        codigo_input = st.text_input("Código de barras 🟢", key="codigo_barra")
                     #submitted = st.write(f"**{codigo_input}**")
 
                     co1, co2 = st.columns(2)
@@ -57,7 +151,7 @@ def render_punto_venta(ventas):
                         """
                         <script>
                         setTimeout(function() {
-                            const inputs = window.parent.document.querySelectorAll('input');
+                            const inputs = window.parent.document.querySelectorAll('input, textarea');
                             for (let input of inputs) {
                                 if (input.placeholder === "Código de barras 🟢" || input.ariaLabel === "Código de barras 🟢") {
                                     input.focus();
@@ -72,81 +166,82 @@ def render_punto_venta(ventas):
 
                 # -------- PROCESAMIENTO --------
                 if submitted:
+                    avisos = []
+                    with seccion("pos.escaneo"):
+                        # PRODUCTOS (uno o varios códigos; la cantidad aplica a cada uno)
+                        if codigo_input.strip():
+                            avisos += agregar_codigos(codigo_input, cantidad_input)
+
+                        # INGRESO MANUAL
+                        if monto_manual:
+                            try:
+                                monto_valor = float(monto_manual)
+                                if monto_valor > 0:
+                                    carrito.agregar_ingreso(monto_manual)
+                                else:
+                                    avisos.append("El monto manual debe ser mayor que cero.")
+                            except ValueError:
+                                avisos.append("Monto manual inválido, ingresa un número válido.")
+
+                    st.session_state.pos_avisos = avisos
+                    st.rerun()
 
-                    # PRODUCTO NORMAL
-                    if codigo_input:
-                        producto = obtener_producto_por_codigo(codigo_input)
+                # -------- BÚSQUEDA POR NOMBRE (sin código de barras) --------
+                with st.expander("Buscar producto por nombre"):
+                    texto_busqueda = st.text_input("Nombre del producto", key="pos_busqueda")
 
-                        if not producto:
-                            st.error(f"Código no encontrado: {codigo_input}")
+                    if texto_busqueda.strip():
+                        resultados = buscar_por_nombre(texto_busqueda, 10)
+
+                        if not resultados:
+                            st.info("Ningún producto coincide con la búsqueda.")
                         else:
-                            if producto["stock"] < cantidad_input:
-                                st.error(
-                                    f"Stock insuficiente. Disponible: {producto['stock']}"
+                            elegido = st.selectbox(
+                                "Resultados",
+                                range(len(resultados)),
+                                format_func=lambda i: (
+                                    f"{resultados[i]['nombre']} – "
+                                    f"${resultados[i]['precio']:,.2f} "
+                                    f"(stock {resultados[i]['stock']})"
                                 )
-                            else:
-                                st.session_state.carrito.append({
-                                    "codigo": producto["codigo"],
-                                    "nombre": producto["nombre"],
-                                    "precio": producto["precio"],
-                                    "cantidad": cantidad_input
-                                })
-
-                    # INGRESO MANUAL
-                    if monto_manual:
-                        try:
-                            monto_valor = float(monto_manual)
-                            if monto_valor > 0:
-                                st.session_state.carrito.append({
-                                    "codigo": "INGRESO",
-                                    "nombre": "VARIOS",
-                                    "precio": monto_valor,
-                                    "cantidad": 1
-                                })
-                            else:
-                                st.error("El monto manual debe ser mayor que cero.")
-                        except ValueError:
-                            st.error("Monto manual inválido, ingresa un número válido.")
-
-                    st.rerun()
+                            )
+                            cantidad_busqueda = st.number_input(
+                                "Cantidad", min_value=1, value=1, step=1, key="pos_busqueda_cantidad"
+                            )
+
+                            if st.button("Agregar al carrito"):
+                                error = agregar_al_carrito(resultados[elegido], cantidad_busqueda)
+                                if error:
+                                    st.error(error)
+                                else:
+                                    st.rerun()
 
         # ---------------- COLUMNA 2 ----------------
         with col2:
             st.subheader("Productos escaneados")
 
-            if st.session_state.carrito:
-                df_carrito = pd.DataFrame(st.session_state.carrito)
-                df_carrito["subtotal"] = df_carrito["precio"] * df_carrito["cantidad"]
-
-                df_vista = df_carrito.copy()
-                df_vista["precio"] = df_vista["precio"].map("${:,.2f}".format)
-                df_vista["cantidad"] = df_vista["cantidad"].map("{:,.2f}".format)
-                df_vista["subtotal"] = df_vista["subtotal"].map("${:,.2f}".format)
-                df_vista.index = range(1, len(df_vista) + 1)
-
-                st.dataframe(df_vista, use_container_width=True)
-
-                # ELIMINAR DEL CARRITO
-                opciones = []
-                for i, item in enumerate(st.session_state.carrito):
-                    subtotal = item["precio"] * item["cantidad"]
-                    etiqueta = f"{item['nombre']} – ${subtotal:,.2f}"
-                    opciones.append((etiqueta, i))
-
-                if opciones:
-                    etiquetas_visibles = [et[0] for et in opciones]
-                    seleccion = st.selectbox("Eliminar producto", etiquetas_visibles)
-                    idx_a_eliminar = dict(opciones)[seleccion]
-
-                    if st.button("Eliminar del carrito"):
-                        eliminado = st.session_state.carrito[idx_a_eliminar]["nombre"]
-                        del st.session_state.carrito[idx_a_eliminar]
-                        st.success(f"Producto '{eliminado}' eliminado.")
-                        st.rerun()
-
-                # TOTAL
-                total = df_carrito["subtotal"].apply(float).sum()
-                #total = df_carrito["subtotal"].sum()
+            if carrito:
+                with seccion("pos.carrito"):
+                    # La tabla se arma solo cuando el carrito cambió
+                    st.dataframe(carrito.vista(), use_container_width=True)
+
+                    # ELIMINAR DEL CARRITO
+                    opciones = carrito.opciones()
+                    etiquetas = dict((clave, etiqueta) for etiqueta, clave in opciones)
+
+                seleccion = st.selectbox(
+                    "Eliminar producto",
+                    [clave for _, clave in opciones],
+                    format_func=etiquetas.get
+                )
+
+                if st.button("Eliminar del carrito"):
+                    eliminado = carrito.eliminar(seleccion)
+                    st.success(f"Producto '{eliminado}' eliminado.")
+                    st.rerun()
+
+                # TOTAL (se mantiene al agregar/quitar)
+                total = carrito.total
                 st.sidebar.markdown("---")
                 st.sidebar.title("Total de la venta")
                 st.markdown(f"**Subtotal:** ${total:,.2f}")
@@ -157,26 +252,25 @@ def render_punto_venta(ventas):
 
                 # REGISTRAR VENTA
                 if st.button("**Registrar venta**"):
-
-                    # DESCONTAR STOCK EN BD
-                    for item in st.session_state.carrito:
-                        if item["codigo"] == "INGRESO":
-                            continue
-
-                        producto_db = obtener_producto_por_codigo(item["codigo"])
-                        if producto_db:
-                            nuevo_stock = producto_db["stock"] - item["cantidad"]
-                            if nuevo_stock < 0:
-                                nuevo_stock = 0
-                            actualizar_stock(item["codigo"], nuevo_stock)
-
-                    ventas.append({
-                        "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        "items": st.session_state.carrito,
-                        "total": total
-                    })
-
-                    st.session_state.carrito = []
+                    fecha = datetime.now().replace(microsecond=0)
+
+                    if modo_diferido():
+                        # Se guarda en el diario local; el hilo de la cola
+                        # la envía a la BD sin hacer esperar al cajero
+                        clave = obtener_cola().encolar(carrito, fecha=fecha, turno=turno_id)
+                    else:
+                        # GUARDAR VENTA Y DESCONTAR STOCK EN BD (una sola transacción).
+                        # La clave (como en diferido) da nombre y folio al ticket
+                        clave = uuid.uuid4().hex
+                        registrar_venta(carrito, fecha=fecha, clave=clave, turno=turno_id)
+
+                    # El ticket se arma en segundo plano (ver tickets.py)
+                    if tickets_activos():
+                        venta = venta_para_ticket(clave, fecha, carrito)
+                        obtener_tickets().encolar(venta)
+                        st.session_state.ultimo_ticket = venta
+
+                    carrito.vaciar()
                     st.success("Venta registrada correctamente.")
                     st.rerun()
 
@@ -201,6 +295,13 @@ def render_punto_venta(ventas):
                 height=0
             )
 
+        render_ultimo_ticket()
 
+    elif sub_opcion == "Gastos":
+        render_gastos(turno)
 
+    elif sub_opcion == "Corte de caja":
+        render_corte_caja(turno)
 
+    # Si el turno se cerró en esta pantalla ya no se muestra
+    render_resumen_turno(turno if "turno_id" in st.session_state else None)
@@ -0,0 +1,137 @@
+import threading
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pandas as pd
+import streamlit as st
+
+from archivo import ventas_entre
+from db import abrir_cursor
+from tickets import render_reimpresion
+
+# ------------------ RESUMEN DEL DÍA ------------------
+# Los totales se leen de las tablas resumen_* que se acumulan al registrar
+# cada venta, así el reporte no recorre venta_items. El resultado se guarda
+# por fecha y solo se vuelve a leer cuando cambia el número de tickets.
+# Se guardan las `FECHAS_EN_CACHE` fechas consultadas más recientemente.
+
+FECHAS_EN_CACHE = 31
+
+_cache = {}                   # fecha -> resumen, del menos al más reciente
+_cache_lock = threading.Lock()
+
+
+def _tickets_del_dia(cursor, fecha):
+    cursor.execute(
+        "SELECT tickets FROM resumen_dia WHERE fecha = %s",
+        (fecha,)
+    )
+    fila = cursor.fetchone()
+    return fila["tickets"] if fila else 0
+
+
+def _leer_resumen(cursor, fecha):
+    cursor.execute("""
+        SELECT tickets, articulos, total
+        FROM resumen_dia
+        WHERE fecha = %s
+    """, (fecha,))
+    dia = cursor.fetchone() or {"tickets": 0, "articulos": 0, "total": Decimal("0.00")}
+
+    cursor.execute("""
+        SELECT hora, tickets, total
+        FROM resumen_hora
+        WHERE fecha = %s
+        ORDER BY hora
+    """, (fecha,))
+    horas = cursor.fetchall()
+
+    cursor.execute("""
+        SELECT codigo, nombre, unidades, total
+        FROM resumen_producto_dia
+        WHERE fecha = %s
+        ORDER BY unidades DESC, total DESC
+    """, (fecha,))
+    productos = cursor.fetchall()
+
+    tickets = dia["tickets"]
+    return {
+        "fecha": fecha,
+        "tickets": tickets,
+        "articulos": dia["articulos"],
+        "total": dia["total"],
+        "ticket_promedio": (dia["total"] / tickets) if tickets else Decimal("0.00"),
+        "horas": horas,
+        "productos": productos
+    }
+
+
+def resumen_del_dia(fecha=None):
+    """
+    Totales del día: total, tickets, ticket promedio, unidades por producto
+    e histograma por hora. Se consulta la BD completa solo si hubo ventas
+    nuevas desde la última lectura.
+    """
+    fecha = fecha or date.today()
+
+    with abrir_cursor(dictionary=True, lectura=True) as cursor:
+        tickets = _tickets_del_dia(cursor, fecha)
+
+        with _cache_lock:
+            guardado = _cache.pop(fecha, None)
+            if guardado is not None:
+                _cache[fecha] = guardado
+        if guardado is not None and guardado["tickets"] == tickets:
+            return guardado
+
+        resumen = _leer_resumen(cursor, fecha)
+
+    with _cache_lock:
+        _cache.pop(fecha, None)
+        _cache[fecha] = resumen
+        while len(_cache) > FECHAS_EN_CACHE:
+            _cache.pop(next(iter(_cache)))
+    return resumen
+
+
+# ------------------ Render Registros ------------------
+def render_registros():
+    st.header("Registros del día")
+
+    fecha = st.date_input("Fecha", value=date.today())
+    resumen = resumen_del_dia(fecha)
+
+    if not resumen["tickets"]:
+        st.info("No hay ventas registradas en esta fecha.")
+        return
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Total vendido", f"${resumen['total']:,.2f}")
+    c2.metric("Tickets", f"{resumen['tickets']:,}")
+    c3.metric("Ticket promedio", f"${resumen['ticket_promedio']:,.2f}")
+    c4.metric("Artículos", f"{resumen['articulos']:,}")
+
+    col1, col2 = st.columns(2)
+
+    # -------- Ventas por hora --------
+    with col1:
+        st.subheader("Ventas por hora")
+        df_horas = pd.DataFrame(resumen["horas"])
+        df_horas = (
+            df_horas.set_index("hora")
+            .reindex(range(24), fill_value=0)[["total"]]
+            .astype(float)
+        )
+        st.bar_chart(df_horas)
+
+    # -------- Unidades por producto --------
+    with col2:
+        st.subheader("Productos vendidos")
+        df_productos = pd.DataFrame(resumen["productos"])
+        df_productos["total"] = df_productos["total"].map("${:,.2f}".format)
+        df_productos.index = range(1, len(df_productos) + 1)
+        st.dataframe(df_productos, use_container_width=True)
+
+    # -------- Reimpresión de tickets (desde el spool) --------
+    # Las ventas de días ya archivados se leen del archivo histórico
+    render_reimpresion(ventas_entre(fecha, fecha + timedelta(days=1)))
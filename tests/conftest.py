@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import esquema  # noqa: E402
+import reportes  # noqa: E402
+
+
+# ------------------ BD de prueba ------------------
+# Cada prueba recibe su propio archivo SQLite con el esquema completo; el
+# estado global de los módulos (pool, réplicas, cachés) se restaura al
+# terminar para que una prueba no contamine a la siguiente.
+
+@pytest.fixture
+def bd(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "_pool", None)
+    monkeypatch.setattr(db, "_motor", "mysql")
+    monkeypatch.setattr(db, "_replicas", [])
+    monkeypatch.setattr(db, "_escrituras", {})
+    monkeypatch.setattr(esquema, "_listo", False)
+    monkeypatch.setattr(reportes, "_cache", {})
+
+    db.inicializar_pool({"motor": "sqlite", "ruta": str(tmp_path / "sgventas.sqlite3"), "pool_size": 4})
+    esquema.asegurar_esquema()
+    db.invalidar_catalogo()
+    yield db
+    db.invalidar_catalogo()
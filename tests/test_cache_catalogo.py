@@ -0,0 +1,127 @@
+import threading
+import time
+from decimal import Decimal
+
+from cache_catalogo import CacheCatalogo
+
+
+class _BDCaida(Exception):
+    pass
+
+
+class _Origen:
+    """Catálogo de prueba; `caida` hace fallar las consultas y `soltar` las detiene."""
+
+    def __init__(self):
+        self.filas = {"A1": ("A1", "Arroz", Decimal("10.00"), 5)}
+        self.version = 0
+        self.cambiados = []
+        self.caida = False
+        self.soltar = None
+        self.consultas = 0
+
+    def cargar(self):
+        return list(self.filas.values())
+
+    def cargar_codigos(self, codigos):
+        self._consultar()
+        return [self.filas[c] for c in codigos if c in self.filas]
+
+    def cambios(self, desde):
+        self._consultar()
+        if desde is None:
+            return self.version, []
+        return self.version, list(self.cambiados)
+
+    def _consultar(self):
+        self.consultas += 1
+        if self.soltar is not None:
+            self.soltar.wait(5)
+        if self.caida:
+            raise _BDCaida("Lost connection to MySQL server")
+
+    def cambiar(self, fila):
+        self.filas[fila[0]] = fila
+        self.version += 1
+        self.cambiados = [fila[0]]
+
+
+def _cache(origen):
+    cache = CacheCatalogo(
+        origen.cargar, origen.cargar_codigos, cambios=origen.cambios,
+        verificar_cada=0.0, ttl_negativo=60.0, tolerar=(_BDCaida,)
+    )
+    assert cache.por_codigo("A1")["nombre"] == "Arroz"
+    return cache
+
+
+def test_sincroniza_cambios_externos():
+    origen = _Origen()
+    cache = _cache(origen)
+
+    origen.cambiar(("A1", "Arroz", Decimal("10.00"), 2))
+    assert cache.por_codigo("A1")["stock"] == 2
+    assert cache.estadisticas()["cambios_externos"] == 1
+
+
+def test_sin_bd_sigue_sirviendo_la_copia():
+    origen = _Origen()
+    cache = _cache(origen)
+    origen.caida = True
+
+    assert cache.por_codigo("A1")["stock"] == 5
+    # Un código desconocido cuenta como no encontrado, sin recordarlo
+    assert cache.por_codigo("ZZ") is None
+    estadisticas = cache.estadisticas()
+    assert estadisticas["errores_bd"] >= 2
+    assert "Lost connection" in estadisticas["ultimo_error"]
+
+    origen.caida = False
+    origen.cambiar(("ZZ", "Nuevo", Decimal("1.00"), 1))
+    assert cache.por_codigo("ZZ")["nombre"] == "Nuevo"
+
+
+def test_consulta_lenta_no_bloquea_otros_escaneos():
+    origen = _Origen()
+    cache = _cache(origen)
+    origen.soltar = threading.Event()
+
+    # Un hilo queda esperando a la BD a mitad de la sincronización
+    lento = threading.Thread(target=cache.por_codigo, args=("A1",))
+    lento.start()
+    limite = time.monotonic() + 5
+    while not cache._sincronizando and time.monotonic() < limite:
+        time.sleep(0.01)
+    assert cache._sincronizando
+
+    inicio = time.monotonic()
+    assert cache.por_codigo("A1")["stock"] == 5
+    assert len(cache.obtener()) == 1
+    assert time.monotonic() - inicio < 1.0
+
+    origen.soltar.set()
+    lento.join(5)
+    assert not lento.is_alive()
+
+
+def test_lectura_vieja_no_pisa_una_escritura():
+    origen = _Origen()
+    cache = _cache(origen)
+    origen.cambiar(("A1", "Arroz", Decimal("10.00"), 4))
+    origen.soltar = threading.Event()
+
+    lento = threading.Thread(target=cache.por_codigo, args=("A1",))
+    lento.start()
+    limite = time.monotonic() + 5
+    while not cache._sincronizando and time.monotonic() < limite:
+        time.sleep(0.01)
+
+    # Mientras tanto una venta de este proceso deja el stock en 1
+    cache.aplicar_stock({"A1": 1})
+    origen.soltar.set()
+    lento.join(5)
+
+    # Lo leído antes de la venta (4) se descarta; sin BD se ve la copia
+    origen.soltar = None
+    origen.caida = True
+    assert cache.por_codigo("A1")["stock"] == 1
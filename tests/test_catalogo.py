@@ -0,0 +1,16 @@
+from decimal import Decimal
+
+import pytest
+
+from catalogo import _precio
+
+
+def test_precio_del_formulario():
+    assert _precio(" 12.5 ") == Decimal("12.50")
+    assert _precio("0") == Decimal("0.00")
+
+
+@pytest.mark.parametrize("texto", ["nan", "NaN", "inf", "-Infinity", "abc", ""])
+def test_precio_no_finito_se_rechaza(texto):
+    with pytest.raises(ValueError):
+        _precio(texto)
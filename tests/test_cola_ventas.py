@@ -0,0 +1,178 @@
+import threading
+import time
+from decimal import Decimal
+
+import pytest
+from mysql.connector import errors
+
+from cola_ventas import ColaVentas
+
+
+def _carrito(codigo="A1", cantidad=1, precio="10.00"):
+    return [{"codigo": codigo, "nombre": f"Producto {codigo}", "precio": Decimal(precio), "cantidad": cantidad}]
+
+
+@pytest.fixture
+def diario(tmp_path):
+    return str(tmp_path / "pendientes.sqlite3")
+
+
+# -------- Reintentos --------
+def test_reintenta_con_espera_creciente(diario):
+    llamadas = []
+    recibidas = []
+
+    def destino(lote):
+        llamadas.append(time.monotonic())
+        if len(llamadas) <= 3:
+            raise errors.OperationalError("Lost connection to MySQL server")
+        recibidas.extend(lote)
+
+    cola = ColaVentas(diario, destino, espera_min=0.05, espera_max=1.0)
+    cola.encolar(_carrito())
+    cola.iniciar()
+    try:
+        limite = time.monotonic() + 5
+        while cola.pendientes() and time.monotonic() < limite:
+            time.sleep(0.02)
+    finally:
+        cola.detener()
+
+    assert cola.pendientes() == 0
+    assert len(recibidas) == 1
+    assert cola.fallos == 3
+    assert cola.descartadas() == []
+
+    esperas = [b - a for a, b in zip(llamadas, llamadas[1:])]
+    assert esperas[0] >= 0.05
+    assert esperas[1] > esperas[0] * 1.5
+    assert esperas[2] > esperas[1] * 1.5
+
+
+def test_error_transitorio_no_gasta_intentos(diario):
+    def destino(lote):
+        raise errors.InterfaceError("Can't connect to MySQL server")
+
+    cola = ColaVentas(diario, destino, intentos_maximos=1)
+    cola.encolar(_carrito())
+    for _ in range(3):
+        with pytest.raises(errors.InterfaceError):
+            cola.enviar_pendientes()
+
+    assert cola.pendientes() == 1
+    assert cola.descartadas() == []
+
+
+def test_destino_lento_no_frena_el_cobro(diario):
+    ocupado = threading.Event()
+    soltar = threading.Event()
+
+    def destino(lote):
+        ocupado.set()
+        soltar.wait(5)
+
+    cola = ColaVentas(diario, destino)
+    cola.encolar(_carrito())
+    cola.iniciar()
+    try:
+        assert ocupado.wait(5)
+        inicio = time.monotonic()
+        for _ in range(5):
+            cola.encolar(_carrito())
+        assert time.monotonic() - inicio < 1.0
+        assert cola.pendientes() == 6
+    finally:
+        soltar.set()
+        cola.detener()
+
+
+# -------- Reenvío idempotente --------
+def test_reenvio_tras_respuesta_perdida_no_duplica(bd, diario):
+    bd.crear_producto("A1", "Producto A1", Decimal("10.00"), 5)
+    llamadas = []
+
+    def destino(lote):
+        # La BD confirma pero la respuesta no llega al cliente
+        bd.registrar_ventas(lote)
+        llamadas.append(len(lote))
+        if len(llamadas) == 1:
+            raise errors.OperationalError("Lost connection to MySQL server during query")
+
+    cola = ColaVentas(diario, destino)
+    clave = cola.encolar(_carrito(cantidad=2))
+
+    with pytest.raises(errors.OperationalError):
+        cola.enviar_pendientes()
+    assert cola.pendientes() == 1
+
+    assert cola.enviar_pendientes() == 1
+    assert cola.pendientes() == 0
+
+    with bd.abrir_cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM ventas WHERE clave = %s", (clave,))
+        assert cursor.fetchone()[0] == 1
+    assert bd.obtener_producto("A1")["stock"] == 3
+
+
+# -------- Descartadas --------
+def test_venta_que_siempre_falla_no_frena_la_cola(diario):
+    recibidas = []
+    mala = {}
+
+    def destino(lote):
+        if any(v["clave"] == mala["clave"] for v in lote):
+            raise errors.DataError("Incorrect decimal value")
+        recibidas.extend(v["clave"] for v in lote)
+
+    cola = ColaVentas(diario, destino, intentos_maximos=2)
+    buena1 = cola.encolar(_carrito())
+    mala["clave"] = cola.encolar(_carrito(precio="20.00"))
+    buena2 = cola.encolar(_carrito())
+
+    # El lote falla; venta por venta pasan las buenas
+    assert cola.enviar_pendientes() == 2
+    assert recibidas == [buena1, buena2]
+    assert cola.pendientes() == 1
+    assert cola.descartadas() == []
+
+    # Segundo intento de la mala: agota sus intentos y sale de la cola
+    with pytest.raises(errors.DataError):
+        cola.enviar_pendientes()
+    assert cola.pendientes() == 0
+
+    descartadas = cola.descartadas()
+    assert len(descartadas) == 1
+    assert descartadas[0]["clave"] == mala["clave"]
+    assert descartadas[0]["total"] == Decimal("20.00")
+    assert descartadas[0]["intentos"] == 2
+    assert "Incorrect decimal value" in descartadas[0]["error"]
+
+    # Las que llegan después ya no esperan a la descartada
+    buena3 = cola.encolar(_carrito())
+    assert cola.enviar_pendientes() == 1
+    assert recibidas[-1] == buena3
+
+    assert cola.reintentar_descartadas() == 1
+    assert cola.pendientes() == 1
+    assert cola.descartadas() == []
+
+
+@pytest.mark.parametrize("error", [
+    errors.InternalError(msg="Deadlock found when trying to get lock", errno=1213),
+    errors.DatabaseError(msg="Lock wait timeout exceeded", errno=1205),
+    errors.DatabaseError(msg="MySQL server has gone away", errno=2006),
+    errors.DatabaseError(msg="Lost connection to MySQL server during query", errno=2013),
+])
+def test_bloqueos_de_la_bd_no_descartan_la_venta(diario, error):
+    def destino(lote):
+        raise error
+
+    cola = ColaVentas(diario, destino, intentos_maximos=1)
+    cola.encolar(_carrito())
+    cola.encolar(_carrito())
+    for _ in range(3):
+        with pytest.raises(type(error)):
+            cola.enviar_pendientes()
+
+    assert cola.pendientes() == 2
+    assert cola.descartadas() == []
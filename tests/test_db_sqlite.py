@@ -0,0 +1,207 @@
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from mysql.connector import errors
+
+import caja
+import esquema
+from motor_sqlite import traducir
+
+
+def _linea(codigo, cantidad=1, precio="10.00", nombre=None):
+    return {"codigo": codigo, "nombre": nombre or f"Producto {codigo}", "precio": Decimal(precio), "cantidad": cantidad}
+
+
+# -------- Dialecto --------
+def test_traducir():
+    assert traducir("SELECT * FROM productos WHERE codigo = %s") == "SELECT * FROM productos WHERE codigo = ?"
+    assert traducir("SELECT stock FROM productos WHERE codigo = %s FOR UPDATE") == (
+        "SELECT stock FROM productos WHERE codigo = ?"
+    )
+    assert " ".join(traducir(
+        "INSERT INTO t (a, b) VALUES (%s, %s) ON DUPLICATE KEY UPDATE b = b + VALUES(b)"
+    ).split()) == "INSERT INTO t (a, b) VALUES (?, ?) ON CONFLICT DO UPDATE SET b = b + excluded.b"
+    assert traducir("WHERE nombre LIKE %s") == "WHERE nombre LIKE ? ESCAPE '\\'"
+
+
+# -------- Esquema --------
+def test_esquema_sin_advertencias(bd):
+    assert bd.motor() == "sqlite"
+    assert esquema.advertencias_esquema() == []
+
+
+# -------- Productos --------
+def test_crud_producto(bd):
+    bd.crear_producto("A1", "Arroz", Decimal("25.50"), 10)
+
+    producto = bd.obtener_producto("A1")
+    assert producto["nombre"] == "Arroz"
+    assert producto["precio"] == Decimal("25.50")
+    assert producto["stock"] == 10
+
+    bd.actualizar_producto("A1", "Arroz integral", Decimal("27.00"))
+    bd.actualizar_stock("A1", 7, referencia="prueba")
+    bd.sumar_stock("A1", 5)
+    producto = bd.obtener_producto_por_codigo("A1")
+    assert producto["nombre"] == "Arroz integral"
+    assert producto["precio"] == Decimal("27.00")
+    assert producto["stock"] == 12
+
+    with bd.abrir_cursor() as cursor:
+        cursor.execute("SELECT tipo, cantidad FROM movimientos_stock WHERE codigo = %s ORDER BY id", ("A1",))
+        assert cursor.fetchall() == [("entrada", 10), ("ajuste", -3), ("entrada", 5)]
+
+    bd.eliminar_producto("A1")
+    assert bd.obtener_producto("A1") is None
+    assert bd.obtener_producto_por_codigo("A1") is None
+
+
+def test_codigo_duplicado(bd):
+    bd.crear_producto("A1", "Arroz", Decimal("25.50"))
+    with pytest.raises(errors.IntegrityError):
+        bd.crear_producto("a1", "Otro", Decimal("1.00"))
+
+
+def test_codigos_sin_distinguir_mayusculas(bd):
+    bd.crear_producto("ABC-1", "Frijol", Decimal("30.00"), 5)
+    assert bd.obtener_producto("abc-1")["codigo"] == "ABC-1"
+    assert bd.obtener_producto_por_codigo(" abc-1\n")["codigo"] == "ABC-1"
+    assert set(bd.obtener_productos_por_codigos(["abc-1", "X"])) == {"abc-1"}
+
+
+def test_busqueda_y_paginacion(bd):
+    for i, nombre in enumerate(["Azúcar", "Aceite", "Agua", "100% jugo", "A_b", "Leche"]):
+        bd.crear_producto(f"P{i}", nombre, Decimal("1.00"))
+
+    pagina, hay_mas = bd.buscar_productos("A", limite=2)
+    assert [p["nombre"] for p in pagina] == ["A_b", "Aceite"]
+    assert hay_mas
+    ultimo = pagina[-1]
+    pagina, hay_mas = bd.buscar_productos("A", despues_de=(ultimo["nombre"], ultimo["codigo"]), limite=2)
+    assert [p["nombre"] for p in pagina] == ["Agua", "Azúcar"]
+    assert not hay_mas
+
+    # Comodines de LIKE se buscan literalmente
+    assert [p["nombre"] for p in bd.buscar_productos("A_")[0]] == ["A_b"]
+    assert [p["nombre"] for p in bd.buscar_productos("100%")[0]] == ["100% jugo"]
+    assert bd.contar_productos("a") == 4
+
+
+def test_conciliar_stock(bd):
+    bd.crear_producto("A1", "Arroz", Decimal("1.00"), 10)
+    bd.crear_producto("B1", "Frijol", Decimal("1.00"), 4)
+
+    diferencias, desconocidos = bd.conciliar_stock({"a1": 8, "B1": 4, "ZZ": 1})
+    assert [(d["codigo"], d["sistema"], d["contado"]) for d in diferencias] == [("A1", 10, 8)]
+    assert desconocidos == ["ZZ"]
+    assert bd.obtener_producto("A1")["stock"] == 8
+    assert bd.obtener_producto_por_codigo("A1")["stock"] == 8
+
+
+# -------- Ventas --------
+def test_registrar_venta(bd):
+    bd.crear_producto("A1", "Arroz", Decimal("10.00"), 5)
+    bd.crear_producto("B1", "Frijol", Decimal("2.50"), 1)
+    fecha = datetime(2024, 3, 1, 12, 30)
+
+    venta = bd.registrar_venta(
+        [_linea("A1", 2), _linea("a1", 1), _linea("B1", 3, "2.50"), _linea("NO", 1, "1.00")],
+        fecha=fecha
+    )
+    assert venta["total"] == Decimal("38.50")
+    resultados = {r["codigo"]: r for r in venta["resultados"]}
+    assert resultados["A1"]["cantidad"] == 3
+    assert resultados["A1"]["stock_nuevo"] == 2
+    assert resultados["B1"]["stock_nuevo"] == 0
+    assert not resultados["NO"]["encontrado"]
+    assert bd.obtener_producto("A1")["stock"] == 2
+    assert bd.obtener_producto_por_codigo("B1")["stock"] == 0
+
+    guardada = bd.obtener_venta(venta["id"])
+    assert guardada["fecha"] == fecha
+    assert guardada["total"] == Decimal("38.50")
+    assert len(guardada["items"]) == 4
+    assert [v["id"] for v in bd.obtener_ventas(fecha, fecha + timedelta(days=1))] == [venta["id"]]
+
+
+def test_clave_repetida_no_duplica(bd):
+    bd.crear_producto("A1", "Arroz", Decimal("10.00"), 5)
+    assert bd.registrar_venta([_linea("A1")], clave="k1") is not None
+    assert bd.registrar_venta([_linea("A1")], clave="k1") is None
+    assert bd.registrar_ventas([
+        {"clave": "k1", "fecha": None, "carrito": [_linea("A1")]},
+        {"clave": "k2", "fecha": None, "carrito": [_linea("A1")]},
+    ])[0]["clave"] == "k2"
+
+    with bd.abrir_cursor() as cursor:
+        cursor.execute("SELECT clave FROM ventas ORDER BY id")
+        assert cursor.fetchall() == [("k1",), ("k2",)]
+    assert bd.obtener_producto("A1")["stock"] == 3
+
+
+def test_resumenes_acumulan(bd):
+    bd.crear_producto("A1", "Arroz", Decimal("10.00"), 50)
+    dia = datetime(2024, 3, 1, 9, 0)
+    bd.registrar_ventas([
+        {"clave": "k1", "fecha": dia, "carrito": [_linea("A1", 2)]},
+        {"clave": "k2", "fecha": dia + timedelta(hours=1), "carrito": [_linea("A1", 1)]},
+    ])
+    bd.registrar_venta([_linea("A1", 4)], fecha=dia + timedelta(hours=1))
+
+    with bd.abrir_cursor() as cursor:
+        cursor.execute("SELECT tickets, articulos, total FROM resumen_dia WHERE fecha = %s", (dia.date(),))
+        assert cursor.fetchone() == (3, 7, Decimal("70.00"))
+        cursor.execute("SELECT hora, tickets, total FROM resumen_hora ORDER BY hora")
+        assert cursor.fetchall() == [(9, 1, Decimal("20.00")), (10, 2, Decimal("50.00"))]
+        cursor.execute("SELECT codigo, unidades, total FROM resumen_producto_dia")
+        assert cursor.fetchall() == [("A1", 7, Decimal("70.00"))]
+
+
+def test_error_revierte_la_transaccion(bd):
+    bd.crear_producto("A1", "Arroz", Decimal("10.00"), 5)
+    with pytest.raises(errors.ProgrammingError):
+        with bd.abrir_cursor() as cursor:
+            cursor.execute("UPDATE productos SET stock = 0 WHERE codigo = %s", ("A1",))
+            cursor.execute("SELECT * FROM no_existe")
+    assert bd.obtener_producto("A1")["stock"] == 5
+
+
+# -------- Caja --------
+def test_turno_de_caja(bd):
+    bd.crear_producto("A1", "Arroz", Decimal("10.00"), 5)
+    turno = caja.abrir_turno("Caja 1", "Ana", "500")
+    bd.registrar_venta([_linea("A1", 2)], turno=turno)
+    caja.registrar_gasto(turno, "Hielo", "30")
+
+    cerrado = caja.cerrar_turno(turno, "490")
+    assert cerrado["ventas"] == Decimal("20.00")
+    assert cerrado["tickets"] == 1
+    assert caja.saldo_esperado(cerrado) == Decimal("490.00")
+
+    # Venta diferida que llega tarde: no toca el turno cuadrado
+    bd.registrar_venta([_linea("A1", 1)], turno=turno)
+    assert caja.obtener_turno(turno)["ventas"] == Decimal("20.00")
+    assert caja.turnos_cerrados()[0]["tardias"] == Decimal("10.00")
+    with pytest.raises(ValueError):
+        caja.registrar_gasto(turno, "Otro", "5")
+
+
+def test_lecturas_no_esperan_a_un_escritor(bd):
+    bd.crear_producto("A1", "Arroz", Decimal("10.00"), 5)
+    turno = caja.abrir_turno("Caja 1", "Ana", "0")
+
+    # Otra caja tiene abierta una transacción de escritura
+    with bd.abrir_cursor() as escritor:
+        escritor.execute("UPDATE productos SET stock = 1 WHERE codigo = %s", ("A1",))
+
+        inicio = time.monotonic()
+        assert bd.obtener_producto("A1")["stock"] == 5
+        bd.invalidar_catalogo()
+        assert bd.obtener_producto_por_codigo("A1")["stock"] == 5
+        assert bd.obtener_producto_por_codigo("NO-EXISTE") is None
+        assert caja.obtener_turno(turno)["id"] == turno
+        assert time.monotonic() - inicio < 1.0
+
+    assert bd.obtener_producto("A1")["stock"] == 1
@@ -0,0 +1,73 @@
+from mysql.connector import errors
+
+import esquema
+
+
+class _CursorVersiones:
+    """Cursor mínimo: solo entiende `esquema_version`."""
+
+    def __init__(self, aplicadas=()):
+        self.aplicadas = set(aplicadas)
+        self._filas = []
+
+    def execute(self, sql, params=()):
+        if sql.startswith("SELECT version FROM esquema_version"):
+            self._filas = [(v,) for v in sorted(self.aplicadas)]
+        elif sql.startswith("INSERT INTO esquema_version"):
+            self.aplicadas.add(params[0])
+
+    def fetchall(self):
+        return self._filas
+
+
+def _falla(error):
+    def migracion(cursor):
+        raise error
+    return migracion
+
+
+def _migrar(monkeypatch, migraciones, aplicadas=()):
+    monkeypatch.setattr(esquema, "MIGRACIONES", migraciones)
+    monkeypatch.setattr(esquema, "_advertencias", [])
+    monkeypatch.setattr(esquema, "_pendientes", [])
+    cursor = _CursorVersiones(aplicadas)
+    esquema._migrar(cursor)
+    return cursor.aplicadas
+
+
+def test_una_migracion_fallida_no_detiene_las_independientes(monkeypatch):
+    aplicadas = _migrar(monkeypatch, [
+        (1, "base", lambda c: None, ()),
+        (2, "llave", _falla(ValueError("códigos repetidos")), (1,)),
+        (3, "triggers", _falla(errors.DatabaseError(msg="log_bin_trust_function_creators")), (1,)),
+        (4, "turnos", lambda c: None, (1,)),
+        (5, "inventario", lambda c: None, (1,)),
+    ])
+
+    assert aplicadas == {1, 4, 5}
+    assert len(esquema.advertencias_esquema()) == 2
+    assert esquema.migraciones_pendientes() == []
+
+
+def test_se_reintenta_la_que_fallo(monkeypatch):
+    aplicadas = _migrar(monkeypatch, [
+        (1, "base", lambda c: None, ()),
+        (2, "llave", lambda c: None, (1,)),
+        (4, "turnos", lambda c: None, (1,)),
+    ], aplicadas={1, 4})
+
+    assert aplicadas == {1, 2, 4}
+    assert esquema.advertencias_esquema() == []
+
+
+def test_dependiente_de_una_fallida_se_salta(monkeypatch):
+    llamadas = []
+    aplicadas = _migrar(monkeypatch, [
+        (1, "base", _falla(errors.OperationalError(msg="sin permisos")), ()),
+        (4, "turnos", lambda c: llamadas.append(4), (1,)),
+        (5, "inventario", lambda c: llamadas.append(5), (1,)),
+    ])
+
+    assert aplicadas == set()
+    assert llamadas == []
+    assert esquema.migraciones_pendientes() == [(1, "base"), (4, "turnos"), (5, "inventario")]
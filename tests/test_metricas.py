@@ -0,0 +1,62 @@
+import pytest
+from mysql.connector import errors
+
+import db
+import metricas
+
+
+@pytest.fixture(autouse=True)
+def series_limpias():
+    metricas.reiniciar()
+    yield
+    metricas.reiniciar()
+
+
+def _serie(nombre):
+    return next(s for s in metricas.resumen() if s["serie"] == nombre)
+
+
+def test_medir_cuenta_las_llamadas_fallidas():
+    @metricas.medir("prueba.consulta")
+    def consulta(falla):
+        if falla:
+            raise errors.PoolError(msg="Failed getting connection; pool exhausted")
+        return [1, 2, 3]
+
+    consulta(False)
+    with pytest.raises(errors.PoolError):
+        consulta(True)
+
+    serie = _serie("prueba.consulta")
+    assert serie["llamadas"] == 2
+    assert serie["errores"] == 1
+    assert serie["filas_media"] == 3.0
+
+    texto = metricas.exportar_prometheus()
+    assert 'sgventas_errores_total{serie="prueba_consulta"} 1' in texto
+    assert 'sgventas_duracion_segundos_count{serie="prueba_consulta"} 2' in texto
+
+
+def test_seccion_cuenta_errores():
+    with pytest.raises(ValueError):
+        with metricas.seccion("prueba.seccion"):
+            raise ValueError("falla")
+    with metricas.seccion("prueba.seccion"):
+        pass
+
+    serie = _serie("prueba.seccion")
+    assert (serie["llamadas"], serie["errores"]) == (2, 1)
+
+
+def test_pool_agotado_queda_medido(bd, monkeypatch):
+    class _Agotado:
+        def get_connection(self):
+            raise errors.PoolError(msg="Failed getting connection; pool exhausted")
+
+    monkeypatch.setattr(db, "_pool", _Agotado())
+    monkeypatch.setattr(db, "_pool_espera", 0.0)
+    with pytest.raises(errors.PoolError):
+        db.obtener_producto("A1")
+
+    assert _serie("db.conexion")["errores"] == 1
+    assert _serie("db.obtener_producto")["errores"] == 1
@@ -0,0 +1,194 @@
+import sqlite3
+import threading
+import time
+from decimal import Decimal
+
+import pytest
+from mysql.connector import errors
+
+import db
+
+
+# Las réplicas de prueba son copias del archivo del primario: lo que se lee
+# de una réplica se distingue porque su copia tiene otros nombres.
+
+def _copiar_primario(tmp_path, nombre):
+    ruta = str(tmp_path / f"{nombre}.sqlite3")
+    origen = sqlite3.connect(str(tmp_path / "sgventas.sqlite3"))
+    destino = sqlite3.connect(ruta)
+    try:
+        origen.backup(destino)
+        destino.execute("UPDATE productos SET nombre = nombre || ' @' || ?", (nombre,))
+        destino.commit()
+    finally:
+        origen.close()
+        destino.close()
+    return ruta
+
+
+class _PoolCaido:
+    """Pool de una réplica apagada: cada intento falla al conectar."""
+
+    def __init__(self, error=errors.InterfaceError):
+        self.intentos = 0
+        self._error = error
+
+    def get_connection(self):
+        self.intentos += 1
+        raise self._error(msg="Can't connect to MySQL server")
+
+
+def _replica(nombre, ruta=None, pool=None):
+    replica = db._Replica(nombre, {"ruta": ruta}, 2)
+    replica.pool = pool
+    return replica
+
+
+def _leido():
+    """Nombres que ve una lectura (`lectura=True`) de los productos "Arroz"."""
+    productos, _ = db.buscar_productos("Arroz")
+    return [p["nombre"] for p in productos]
+
+
+@pytest.fixture
+def primario(bd, monkeypatch):
+    bd.crear_producto("A1", "Arroz", Decimal("10.00"), 5)
+    monkeypatch.setattr(db, "_replica_espera", 0.0)
+    return bd
+
+
+# -------- Reparto de lecturas --------
+def test_lecturas_van_a_las_replicas(primario, tmp_path, monkeypatch):
+    replicas = [
+        _replica("r0", _copiar_primario(tmp_path, "r0")),
+        _replica("r1", _copiar_primario(tmp_path, "r1")),
+    ]
+    monkeypatch.setattr(db, "_replicas", replicas)
+
+    leidos = {nombre for _ in range(4) for nombre in _leido()}
+    assert leidos == {"Arroz @r0", "Arroz @r1"}
+    assert all(r.pool is not None for r in replicas)
+
+    # Lo que no es lectura sigue en el primario
+    assert primario.obtener_producto("A1")["nombre"] == "Arroz"
+
+
+def test_sin_replicas_todo_va_al_primario(primario):
+    assert _leido() == ["Arroz"]
+
+
+# -------- Réplica caída --------
+def test_replica_caida_usa_el_primario(primario, tmp_path, monkeypatch):
+    caido = _PoolCaido()
+    replica = _replica("r0", pool=caido)
+    monkeypatch.setattr(db, "_replicas", [replica])
+
+    assert _leido() == ["Arroz"]
+    assert caido.intentos == 1
+    estado = db.estado_replicas()[0]
+    assert not estado["disponible"]
+    assert "Can't connect" in estado["error"]
+
+    # Fuera de rotación: no se vuelve a intentar en cada lectura
+    assert _leido() == ["Arroz"]
+    assert caido.intentos == 1
+
+    # Pasado REPLICA_REINTENTO vuelve a probarse
+    replica.caida_hasta = time.monotonic() - 1
+    replica.pool = None
+    replica.config = {"ruta": _copiar_primario(tmp_path, "r0")}
+    assert _leido() == ["Arroz @r0"]
+    assert db.estado_replicas()[0]["error"] is None
+
+
+def test_replica_ocupada_no_se_marca_caida(primario, monkeypatch):
+    ocupado = _PoolCaido(errors.PoolError)
+    monkeypatch.setattr(db, "_replicas", [_replica("r0", pool=ocupado)])
+
+    assert _leido() == ["Arroz"]
+    assert db.estado_replicas()[0]["disponible"]
+
+
+def test_replica_atrasada_sale_de_rotacion(primario, tmp_path, monkeypatch):
+    replica = _replica("r0", _copiar_primario(tmp_path, "r0"))
+    monkeypatch.setattr(db, "_replicas", [replica])
+    monkeypatch.setattr(db, "_retraso_replica", lambda conn: 60)
+
+    assert _leido() == ["Arroz"]
+    assert not db.estado_replicas()[0]["disponible"]
+    assert replica.retraso == 60
+
+
+# -------- Lectura de lo propio --------
+def test_tras_escribir_la_sesion_lee_del_primario(primario, tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "_replicas", [_replica("r0", _copiar_primario(tmp_path, "r0"))])
+    assert _leido() == ["Arroz @r0"]
+
+    # La réplica (una copia) no verá este cambio
+    primario.actualizar_producto("A1", "Arroz integral", Decimal("12.00"))
+    assert _leido() == ["Arroz integral"]
+
+    # Otra sesión sigue leyendo de la réplica
+    otra = []
+    hilo = threading.Thread(target=lambda: otra.extend(_leido()))
+    hilo.start()
+    hilo.join()
+    assert otra == ["Arroz @r0"]
+
+    # Pasado replica_retraso_max la sesión vuelve a la réplica
+    for sesion in list(db._escrituras):
+        db._escrituras[sesion] = time.monotonic() - 1
+    assert _leido() == ["Arroz @r0"]
+
+
+def test_marcar_escritura_sin_replicas_no_anota(primario):
+    db.marcar_escritura()
+    assert db._escrituras == {}
+
+
+# -------- Atraso desconocido --------
+class _ConexionEstado:
+    """Conexión que responde SHOW REPLICA STATUS con `fila` (o lanza `error`)."""
+
+    def __init__(self, fila=None, error=None):
+        self._fila = fila
+        self._error = error
+
+    def cursor(self, dictionary=False):
+        return self
+
+    def execute(self, sql):
+        if self._error is not None:
+            raise self._error
+
+    def fetchone(self):
+        return self._fila
+
+    def close(self):
+        pass
+
+
+def test_retraso_replica():
+    assert db._retraso_replica(_ConexionEstado({"Seconds_Behind_Source": 2})) == 2
+    # Sin fila de estado: no replica, no hay qué medir
+    assert db._retraso_replica(_ConexionEstado(None)) is None
+    assert db._retraso_replica(_ConexionEstado(error=errors.ProgrammingError(msg="syntax", errno=1064))) is None
+
+    with pytest.raises(ValueError, match="detenida"):
+        db._retraso_replica(_ConexionEstado({"Seconds_Behind_Source": None}))
+    with pytest.raises(ValueError, match="REPLICATION CLIENT"):
+        db._retraso_replica(_ConexionEstado(error=errors.ProgrammingError(msg="Access denied", errno=1227)))
+
+
+def test_replica_detenida_sale_de_rotacion(primario, tmp_path, monkeypatch):
+    replica = _replica("r0", _copiar_primario(tmp_path, "r0"))
+    monkeypatch.setattr(db, "_replicas", [replica])
+
+    def detenida(conn):
+        raise ValueError("replicación detenida (atraso desconocido)")
+    monkeypatch.setattr(db, "_retraso_replica", detenida)
+
+    assert _leido() == ["Arroz"]
+    estado = db.estado_replicas()[0]
+    assert not estado["disponible"]
+    assert "detenida" in estado["error"]
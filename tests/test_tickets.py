@@ -0,0 +1,34 @@
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from tickets import _Plantillas, armar_txt, folio
+
+
+def test_folio():
+    assert folio("3f2a9c1b77d0e4a5c0ffee0000000000") == "3F2A-9C1B-77D0-E4A5"
+    assert folio(None, 42) == "42"
+
+
+def test_folios_no_se_repiten():
+    folios = {folio(uuid.uuid4().hex) for _ in range(200_000)}
+    assert len(folios) == 200_000
+
+
+@pytest.mark.parametrize("ancho", [32, 42, 48])
+def test_folio_completo_en_el_ticket(ancho):
+    clave = uuid.uuid4().hex
+    venta = {
+        "clave": clave,
+        "folio": folio(clave),
+        "fecha": datetime(2024, 3, 1, 12, 30),
+        "total": Decimal("20.00"),
+        "lineas": [{"nombre": "Arroz", "precio": Decimal("10.00"), "cantidad": 2}]
+    }
+
+    texto = armar_txt(venta, _Plantillas({}, ancho)).decode("utf-8")
+    assert f"Folio: {folio(clave)}" in texto
+    assert "01/03/2024 12:30" in texto
+    assert all(len(linea) <= ancho for linea in texto.splitlines())
@@ -0,0 +1,546 @@
+import functools
+import os
+import shutil
+import string
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from html import escape
+
+import streamlit as st
+
+from config import opcion
+from metricas import medir
+
+# ------------------ TICKETS ------------------
+# Al registrar una venta se encola su ticket y el rerun del cajero sigue de
+# inmediato: un pool de hilos lo arma en texto, ESC/POS (bytes para la
+# impresora térmica) y HTML imprimible, lo deja en el directorio de spool
+# y, si hay impresora configurada, le manda los bytes. El encabezado de la
+# tienda y las plantillas se arman una sola vez. Las reimpresiones se leen
+# del spool; solo si el archivo ya no está se arma de nuevo desde la BD.
+
+FORMATOS = ("txt", "escpos", "html")
+EXTENSIONES = {"txt": "txt", "escpos": "bin", "html": "html"}
+TIPOS_MIME = {"txt": "text/plain", "escpos": "application/octet-stream", "html": "text/html"}
+
+# -------- Comandos ESC/POS --------
+ESC_INICIAR = b"\x1b@"
+ESC_PAGINA_850 = b"\x1bt\x02"          # tabla de caracteres PC850 (acentos, ñ)
+ESC_CENTRO = b"\x1ba\x01"
+ESC_IZQUIERDA = b"\x1ba\x00"
+ESC_NEGRITA = b"\x1bE\x01"
+ESC_NORMAL = b"\x1bE\x00"
+ESC_DOBLE = b"\x1d!\x11"
+ESC_SENCILLO = b"\x1d!\x00"
+ESC_CORTAR = b"\x1dVB\x00"             # avanza el papel y corta
+CODIFICACION_ESCPOS = "cp850"
+
+_HTML = string.Template("""<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="utf-8">
+<title>Ticket $folio</title>
+<style>
+  body { font-family: monospace; width: 72mm; margin: 0 auto; font-size: 12px; }
+  .centro { text-align: center; }
+  table { width: 100%; border-collapse: collapse; }
+  td.num { text-align: right; white-space: nowrap; }
+  .total td { font-weight: bold; font-size: 15px; border-top: 1px dashed #000; }
+  hr { border: 0; border-top: 1px dashed #000; }
+  @page { size: 80mm auto; margin: 4mm; }
+</style>
+</head>
+<body>
+$encabezado
+<hr>
+<div>Folio: $folio<br>$fecha</div>
+<hr>
+<table>
+$renglones
+<tr class="total"><td>TOTAL</td><td class="num">$total</td></tr>
+</table>
+<div>Artículos: $articulos</div>
+<hr>
+$pie
+</body>
+</html>
+""")
+_HTML_RENGLON = string.Template(
+    '<tr><td>$nombre<br>&nbsp;&nbsp;$cantidad x $precio</td>'
+    '<td class="num">$subtotal</td></tr>'
+)
+
+
+def _pesos(valor):
+    return f"${valor:,.2f}"
+
+
+def _extremos(izquierda, derecha, ancho):
+    """Texto a la izquierda y a la derecha de una línea de `ancho` columnas."""
+    espacio = ancho - len(derecha) - 1
+    return f"{izquierda[:espacio]:<{espacio}} {derecha}"
+
+
+class _Plantillas:
+    """
+    Encabezado y pie de la tienda ya formateados para cada salida. Se arman
+    una vez al crear el pool; cada ticket solo formatea sus renglones.
+    """
+
+    def __init__(self, tienda, ancho):
+        self.ancho = ancho
+        self.separador = "-" * ancho
+
+        nombre = str(tienda.get("nombre", "SGVentas"))
+        datos = [str(tienda[c]) for c in ("direccion", "telefono", "rfc") if tienda.get(c)]
+        pie = str(tienda.get("pie", "¡Gracias por su compra!"))
+
+        self.encabezado_txt = "\n".join(
+            linea[:ancho].center(ancho).rstrip() for linea in [nombre, *datos]
+        )
+        self.pie_txt = pie[:ancho].center(ancho).rstrip()
+
+        def _cp850(texto):
+            return texto.encode(CODIFICACION_ESCPOS, errors="replace")
+
+        self.encabezado_escpos = b"".join([
+            ESC_INICIAR, ESC_PAGINA_850, ESC_CENTRO,
+            ESC_NEGRITA, ESC_DOBLE, _cp850(nombre[:ancho // 2]), b"\n", ESC_SENCILLO, ESC_NORMAL,
+            *(_cp850(linea[:ancho]) + b"\n" for linea in datos),
+            ESC_IZQUIERDA
+        ])
+        self.pie_escpos = b"".join([
+            ESC_CENTRO, _cp850(pie[:ancho]), b"\n\n\n", ESC_CORTAR
+        ])
+        self.codificar = _cp850
+
+        self.encabezado_html = (
+            f'<div class="centro"><strong>{escape(nombre)}</strong>'
+            + "".join(f"<br>{escape(linea)}" for linea in datos)
+            + "</div>"
+        )
+        self.pie_html = f'<div class="centro">{escape(pie)}</div>'
+
+
+def _renglones(venta):
+    """(nombre, cantidad, precio, subtotal) de cada renglón de la venta."""
+    for linea in venta["lineas"]:
+        precio = Decimal(str(linea["precio"]))
+        cantidad = linea["cantidad"]
+        subtotal = linea.get("subtotal")
+        yield (
+            linea["nombre"],
+            cantidad,
+            precio,
+            Decimal(str(subtotal)) if subtotal is not None else precio * cantidad
+        )
+
+
+# ------------------ Armado ------------------
+def _cuerpo_txt(venta, plantillas):
+    """Folio, renglones y total en texto; lo comparten txt y ESC/POS."""
+    ancho = plantillas.ancho
+    folio_txt = f"Folio: {venta['folio']}"
+    fecha = f"{venta['fecha']:%d/%m/%Y %H:%M}"
+    if len(folio_txt) + 1 + len(fecha) <= ancho:
+        cabecera = [_extremos(folio_txt, fecha, ancho)]
+    else:
+        # Papel angosto: el folio no se recorta, la fecha va abajo
+        cabecera = [folio_txt, fecha.rjust(ancho)]
+    lineas = [plantillas.separador, *cabecera, plantillas.separador]
+    articulos = 0
+    for nombre, cantidad, precio, subtotal in _renglones(venta):
+        articulos += cantidad
+        lineas.append(nombre[:ancho].rstrip())
+        lineas.append(_extremos(f"  {cantidad} x {_pesos(precio)}", _pesos(subtotal), ancho))
+    lineas.append(plantillas.separador)
+    return lineas, articulos
+
+
+def armar_txt(venta, plantillas):
+    lineas, articulos = _cuerpo_txt(venta, plantillas)
+    return "\n".join([
+        plantillas.encabezado_txt,
+        *lineas,
+        _extremos("TOTAL", _pesos(venta["total"]), plantillas.ancho),
+        f"Artículos: {articulos}",
+        plantillas.separador,
+        plantillas.pie_txt,
+        ""
+    ]).encode("utf-8")
+
+
+def armar_escpos(venta, plantillas):
+    lineas, articulos = _cuerpo_txt(venta, plantillas)
+    codificar = plantillas.codificar
+    return b"".join([
+        plantillas.encabezado_escpos,
+        codificar("\n".join(lineas)), b"\n",
+        ESC_NEGRITA, codificar(_extremos("TOTAL", _pesos(venta["total"]), plantillas.ancho)),
+        ESC_NORMAL, b"\n",
+        codificar(f"Artículos: {articulos}\n{plantillas.separador}\n"),
+        plantillas.pie_escpos
+    ])
+
+
+def armar_html(venta, plantillas):
+    renglones = []
+    articulos = 0
+    for nombre, cantidad, precio, subtotal in _renglones(venta):
+        articulos += cantidad
+        renglones.append(_HTML_RENGLON.substitute(
+            nombre=escape(nombre),
+            cantidad=cantidad,
+            precio=_pesos(precio),
+            subtotal=_pesos(subtotal)
+        ))
+    return _HTML.substitute(
+        encabezado=plantillas.encabezado_html,
+        folio=escape(str(venta["folio"])),
+        fecha=f"{venta['fecha']:%d/%m/%Y %H:%M}",
+        renglones="\n".join(renglones),
+        total=_pesos(venta["total"]),
+        articulos=articulos,
+        pie=plantillas.pie_html
+    ).encode("utf-8")
+
+
+_ARMADORES = {"txt": armar_txt, "escpos": armar_escpos, "html": armar_html}
+
+
+# ------------------ Pool de tickets ------------------
+class Tickets:
+    """
+    Genera tickets en segundo plano y los guarda en `directorio`
+    (una carpeta por día: AAAA-MM-DD/<clave>.<ext>).
+
+    `venta` es un dict con clave (nombre en el spool, ver `referencia`),
+    folio (el que se imprime), fecha, total y `lineas` (dicts con nombre,
+    precio, cantidad y opcionalmente subtotal, como los de `Carrito` o los
+    `items` de `db.obtener_venta`).
+    `impresora` (opcional) es un archivo de dispositivo (p. ej.
+    /dev/usb/lp0) al que se escriben los bytes ESC/POS de cada venta.
+    """
+
+    def __init__(self, directorio, formatos=("txt", "escpos", "html"), tienda=None,
+                 ancho=42, hilos=2, impresora=None):
+        desconocidos = set(formatos) - set(FORMATOS)
+        if desconocidos:
+            raise ValueError(f"Formatos de ticket desconocidos: {', '.join(sorted(desconocidos))}")
+
+        self._directorio = directorio
+        self._formatos = tuple(formatos)
+        self._plantillas = _Plantillas(tienda or {}, ancho)
+        self._impresora = impresora
+        self._pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="sgventas-tickets")
+
+        self._lock = threading.Lock()
+        # Un ticket a la vez en la impresora, aunque haya varios hilos
+        self._impresora_lock = threading.Lock()
+
+        self.pendientes = 0
+        self.generados = 0
+        self.fallos = 0
+        self.ultimo_error = None
+
+    @property
+    def formatos(self):
+        return self._formatos
+
+    @property
+    def impresora(self):
+        return self._impresora
+
+    def ruta(self, clave, fecha, formato):
+        return os.path.join(
+            self._directorio, f"{fecha:%Y-%m-%d}", f"{clave}.{EXTENSIONES[formato]}"
+        )
+
+    # -------- Encolar --------
+    def encolar(self, venta, imprimir=True):
+        """Pide el ticket de la venta y regresa sin esperar a que se arme."""
+        with self._lock:
+            self.pendientes += 1
+        self._pool.submit(self._trabajar, venta, imprimir)
+
+    def _trabajar(self, venta, imprimir):
+        try:
+            self.generar(venta, imprimir)
+            with self._lock:
+                self.generados += 1
+                self.ultimo_error = None
+        except Exception as e:
+            with self._lock:
+                self.fallos += 1
+                self.ultimo_error = str(e)
+        finally:
+            with self._lock:
+                self.pendientes -= 1
+
+    # -------- Armado y spool --------
+    @medir("tickets.generar")
+    def generar(self, venta, imprimir=False):
+        """
+        Arma los formatos configurados, los escribe en el spool y (si se
+        pide y hay impresora) imprime. Retorna {formato: bytes}.
+        """
+        formatos = set(self._formatos)
+        if imprimir and self._impresora:
+            formatos.add("escpos")
+
+        contenidos = {}
+        for formato in formatos:
+            contenidos[formato] = _ARMADORES[formato](venta, self._plantillas)
+            if formato in self._formatos:
+                self._escribir(self.ruta(venta["clave"], venta["fecha"], formato), contenidos[formato])
+
+        if imprimir and self._impresora:
+            self._imprimir(contenidos["escpos"])
+        return contenidos
+
+    @staticmethod
+    def _escribir(ruta, contenido):
+        # Se escribe aparte y se renombra: una reimpresión nunca lee un
+        # archivo a medias
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        temporal = f"{ruta}.{threading.get_ident()}.tmp"
+        with open(temporal, "wb") as archivo:
+            archivo.write(contenido)
+        os.replace(temporal, ruta)
+
+    def _imprimir(self, contenido):
+        with self._impresora_lock, open(self._impresora, "ab") as dispositivo:
+            dispositivo.write(contenido)
+
+    # -------- Reimpresión --------
+    def leer(self, clave, fecha, formato):
+        """Ticket guardado en el spool, o None si aún no está (o ya se borró)."""
+        try:
+            with open(self.ruta(clave, fecha, formato), "rb") as archivo:
+                return archivo.read()
+        except FileNotFoundError:
+            return None
+
+    def ticket(self, venta, formato, cargar=None):
+        """
+        Del spool si ya existe; si no, se arma ahora y se guarda. Si `venta`
+        no trae `lineas`, `cargar()` las lee (de la BD) solo en ese caso.
+        """
+        contenido = self.leer(venta["clave"], venta["fecha"], formato)
+        if contenido is None:
+            if "lineas" not in venta:
+                venta = {**venta, "lineas": cargar()}
+            contenido = _ARMADORES[formato](venta, self._plantillas)
+            if formato in self._formatos:
+                self._escribir(self.ruta(venta["clave"], venta["fecha"], formato), contenido)
+        return contenido
+
+    def reimprimir(self, venta, cargar=None):
+        """Manda el ticket de una venta ya registrada a la impresora, en segundo plano."""
+        if not self._impresora:
+            raise ValueError("No hay impresora de tickets configurada.")
+        with self._lock:
+            self.pendientes += 1
+        self._pool.submit(self._trabajar_reimpresion, venta, cargar)
+
+    def _trabajar_reimpresion(self, venta, cargar):
+        try:
+            self._imprimir(self.ticket(venta, "escpos", cargar))
+        except Exception as e:
+            with self._lock:
+                self.fallos += 1
+                self.ultimo_error = str(e)
+        finally:
+            with self._lock:
+                self.pendientes -= 1
+
+    def limpiar(self, dias):
+        """Borra las carpetas del spool con más de `dias` días."""
+        limite = f"{date.today() - timedelta(days=dias):%Y-%m-%d}"
+        try:
+            carpetas = os.listdir(self._directorio)
+        except FileNotFoundError:
+            return 0
+        viejas = [c for c in carpetas if len(c) == 10 and c < limite]
+        for carpeta in viejas:
+            shutil.rmtree(os.path.join(self._directorio, carpeta), ignore_errors=True)
+        return len(viejas)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "pendientes": self.pendientes,
+                "generados": self.generados,
+                "fallos": self.fallos,
+                "ultimo_error": self.ultimo_error
+            }
+
+    def detener(self, esperar=True):
+        self._pool.shutdown(wait=esperar)
+
+
+# ------------------ Pool del proceso ------------------
+_tickets = None
+_tickets_lock = threading.Lock()
+
+
+def tickets_activos():
+    """False si la configuración apaga los tickets (`tickets = false`)."""
+    return bool(opcion("tickets", True))
+
+
+def obtener_tickets():
+    """Pool de tickets compartido por todas las sesiones."""
+    global _tickets
+
+    if _tickets is None:
+        with _tickets_lock:
+            if _tickets is None:
+                _tickets = Tickets(
+                    opcion("tickets_dir", "tickets"),
+                    formatos=tuple(opcion("tickets_formatos", ("txt", "escpos", "html"))),
+                    tienda=dict(opcion("tienda", {})),
+                    ancho=int(opcion("tickets_ancho", 42)),
+                    hilos=int(opcion("tickets_hilos", 2)),
+                    impresora=opcion("tickets_impresora")
+                )
+                dias = int(opcion("tickets_dias", 90))
+                if dias > 0:
+                    _tickets._pool.submit(_tickets.limpiar, dias)
+    return _tickets
+
+
+FOLIO_CARACTERES = 16
+
+
+def folio(clave, venta_id=None):
+    """
+    Folio impreso: los primeros 16 caracteres (64 bits) de la clave de la
+    venta, en grupos de 4. La clave ya existe al cobrar en los dos modos
+    (en diferido la venta aún no tiene id); con menos caracteres los
+    folios se repetirían a las pocas decenas de miles de ventas. Las
+    ventas registradas sin clave usan su id.
+    """
+    if not clave:
+        return str(venta_id)
+    inicio = clave[:FOLIO_CARACTERES].upper()
+    return "-".join(inicio[i:i + 4] for i in range(0, len(inicio), 4))
+
+
+def venta_para_ticket(clave, fecha, carrito):
+    """Datos del ticket tomados del carrito antes de vaciarlo."""
+    return {
+        "clave": clave,
+        "folio": folio(clave),
+        "fecha": fecha,
+        "total": carrito.total,
+        "lineas": list(carrito)
+    }
+
+
+def referencia(encabezado):
+    """
+    Ticket (sin renglones) de un encabezado de `archivo.ventas_entre`:
+    basta para encontrarlo en el spool con el mismo nombre y folio que
+    se le dieron al cobrar.
+    """
+    return {
+        "id": encabezado["id"],
+        "clave": encabezado["clave"] or str(encabezado["id"]),
+        "folio": folio(encabezado["clave"], encabezado["id"]),
+        "fecha": encabezado["fecha"],
+        "total": encabezado["total"]
+    }
+
+
+def _cargar_renglones(venta_id):
+    """Renglones de la venta desde la BD (o el archivo histórico)."""
+    from archivo import obtener_venta
+
+    venta = obtener_venta(venta_id)
+    if venta is None:
+        raise ValueError("La venta ya no existe.")
+    return venta["items"]
+
+
+# ------------------ Render ------------------
+def _descargas(tickets, venta, contenidos, clave, cargar=None):
+    """Botones de descarga de `contenidos` ({formato: bytes o None})."""
+    columnas = st.columns(len(contenidos) + 1) if contenidos else [st.container()]
+    listo = False
+    for columna, (formato, contenido) in zip(columnas, contenidos.items()):
+        if contenido is None:
+            continue
+        listo = True
+        columna.download_button(
+            formato.upper(),
+            contenido,
+            file_name=os.path.basename(tickets.ruta(venta["clave"], venta["fecha"], formato)),
+            mime=TIPOS_MIME[formato],
+            key=f"{clave}_{formato}",
+            use_container_width=True
+        )
+    if tickets.impresora and columnas[-1].button(
+        "Imprimir", key=f"{clave}_imprimir", use_container_width=True
+    ):
+        tickets.reimprimir(venta, cargar)
+        st.toast("Ticket enviado a la impresora.")
+    return listo
+
+
+def _formatos_descarga(tickets):
+    return [f for f in ("html", "txt") if f in tickets.formatos]
+
+
+def render_ultimo_ticket():
+    """Ticket de la última venta de la sesión, en la barra lateral."""
+    venta = st.session_state.get("ultimo_ticket")
+    if venta is None or not tickets_activos():
+        return
+
+    tickets = obtener_tickets()
+    contenidos = {
+        formato: tickets.leer(venta["clave"], venta["fecha"], formato)
+        for formato in _formatos_descarga(tickets)
+    }
+    with st.sidebar.expander(f"Último ticket · folio {venta['folio']}"):
+        if not _descargas(tickets, venta, contenidos, "ultimo_ticket"):
+            st.caption("Generando ticket…")
+        if tickets.ultimo_error:
+            st.caption(f"Último error: {tickets.ultimo_error}")
+
+
+def render_reimpresion(ventas):
+    """
+    Reimpresión de una venta pasada (encabezados de `archivo.ventas_entre`).
+    Se sirve del spool; la BD solo se lee si el archivo ya no está.
+    """
+    if not ventas or not tickets_activos():
+        return
+
+    with st.expander("Reimprimir ticket"):
+        elegida = st.selectbox(
+            "Venta",
+            range(len(ventas)),
+            index=len(ventas) - 1,
+            format_func=lambda i: (
+                f"Folio {folio(ventas[i]['clave'], ventas[i]['id'])} · "
+                f"{ventas[i]['fecha']:%H:%M} · {_pesos(ventas[i]['total'])}"
+            ),
+            key="reimpresion_venta"
+        )
+        venta = referencia(ventas[elegida])
+        cargar = functools.partial(_cargar_renglones, venta["id"])
+
+        tickets = obtener_tickets()
+        try:
+            contenidos = {
+                formato: tickets.ticket(venta, formato, cargar)
+                for formato in _formatos_descarga(tickets)
+            }
+        except ValueError as e:
+            st.warning(str(e))
+            return
+        _descargas(tickets, venta, contenidos, "reimpresion", cargar)